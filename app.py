@@ -1,7 +1,7 @@
 import os
 import logging
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, Response, stream_template
+from flask import Flask, render_template, request, jsonify, Response, stream_template, stream_with_context, session
 from flask_cors import CORS
 from flask_socketio import SocketIO, Namespace, emit
 from werkzeug.utils import secure_filename
@@ -12,9 +12,9 @@ from typing import List, Dict, Any, Optional
 import json
 import traceback
 from dotenv import load_dotenv
-import tempfile
 import base64
 import time
+import uuid
 
 # Import our custom modules
 from backend.rag_system import RAGSystem
@@ -23,8 +23,12 @@ from backend.tts_service import TTSService
 from backend.knowledge_base import KnowledgeBaseManager
 from backend.database import DatabaseManager
 from backend.vad_processor import VADProcessor
+from backend.asr_jobs import TranscriptionJobManager
+from backend.chat_streams import ChatStreamManager
 from utils.logger import setup_logger
-from utils.security import validate_file
+from utils.security import validate_filename
+from utils.upload import StreamingUpload, UploadTooLarge, write_chunks
+from utils.metrics import metrics
 from config import Config
 
 # Load environment variables
@@ -49,10 +53,12 @@ asr_service = None
 tts_service = None
 kb_manager = None
 db_manager = None
+asr_job_manager = None
+chat_stream_manager = None
 
 def initialize_services():
     """Initialize all AI services"""
-    global rag_system, asr_service, tts_service, kb_manager, db_manager
+    global rag_system, asr_service, tts_service, kb_manager, db_manager, asr_job_manager, chat_stream_manager
     
     try:
         # Initialize DashScope API using config instance
@@ -67,11 +73,17 @@ def initialize_services():
             logger.warning(f"数据库初始化失败，将使用简化模式: {str(db_error)}")
             db_manager = None
         
-        # Initialize services
-        rag_system = RAGSystem(config_instance)
+        # Initialize services; chat and document management share one knowledge base
+        kb_manager = KnowledgeBaseManager(config_instance, db_manager)
+        rag_system = RAGSystem(config_instance, db_manager, kb_manager)
         asr_service = ASRService(config_instance)
         tts_service = TTSService(config_instance)
-        kb_manager = KnowledgeBaseManager(config_instance)
+        asr_job_manager = TranscriptionJobManager(config_instance, asr_service)
+        chat_stream_manager = ChatStreamManager(config_instance)
+        
+        # Acknowledgement clips for voice chat are prepared (or loaded from the cache) in the background
+        if config_instance.TTS_ACK_ENABLED:
+            tts_service.prepare_ack_clips(config_instance.VOICE_CHAT_VOICE, background=True)
         
         logger.info("All services initialized successfully")
         return True
@@ -111,6 +123,29 @@ def health_check():
         'mode': 'full' if db_manager else 'simplified'
     })
 
+@app.route('/metrics')
+def get_metrics():
+    """Latency stages and counters of the running services"""
+    return jsonify({
+        'success': True,
+        'metrics': metrics.snapshot(),
+        'tts_cache': tts_service.get_cache_stats() if tts_service else {},
+        'tts_phrase_cache': tts_service.get_phrase_cache_stats() if tts_service else {},
+        'tts_scheduler': tts_service.get_scheduler_stats() if tts_service else {},
+        'tts_pool': tts_service.get_pool_stats() if tts_service else {},
+        'conversations': rag_system.conversations.get_stats() if rag_system else {},
+        'query_embedding_cache': kb_manager.query_embeddings.get_stats() if kb_manager else {},
+        'embedding_batcher': kb_manager.embedding_batcher.get_stats() if kb_manager and kb_manager.embedding_batcher else {},
+        'answer_cache': {
+            request_class: cache.get_stats() for request_class, cache in rag_system.answer_caches.items()
+        } if rag_system else {},
+        'retrieval': rag_system.retrieval_gate.get_stats() if rag_system else {},
+        'speculation': rag_system.speculation.get_stats() if rag_system and rag_system.speculation else {},
+        'chat_streams': chat_stream_manager.get_stats() if chat_stream_manager else {},
+        'llm_router': rag_system.router.get_stats() if rag_system else {},
+        'timestamp': datetime.now().isoformat()
+    })
+
 # Main page
 @app.route('/')
 def index():
@@ -122,45 +157,155 @@ def index():
 def audio_to_text():
     """Convert audio to text using ASR"""
     try:
-        if 'audio' not in request.files:
+        # Read the multipart body incrementally so decoding starts while bytes arrive
+        upload = StreamingUpload.from_request(request, config_instance.MAX_CONTENT_LENGTH)
+        if upload is None:
             return jsonify({'error': '没有上传音频文件'}), 400
         
-        audio_file = request.files['audio']
-        if audio_file.filename == '':
-            return jsonify({'error': '未选择音频文件'}), 400
-        
-        # Validate file
-        if not validate_file(audio_file, config_instance.ALLOWED_AUDIO_EXTENSIONS):
-            return jsonify({'error': '不支持的音频格式'}), 400
-        
-        # Save uploaded file temporarily
-        filename = secure_filename(audio_file.filename)
-        temp_path = os.path.join(config_instance.UPLOAD_FOLDER, filename)
-        audio_file.save(temp_path)
-        
-        try:
+        for part in upload.files():
+            if part.name != 'audio':
+                continue
+            
+            if not part.filename:
+                return jsonify({'error': '未选择音频文件'}), 400
+            
+            # Validate file
+            if not validate_filename(part.filename, config_instance.ALLOWED_AUDIO_EXTENSIONS):
+                return jsonify({'error': '不支持的音频格式'}), 400
+            
             # Convert audio to text
-            text = asr_service.transcribe(temp_path)
+            trim_stats = {}
+            text = asr_service.transcribe_stream(part.iter_chunks(), part.filename, stats=trim_stats)
             
             logger.info(f"ASR transcription completed: {text[:100]}...")
             
             return jsonify({
                 'success': True,
                 'text': text,
+                'audio_trim': trim_stats,
                 'timestamp': datetime.now().isoformat()
             })
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
         
+        return jsonify({'error': '没有上传音频文件'}), 400
+        
+    except UploadTooLarge as e:
+        logger.warning(f"ASR upload rejected: {str(e)}")
+        return jsonify({'error': '文件太大'}), 413
     except Exception as e:
         logger.error(f"ASR error: {str(e)}")
         logger.error(traceback.format_exc())
         return jsonify({'error': f'语音识别失败: {str(e)}'}), 500
 
+# Batch ASR job endpoints
+@app.route('/asr/jobs', methods=['POST'])
+def create_asr_job():
+    """Queue multiple audio files or URLs for asynchronous transcription"""
+    try:
+        items = []
+        
+        # Remote audio URLs (JSON body or repeated form field)
+        urls = []
+        if request.is_json:
+            urls = (request.get_json(silent=True) or {}).get('urls', [])
+            if isinstance(urls, str):
+                urls = [urls]
+        
+        # Uploaded files, each streamed to a unique name under the size limit
+        saved_paths = []
+        try:
+            upload = StreamingUpload.from_request(request, config_instance.MAX_CONTENT_LENGTH)
+            if upload is not None:
+                for part in upload.files():
+                    if part.name != 'audio' or not part.filename:
+                        continue
+                    if not validate_filename(part.filename, config_instance.ALLOWED_AUDIO_EXTENSIONS):
+                        raise ValueError(f'不支持的音频格式: {part.filename}')
+                    filename = secure_filename(part.filename)
+                    temp_path = os.path.join(config_instance.UPLOAD_FOLDER, f"{uuid.uuid4().hex}_{filename}")
+                    saved_paths.append(temp_path)
+                    with open(temp_path, 'wb') as f:
+                        write_chunks(part.iter_chunks(), f)
+                    items.append({'name': part.filename, 'path': temp_path})
+                urls.extend(upload.fields.get('urls', []))
+            
+            for url in urls:
+                if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+                    raise ValueError(f'无效的音频URL: {url}')
+                items.append({'name': url, 'url': url})
+            
+            if not items:
+                raise ValueError('没有上传音频文件或URL')
+            if len(items) > config_instance.ASR_JOB_MAX_FILES:
+                raise ValueError(f'单个任务最多{config_instance.ASR_JOB_MAX_FILES}个文件')
+        except (ValueError, UploadTooLarge) as e:
+            for path in saved_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            if isinstance(e, UploadTooLarge):
+                return jsonify({'error': '文件太大'}), 413
+            return jsonify({'error': str(e)}), 400
+        
+        job_id = asr_job_manager.submit(items)
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'total': len(items),
+            'status_url': f'/asr/jobs/{job_id}',
+            'events_url': f'/asr/jobs/{job_id}/events',
+            'timestamp': datetime.now().isoformat()
+        }), 202
+        
+    except Exception as e:
+        logger.error(f"ASR job error: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({'error': f'创建识别任务失败: {str(e)}'}), 500
+
+@app.route('/asr/jobs/<job_id>', methods=['GET'])
+def get_asr_job(job_id):
+    """Poll progress and results of a transcription job"""
+    job = asr_job_manager.get_job(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job,
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/asr/jobs/<job_id>/events', methods=['GET'])
+def stream_asr_job(job_id):
+    """Server-sent events with per-file progress of a transcription job"""
+    job = asr_job_manager.get_job(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    def generate(job):
+        version = -1
+        while job is not None:
+            if job['version'] > version:
+                version = job['version']
+                yield f"id: {version}\nevent: progress\ndata: {json.dumps(job, ensure_ascii=False)}\n\n"
+                if job['status'] in TranscriptionJobManager.FINISHED_STATES:
+                    return
+            else:
+                yield ": keepalive\n\n"
+            job = asr_job_manager.wait_for_update(job_id, version, timeout=15)
+    
+    return Response(generate(job), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 # TTS endpoint
+def _parse_sample_rate(data) -> Optional[int]:
+    """Read an optional integer sample_rate from a request body"""
+    try:
+        return int(data['sample_rate']) if data.get('sample_rate') else None
+    except (TypeError, ValueError):
+        return None
+
 @app.route('/tts', methods=['POST'])
 def text_to_speech():
     """Convert text to speech using TTS"""
@@ -175,31 +320,146 @@ def text_to_speech():
         
         voice = data.get('voice', 'xiaoyun')  # Default voice
         
+        # Output format requested by the client (pcm, mp3 or opus), resolved to a supported one
+        audio_format = tts_service.negotiate_format(data.get('format'), _parse_sample_rate(data))
+        
+        # HTTP callers are batch unless they ask for interactive playback, so bulk jobs never delay voice turns
+        priority = data.get('priority', 'batch')
+        if priority not in tts_service.scheduler.PRIORITIES:
+            return jsonify({'error': f'无效的优先级: {priority}'}), 400
+        
         # Generate audio
-        audio_data = tts_service.synthesize(text, voice)
+        audio_data = tts_service.synthesize(text, voice, audio_format, priority=priority)
         
         # Convert to base64 for JSON response
         audio_base64 = base64.b64encode(audio_data).decode('utf-8')
         
         logger.info(f"TTS synthesis completed for text: {text[:50]}...")
         
-        return jsonify({
+        response = {
             'success': True,
             'audio': audio_base64,
             'timestamp': datetime.now().isoformat()
-        })
+        }
+        response.update(tts_service.describe_format(audio_format))
+        return jsonify(response)
         
     except Exception as e:
         logger.error(f"TTS error: {str(e)}")
         logger.error(traceback.format_exc())
         return jsonify({'error': f'语音合成失败: {str(e)}'}), 500
 
+@app.route('/tts_stream', methods=['POST'])
+def text_to_speech_stream():
+    """Stream synthesized audio to the client as it is produced"""
+    try:
+        data = request.get_json()
+        if not data or 'text' not in data:
+            return jsonify({'error': '缺少文本参数'}), 400
+        
+        text = data['text'].strip()
+        if not text:
+            return jsonify({'error': '文本不能为空'}), 400
+        
+        voice = data.get('voice', 'xiaoyun')  # Default voice
+        audio_format = tts_service.negotiate_format(data.get('format'), _parse_sample_rate(data))
+        format_info = tts_service.describe_format(audio_format)
+        
+        priority = data.get('priority', 'batch')
+        if priority not in tts_service.scheduler.PRIORITIES:
+            return jsonify({'error': f'无效的优先级: {priority}'}), 400
+        
+        start = time.perf_counter()
+        chunks = tts_service.synthesize_stream(text, voice, audio_format, priority=priority)
+        # Pull the first chunk here so synthesis errors still produce a JSON error
+        first_chunk = next(chunks, b'')
+        first_byte_ms = round((time.perf_counter() - start) * 1000, 1)
+        
+        def generate():
+            try:
+                if first_chunk:
+                    yield first_chunk
+                for chunk in chunks:
+                    yield chunk
+            except Exception as e:
+                logger.error(f"TTS stream error: {str(e)}")
+            finally:
+                chunks.close()
+        
+        logger.info(f"TTS stream started for text: {text[:50]}... (first byte {first_byte_ms}ms)")
+        
+        return Response(stream_with_context(generate()), content_type=format_info['mime_type'], headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+            'X-TTS-First-Byte-Ms': str(first_byte_ms),
+            'X-TTS-Format': format_info['format'],
+            'X-TTS-Sample-Rate': str(format_info['sample_rate'])
+        })
+        
+    except Exception as e:
+        logger.error(f"TTS stream error: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({'error': f'语音合成失败: {str(e)}'}), 500
+
+def _get_session_id(data=None) -> str:
+    """Conversation id of an HTTP request: X-Session-ID header, session_id field, or a cookie-bound id"""
+    session_id = request.headers.get('X-Session-ID') or (data or {}).get('session_id')
+    if session_id:
+        return str(session_id)[:128]
+    if 'conversation_id' not in session:
+        session['conversation_id'] = uuid.uuid4().hex
+    return session['conversation_id']
+
+def _last_event_id() -> int:
+    """Last-Event-ID of a reconnecting SSE client (header or query parameter), 0 if absent"""
+    value = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        return max(0, int(value)) if value else 0
+    except ValueError:
+        return 0
+
+def _chat_event_stream(stream_id: str, last_event_id: int = 0) -> Response:
+    """SSE response following a chat stream from the event after last_event_id"""
+    heartbeat = config_instance.CHAT_STREAM_HEARTBEAT
+    
+    def generate():
+        yield f"retry: {config_instance.CHAT_STREAM_RETRY_MS}\n\n"
+        last = last_event_id
+        while True:
+            update = chat_stream_manager.wait_for_events(stream_id, last, timeout=heartbeat)
+            if update is None:
+                yield f"event: error\ndata: {json.dumps({'error': '对话流不存在或已过期'}, ensure_ascii=False)}\n\n"
+                return
+            events, finished, missed = update
+            if missed:
+                metrics.incr('chat_stream.replay_expired')
+                yield f"event: error\ndata: {json.dumps({'error': '断线期间的内容已超出重放缓冲区'}, ensure_ascii=False)}\n\n"
+                return
+            for event_id, event, data in events:
+                yield (f"id: {event_id}\n" + (f"event: {event}\n" if event else '') + f"data: {data}\n\n")
+                last = event_id
+            if finished:
+                return
+            if not events:
+                yield ": keepalive\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache, no-transform',
+        'X-Accel-Buffering': 'no',
+        'X-Chat-Stream-ID': stream_id
+    })
+
 # Chat endpoint (streaming)
 @app.route('/chat_stream', methods=['POST'])
 def chat_stream():
-    """Streaming chat with LLM using RAG"""
+    """Streaming chat with LLM using RAG, as server-sent events"""
     try:
         data = request.get_json()
+        
+        # Reconnecting client: continue the existing stream instead of asking the LLM again
+        if data and data.get('stream_id') and request.headers.get('Last-Event-ID'):
+            return resume_chat_stream(str(data['stream_id']))
+        
         if not data or 'message' not in data:
             return jsonify({'error': '缺少消息参数'}), 400
         
@@ -207,27 +467,29 @@ def chat_stream():
         if not user_message:
             return jsonify({'error': '消息不能为空'}), 400
         
-        def generate():
-            try:
-                # Get response from RAG system
-                for chunk in rag_system.chat_stream(user_message):
-                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
-                
-                # Send completion signal
-                yield f"data: {json.dumps({'finished': True})}\n\n"
-                
-            except Exception as e:
-                logger.error(f"Chat streaming error: {str(e)}")
-                error_msg = {'error': f'对话生成失败: {str(e)}'}
-                yield f"data: {json.dumps(error_msg, ensure_ascii=False)}\n\n"
+        session_id = _get_session_id(data)
+        request_class = data.get('request_class', 'chat')
+        if request_class not in config_instance.LLM_PROFILES:
+            return jsonify({'error': f'无效的请求类型: {request_class}'}), 400
         
-        return Response(generate(), mimetype='text/plain')
+        # The response is generated in the background so a dropped connection can resume
+        stream_id = chat_stream_manager.start(lambda: rag_system.chat_stream(user_message, session_id, request_class))
+        return _chat_event_stream(stream_id)
         
     except Exception as e:
         logger.error(f"Chat endpoint error: {str(e)}")
         logger.error(traceback.format_exc())
         return jsonify({'error': f'对话请求失败: {str(e)}'}), 500
 
+@app.route('/chat_stream/<stream_id>', methods=['GET'])
+def resume_chat_stream(stream_id):
+    """Resume a chat stream after the Last-Event-ID, replaying buffered events"""
+    update = chat_stream_manager.wait_for_events(stream_id, 0, timeout=0)
+    if update is None:
+        return jsonify({'error': '对话流不存在或已过期'}), 404
+    metrics.incr('chat_stream.resumed')
+    return _chat_event_stream(stream_id, _last_event_id())
+
 # Non-streaming chat endpoint
 @app.route('/chat', methods=['POST'])
 def chat():
@@ -241,14 +503,20 @@ def chat():
         if not user_message:
             return jsonify({'error': '消息不能为空'}), 400
         
-        # Get response from RAG system
-        response = rag_system.chat(user_message)
+        request_class = data.get('request_class', 'chat')
+        if request_class not in config_instance.LLM_PROFILES:
+            return jsonify({'error': f'无效的请求类型: {request_class}'}), 400
+        
+        # Get response from RAG system, with the model it was routed to
+        route = {}
+        response = rag_system.chat(user_message, _get_session_id(data), request_class, route)
         
-        logger.info(f"Chat completed for message: {user_message[:50]}...")
+        logger.info(f"Chat completed for message: {user_message[:50]}... (model {route.get('model')})")
         
         return jsonify({
             'success': True,
             'response': response,
+            'route': route,
             'timestamp': datetime.now().isoformat()
         })
         
@@ -262,21 +530,31 @@ def chat():
 def upload_document():
     """Upload document to knowledge base"""
     try:
-        if 'file' not in request.files:
+        upload = StreamingUpload.from_request(request, config_instance.MAX_CONTENT_LENGTH)
+        part = None
+        if upload is not None:
+            part = next((p for p in upload.files() if p.name == 'file'), None)
+        if part is None:
             return jsonify({'error': '没有上传文件'}), 400
         
-        file = request.files['file']
-        if file.filename == '':
+        if not part.filename:
             return jsonify({'error': '未选择文件'}), 400
         
         # Validate file
-        if not validate_file(file, config_instance.ALLOWED_DOCUMENT_EXTENSIONS):
+        if not validate_filename(part.filename, config_instance.ALLOWED_DOCUMENT_EXTENSIONS):
             return jsonify({'error': '不支持的文件格式'}), 400
         
-        # Save uploaded file
-        filename = secure_filename(file.filename)
+        # Stream uploaded file to a unique temporary name, then move it into place
+        filename = secure_filename(part.filename)
         file_path = os.path.join(config_instance.KNOWLEDGE_BASE_FOLDER, filename)
-        file.save(file_path)
+        temp_path = os.path.join(config_instance.KNOWLEDGE_BASE_FOLDER, f".{uuid.uuid4().hex}.part")
+        try:
+            with open(temp_path, 'wb') as f:
+                write_chunks(part.iter_chunks(), f)
+            os.replace(temp_path, file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
         
         # Process document and add to knowledge base
         result = kb_manager.add_document(file_path)
@@ -291,6 +569,9 @@ def upload_document():
             'timestamp': datetime.now().isoformat()
         })
         
+    except UploadTooLarge as e:
+        logger.warning(f"Document upload rejected: {str(e)}")
+        return jsonify({'error': '文件太大'}), 413
     except Exception as e:
         logger.error(f"Document upload error: {str(e)}")
         logger.error(traceback.format_exc())
@@ -338,9 +619,9 @@ def delete_document():
 
 @app.route('/clear_history', methods=['POST'])
 def clear_chat_history():
-    """Clear chat history"""
+    """Clear chat history of the requesting session"""
     try:
-        rag_system.clear_history()
+        rag_system.clear_history(_get_session_id(request.get_json(silent=True)))
         
         return jsonify({
             'success': True,
@@ -369,6 +650,10 @@ class VoiceChatNamespace(Namespace):
         self.is_speaking = False
         self.last_activity_time = time.time()
         self.is_paused = False  # 暂停状态
+        # 各客户端协商的TTS输出格式
+        self.tts_formats = {}
+        # 各客户端当前轮次检测到语音结束的时刻
+        self.turn_started = {}
         
         # 初始化VAD处理器
         self.vad_processor = VADProcessor(
@@ -399,11 +684,33 @@ class VoiceChatNamespace(Namespace):
 
     def on_disconnect(self):
         logger.info(f"客户端断开连接: {request.sid}")
+        # 关闭该会话的持久识别连接
+        if asr_service:
+            asr_service.release_session(request.sid)
+        self.tts_formats.pop(request.sid, None)
+        self.turn_started.pop(request.sid, None)
+        # 语音对话历史随连接结束
+        if rag_system:
+            rag_system.clear_history(request.sid)
+            rag_system.discard_speculation(request.sid)
         # 清理状态
         self.vad_processor.reset()
         self.audio_buffer = bytearray()
         self.collected_audio = bytearray()
 
+    def on_tts_config(self, data):
+        """客户端协商TTS输出格式（pcm/mp3/opus及采样率）"""
+        data = data or {}
+        audio_format = tts_service.negotiate_format(data.get('format'), _parse_sample_rate(data))
+        self.tts_formats[request.sid] = audio_format
+        # 预先建立该格式的合成会话，首句无需等待连接
+        tts_service.warm_voice(config_instance.VOICE_CHAT_VOICE, audio_format)
+        if config_instance.TTS_ACK_ENABLED:
+            tts_service.prepare_ack_clips(config_instance.VOICE_CHAT_VOICE, audio_format, background=True)
+        format_info = tts_service.describe_format(audio_format)
+        logger.info(f"客户端 {request.sid} TTS格式: {audio_format.name}")
+        emit('tts_config', format_info)
+
     def _on_speech_start(self):
         """语音开始回调"""
         logger.info("检测到语音开始")
@@ -416,9 +723,10 @@ class VoiceChatNamespace(Namespace):
         logger.info(f"检测到语音结束，音频长度: {len(audio_data)} bytes")
         self.is_speaking = False
         emit('voice_status', {'status': 'processing', 'message': '正在处理语音...'})
+        self._send_ack()
         
-        # 处理完整的语音数据
-        self.handle_transcription(audio_data)
+        # 处理完整的语音数据（附带VAD逐帧判定，用于裁剪首尾静音）
+        self.handle_transcription(audio_data, self.vad_processor.last_speech_flags)
     
     def _on_voice_activity(self, is_active: bool):
         """语音活动状态回调"""
@@ -524,6 +832,7 @@ class VoiceChatNamespace(Namespace):
         try:
             if len(self.collected_audio) > 0:
                 logger.info("强制停止，处理已收集的音频")
+                self._send_ack()
                 self.handle_transcription(bytes(self.collected_audio))
                 self.collected_audio = bytearray()
             
@@ -537,60 +846,95 @@ class VoiceChatNamespace(Namespace):
             logger.error(f"强制停止处理错误: {e}")
             emit('server_error', {'message': f'停止处理错误: {str(e)}'})
     
-    def handle_transcription(self, audio_data):
+    def _send_ack(self):
+        """检测到语音结束后立即播放预合成的确认音，填补ASR/LLM/TTS的等待"""
+        self.turn_started[request.sid] = time.perf_counter()
+        if not config_instance.TTS_ACK_ENABLED:
+            return
+        
+        audio_format = self.tts_formats.get(request.sid)
+        clip = tts_service.get_ack_clip(config_instance.VOICE_CHAT_VOICE, audio_format)
+        if clip is None:
+            metrics.incr('voice.ack.missing')
+            return
+        
+        emit('tts_ack', dict(tts_service.describe_format(audio_format), audio=base64.b64encode(clip).decode('utf-8')))
+        metrics.incr('voice.ack.sent')
+        metrics.observe('voice.ack', time.perf_counter() - self.turn_started[request.sid])
+
+    def handle_transcription(self, audio_data, speech_flags=None):
         """处理转录逻辑"""
         logger.info(f"处理转录，音频长度: {len(audio_data)} bytes")
         try:
-            # 将原始PCM数据转换为WAV格式
-            import wave
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp_file:
-                temp_path = tmp_file.name
-                
-                # 创建WAV文件
-                with wave.open(temp_path, 'wb') as wav_file:
-                    wav_file.setnchannels(1)  # 单声道
-                    wav_file.setsampwidth(2)  # 16位音频
-                    wav_file.setframerate(16000)  # 16kHz采样率
-                    wav_file.writeframes(audio_data)
-            
-            # 调用ASR服务
-            transcription = asr_service.transcribe(temp_path)
-              
-            # 清理临时文件
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            # 调用ASR服务（复用该会话的识别连接，上传前裁剪静音并归一化音量）
+            # 识别过程中的中间结果用于提前检索知识库
+            sid = request.sid
+            trim_stats = {}
+            transcription = asr_service.transcribe_pcm(
+                audio_data,
+                session_id=sid,
+                speech_flags=speech_flags,
+                stats=trim_stats,
+                on_partial=lambda text: rag_system.speculate(sid, text)
+            )
 
             if transcription:
                 logger.info(f"ASR 结果: {transcription}")
-                emit('asr_result', {'text': transcription})
+                emit('asr_result', {'text': transcription, 'audio_trim': trim_stats})
                 # 继续调用LLM和TTS
                 self.handle_chat(transcription)
             else:
                 logger.warning("ASR未能返回结果")
+                rag_system.discard_speculation(request.sid)
                 emit('server_error', {'message': '语音识别失败'})
 
         except Exception as e:
             logger.error(f"转录处理失败: {e}")
+            rag_system.discard_speculation(request.sid)
             emit('server_error', {'message': f'语音识别内部错误: {e}'})
 
     def handle_chat(self, text):
         """处理聊天逻辑并返回TTS"""
         logger.info(f"用户语音输入: {text}")
         try:
-            # 使用RAG系统进行对话
-            assistant_response = rag_system.chat(text)
-            logger.info(f"LLM回复: {assistant_response}")
+            # 使用RAG系统进行对话，每个连接一份对话历史；语音轮次使用简短口语化的回答配置
+            route = {}
+            assistant_response = rag_system.chat(text, request.sid, 'voice', route)
+            # 命中答案缓存等未用到的提前检索结果
+            rag_system.discard_speculation(request.sid)
+            logger.info(f"LLM回复({route.get('model')}): {assistant_response}")
             
-            # 发送LLM回复文本到前端
-            emit('llm_response', {'text': assistant_response})
+            # 发送LLM回复文本到前端，附带模型路由决策
+            emit('llm_response', {'text': assistant_response, 'route': route})
             
-            # 生成TTS语音
-            audio_data = tts_service.synthesize(assistant_response, "longwan_v2")
-
-            if audio_data:
-                audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-                emit('tts_speech', {'audio': audio_base64})
-                logger.info("AI回复语音已发送到客户端")
+            # 流式生成TTS语音，边合成边推送音频分片（使用客户端协商的格式）
+            audio_format = self.tts_formats.get(request.sid)
+            format_info = tts_service.describe_format(audio_format)
+            start = time.perf_counter()
+            turn_started = self.turn_started.pop(request.sid, None)
+            first_byte_ms = None
+            turn_first_audio_ms = None
+            size = 0
+            for seq, chunk in enumerate(tts_service.synthesize_stream(
+                    assistant_response, config_instance.VOICE_CHAT_VOICE, audio_format, priority='interactive')):
+                if first_byte_ms is None:
+                    now = time.perf_counter()
+                    first_byte_ms = round((now - start) * 1000, 1)
+                    # 感知延迟：从语音结束到第一段真实回答音频
+                    if turn_started is not None:
+                        metrics.observe('voice.first_audio', now - turn_started)
+                        turn_first_audio_ms = round((now - turn_started) * 1000, 1)
+                size += len(chunk)
+                emit('tts_chunk', dict(format_info, audio=base64.b64encode(chunk).decode('utf-8'), seq=seq))
+
+            if size:
+                emit('tts_end', {
+                    'first_byte_ms': first_byte_ms,
+                    'turn_first_audio_ms': turn_first_audio_ms,
+                    'total_ms': round((time.perf_counter() - start) * 1000, 1),
+                    'size': size
+                })
+                logger.info(f"AI回复语音已发送到客户端，首包 {first_byte_ms}ms")
                 
                 # 更新状态为空闲
                 emit('voice_status', {'status': 'idle', 'message': '等待下次语音输入...'})
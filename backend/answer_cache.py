@@ -0,0 +1,155 @@
+"""
+Semantic cache of RAG answers keyed by query embedding and knowledge base version
+"""
+
+import time
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from utils.metrics import metrics
+
+class SemanticAnswerCache:
+    """
+    Answers to earlier first-turn questions, found again by cosine similarity
+
+    Entries hold the normalized query embedding, the ids of the chunks the
+    answer was grounded on and the answer itself. Vectors live in one
+    preallocated float32 matrix, so a lookup is a single matrix-vector
+    product followed by an argmax. All entries belong to one knowledge base
+    version and are dropped as soon as the version changes.
+    """
+
+    def __init__(self, config):
+        """
+        Initialize semantic answer cache
+
+        Args:
+            config: Application configuration object
+        """
+        self.capacity = config.ANSWER_CACHE_SIZE
+        self.threshold = config.ANSWER_CACHE_THRESHOLD
+        self.ttl = config.ANSWER_CACHE_TTL
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * self.capacity
+        self._kb_version = None
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0}
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        """Unit-length float32 copy of an embedding"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _sync_version(self, kb_version: int):
+        """Drop every entry when the knowledge base has changed (lock held)"""
+        if self._kb_version == kb_version:
+            return
+        if self._kb_version is not None and any(self._entries):
+            self._stats['invalidations'] += 1
+            metrics.incr('answer_cache.invalidations')
+            self.logger.info(f"Knowledge base changed (version {kb_version}), answer cache cleared")
+        self._kb_version = kb_version
+        self._entries = [None] * self.capacity
+        if self._vectors is not None:
+            self._vectors.fill(0)
+
+    def lookup(self, embedding: List[float], kb_version: int) -> Optional[Dict[str, Any]]:
+        """
+        Find the cached answer of the most similar earlier query
+
+        Args:
+            embedding: Query embedding
+            kb_version: Current knowledge base version
+
+        Returns:
+            Dictionary with 'answer', 'chunk_ids' and 'similarity', or None
+            if no entry reaches the similarity threshold
+        """
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            self._sync_version(kb_version)
+            entry = None
+            if self._vectors is not None and self._vectors.shape[1] == query.shape[0]:
+                # Empty slots are zero vectors and score 0
+                scores = self._vectors @ query
+                best = int(np.argmax(scores))
+                candidate = self._entries[best]
+                if candidate and scores[best] >= self.threshold:
+                    if candidate['expires_at'] > now:
+                        candidate['last_used'] = now
+                        entry = dict(candidate, similarity=round(float(scores[best]), 4))
+                    else:
+                        self._entries[best] = None
+                        self._vectors[best] = 0
+
+            self._record('hits' if entry else 'misses')
+        return entry
+
+    def store(self, embedding: List[float], chunk_ids: List[str], answer: str, kb_version: int):
+        """
+        Cache the answer of a query
+
+        Args:
+            embedding: Query embedding
+            chunk_ids: Ids of the chunks the answer was grounded on
+            answer: Generated answer
+            kb_version: Knowledge base version the chunks were retrieved from
+        """
+        if not answer:
+            return
+        vector = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            self._sync_version(kb_version)
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+                self._entries = [None] * self.capacity
+
+            # Reuse a free or expired slot, otherwise the least recently used one
+            slot = None
+            oldest = None
+            for index, entry in enumerate(self._entries):
+                if entry is None or entry['expires_at'] <= now:
+                    slot = index
+                    break
+                if oldest is None or entry['last_used'] < self._entries[oldest]['last_used']:
+                    oldest = index
+            if slot is None:
+                slot = oldest
+
+            self._vectors[slot] = vector
+            self._entries[slot] = {
+                'answer': answer,
+                'chunk_ids': list(chunk_ids),
+                'last_used': now,
+                'expires_at': now + self.ttl
+            }
+            self._record('stores')
+
+    def _record(self, name: str):
+        """Count a cache event locally and in the metrics registry (lock held)"""
+        self._stats[name] += 1
+        metrics.incr(f'answer_cache.{name}')
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+
+        Returns:
+            Dictionary with hit/miss/store counts, hit rate and entry count
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = sum(1 for entry in self._entries if entry)
+            stats['kb_version'] = self._kb_version
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
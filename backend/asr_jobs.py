@@ -0,0 +1,187 @@
+"""
+Asynchronous batch transcription jobs processed on a bounded worker pool
+"""
+
+import os
+import uuid
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from utils.metrics import metrics
+
+class TranscriptionJobManager:
+    """Queue of batch transcription jobs sharing one worker pool"""
+
+    FINISHED_STATES = ('completed', 'failed')
+
+    def __init__(self, config, asr_service):
+        """
+        Initialize job manager
+
+        Args:
+            config: Application configuration object
+            asr_service: ASRService used to transcribe each file
+        """
+        self.config = config
+        self.asr_service = asr_service
+        self.logger = logging.getLogger(__name__)
+
+        # Throughput is bounded by the pool size, not by the number of clients
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.ASR_JOB_CONCURRENCY,
+            thread_name_prefix='asr-job'
+        )
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cond = threading.Condition()
+
+    def submit(self, items: List[Dict[str, str]]) -> str:
+        """
+        Queue a batch of audio files and URLs for transcription
+
+        Args:
+            items: List of {'name': ..., 'path': ...} for uploaded files or
+                {'name': ..., 'url': ...} for remote audio
+
+        Returns:
+            Job ID
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            'job_id': job_id,
+            'status': 'queued',
+            'created_at': datetime.now().isoformat(),
+            'finished_at': None,
+            'total': len(items),
+            'completed': 0,
+            'failed': 0,
+            'version': 0,
+            'files': [
+                {
+                    'index': index,
+                    'name': item.get('name') or item.get('url') or f'file_{index}',
+                    'source': 'url' if item.get('url') else 'upload',
+                    'status': 'queued',
+                    'text': None,
+                    'error': None,
+                    'duration': None
+                }
+                for index, item in enumerate(items)
+            ]
+        }
+
+        with self._cond:
+            self.jobs[job_id] = job
+            self._evict_finished_jobs()
+
+        for index, item in enumerate(items):
+            self.executor.submit(self._run_item, job_id, index, item)
+
+        metrics.incr('asr.jobs.submitted')
+        metrics.incr('asr.jobs.files', len(items))
+        self.logger.info(f"Transcription job {job_id} queued with {len(items)} files")
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a snapshot of a job
+
+        Args:
+            job_id: Job ID
+
+        Returns:
+            Job state dictionary, None if the job is unknown
+        """
+        with self._cond:
+            job = self.jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def wait_for_update(self, job_id: str, version: int, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Block until a job changes past the given version or the timeout expires
+
+        Args:
+            job_id: Job ID
+            version: Last version seen by the caller
+            timeout: Maximum wait in seconds
+
+        Returns:
+            Job state dictionary, None if the job is unknown
+        """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: job_id not in self.jobs or self.jobs[job_id]['version'] > version,
+                timeout=timeout
+            )
+            job = self.jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def _run_item(self, job_id: str, index: int, item: Dict[str, str]):
+        """Transcribe one file of a job on a worker thread"""
+        self._update_file(job_id, index, status='running')
+        start = time.perf_counter()
+
+        try:
+            if item.get('url'):
+                text = self.asr_service.transcribe_from_url(item['url'])
+            else:
+                # Report recognition failures instead of storing placeholder text
+                text = self.asr_service.transcribe(item['path'], raise_on_error=True)
+            self._update_file(job_id, index, status='completed', text=text,
+                              duration=round(time.perf_counter() - start, 3))
+        except Exception as e:
+            self.logger.error(f"Job {job_id} file {index} failed: {str(e)}")
+            self._update_file(job_id, index, status='failed', error=str(e),
+                              duration=round(time.perf_counter() - start, 3))
+        finally:
+            metrics.observe('asr.jobs.file', time.perf_counter() - start)
+            path = item.get('path')
+            if path and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except Exception:
+                    pass
+
+    def _update_file(self, job_id: str, index: int, **changes):
+        """Apply changes to a file entry and recompute the job status"""
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+
+            job['files'][index].update(changes)
+            statuses = [f['status'] for f in job['files']]
+            job['completed'] = statuses.count('completed')
+            job['failed'] = statuses.count('failed')
+
+            if job['completed'] + job['failed'] == job['total']:
+                job['status'] = 'completed' if job['completed'] else 'failed'
+                job['finished_at'] = datetime.now().isoformat()
+            elif 'running' in statuses or job['completed'] or job['failed']:
+                job['status'] = 'running'
+
+            job['version'] += 1
+            self._cond.notify_all()
+
+    def _evict_finished_jobs(self):
+        """Drop the oldest finished jobs beyond the retention limit"""
+        excess = len(self.jobs) - self.config.ASR_JOB_RETENTION
+        if excess <= 0:
+            return
+        for job_id in [j for j, job in self.jobs.items() if job['status'] in self.FINISHED_STATES][:excess]:
+            del self.jobs[job_id]
+
+    @staticmethod
+    def _snapshot(job: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy a job so it can be serialized outside the lock"""
+        snapshot = dict(job)
+        snapshot['files'] = [dict(f) for f in job['files']]
+        return snapshot
+
+    def shutdown(self):
+        """Stop accepting work and wait for running transcriptions"""
+        self.executor.shutdown(wait=True)
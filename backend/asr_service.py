@@ -2,16 +2,249 @@ import dashscope
 from dashscope.audio.asr import Recognition, RecognitionCallback, RecognitionResult
 import os
 import logging
-from typing import Optional
+from typing import Optional, Dict, Any, Callable, Iterable, Tuple
 import tempfile
 import subprocess
 import shutil
+import threading
 import time
+import wave
 from http import HTTPStatus
 
+from utils.metrics import metrics
+from .audio_utils import trim_and_normalize, read_wav_pcm, write_wav_pcm
+from .vad_processor import VADProcessor
+
+class PersistentRecognizer(RecognitionCallback):
+    """Streaming recognizer that keeps one connection open across utterances"""
+    
+    FRAME_BYTES = 3200  # 100ms of 16kHz 16-bit mono PCM
+    TRAILING_SILENCE = 0.8  # seconds of silence that let the server close a sentence
+    SETTLE_TIME = 0.3  # seconds to wait for further sentences after the first one
+    
+    def __init__(self, config, sample_rate: int = 16000):
+        """
+        Initialize persistent recognizer
+        
+        Args:
+            config: Application configuration object
+            sample_rate: Sample rate of the PCM audio that will be sent
+        """
+        self.config = config
+        self.sample_rate = sample_rate
+        self.idle_timeout = config.ASR_RECOGNIZER_IDLE_TIMEOUT
+        self.logger = logging.getLogger(__name__)
+        
+        self._recognition = None
+        self._connected = False
+        self._last_used = 0.0
+        self._utterance_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._sentences = []
+        self._partial = ''
+        self._on_partial = None
+    
+    # RecognitionCallback interface
+    def on_open(self) -> None:
+        self.logger.debug("Persistent recognizer connection opened")
+    
+    def on_close(self) -> None:
+        with self._cond:
+            self._connected = False
+            self._cond.notify_all()
+    
+    def on_complete(self) -> None:
+        with self._cond:
+            self._connected = False
+            self._cond.notify_all()
+    
+    def on_error(self, result: RecognitionResult) -> None:
+        self.logger.warning(f"Persistent recognizer error: {result.message}")
+        with self._cond:
+            self._connected = False
+            self._cond.notify_all()
+    
+    def on_event(self, result: RecognitionResult) -> None:
+        sentence = result.get_sentence()
+        if not isinstance(sentence, dict) or 'text' not in sentence:
+            return
+        with self._cond:
+            if RecognitionResult.is_sentence_end(sentence):
+                self._sentences.append(sentence['text'])
+                self._partial = ''
+                self._cond.notify_all()
+            else:
+                self._partial = sentence['text']
+            on_partial = self._on_partial
+            hypothesis = " ".join(self._sentences + ([self._partial] if self._partial else []))
+        if on_partial and hypothesis:
+            try:
+                on_partial(hypothesis)
+            except Exception as e:
+                self.logger.warning(f"Partial transcript callback failed: {e}")
+    
+    def is_idle(self) -> bool:
+        """Whether the connection has been unused for longer than the idle timeout"""
+        return time.time() - self._last_used > self.idle_timeout
+    
+    def _ensure_connected(self):
+        """Open the streaming connection, reopening it after idle timeout or error"""
+        if self._connected and not self.is_idle():
+            return
+        
+        if self._recognition is not None:
+            self._disconnect()
+        
+        start = time.perf_counter()
+        self._recognition = Recognition(
+            model=self.config.ASR_MODEL,
+            format='pcm',
+            sample_rate=self.sample_rate,
+            language_hints=['zh', 'en'],
+            callback=self
+        )
+        self._recognition.start()
+        self._connected = True
+        self._last_used = time.time()
+        
+        metrics.observe('asr.connect', time.perf_counter() - start)
+        metrics.incr('asr.connections_opened')
+    
+    def _disconnect(self):
+        """Stop the current recognition task, ignoring errors on dead connections"""
+        recognition, self._recognition = self._recognition, None
+        self._connected = False
+        if recognition is None:
+            return
+        try:
+            recognition.stop()
+        except Exception as e:
+            self.logger.debug(f"Stopping persistent recognizer failed: {e}")
+    
+    def transcribe_pcm(self, pcm_data: bytes, on_partial: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Transcribe one utterance over the shared connection
+        
+        Args:
+            pcm_data: 16-bit mono PCM audio of one utterance
+            on_partial: Optional callback receiving the transcript recognized
+                so far each time the recognizer revises it
+            
+        Returns:
+            Transcribed text, empty string if nothing was recognized
+            
+        Raises:
+            Exception: If the connection fails before any text is recognized
+        """
+        with self._utterance_lock:
+            self._ensure_connected()
+            
+            with self._cond:
+                self._sentences = []
+                self._partial = ''
+                self._on_partial = on_partial
+            
+            silence = bytes(int(self.sample_rate * self.TRAILING_SILENCE) * 2)
+            audio = pcm_data + silence
+            for i in range(0, len(audio), self.FRAME_BYTES):
+                self._recognition.send_audio_frame(audio[i:i + self.FRAME_BYTES])
+            
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._sentences or not self._connected,
+                    timeout=self.config.ASR_UTTERANCE_TIMEOUT
+                )
+                # A long utterance may be split into several sentences
+                count = len(self._sentences)
+                while count and self._connected and self._cond.wait_for(
+                        lambda: len(self._sentences) > count or not self._connected,
+                        timeout=self.SETTLE_TIME):
+                    if len(self._sentences) == count:
+                        break
+                    count = len(self._sentences)
+                
+                texts = list(self._sentences)
+                if self._partial:
+                    texts.append(self._partial)
+                connected = self._connected
+                self._on_partial = None
+            
+            self._last_used = time.time()
+            
+            if not texts and not connected:
+                raise Exception("Persistent recognizer connection closed")
+            
+            return " ".join(texts)
+    
+    def close(self):
+        """Close the streaming connection"""
+        with self._utterance_lock:
+            self._disconnect()
+
+class RecognizerPool:
+    """Per-session persistent recognizers with idle reaping"""
+    
+    def __init__(self, config):
+        """
+        Initialize recognizer pool
+        
+        Args:
+            config: Application configuration object
+        """
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        self._recognizers: Dict[str, PersistentRecognizer] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, session_id: str) -> PersistentRecognizer:
+        """
+        Get the recognizer of a session, creating it on first use
+        
+        Args:
+            session_id: Voice session identifier
+            
+        Returns:
+            Persistent recognizer bound to the session
+        """
+        self.reap_idle(exclude=session_id)
+        with self._lock:
+            recognizer = self._recognizers.get(session_id)
+            if recognizer is None:
+                recognizer = PersistentRecognizer(self.config)
+                self._recognizers[session_id] = recognizer
+            return recognizer
+    
+    def release(self, session_id: str):
+        """
+        Close and forget the recognizer of a session
+        
+        Args:
+            session_id: Voice session identifier
+        """
+        with self._lock:
+            recognizer = self._recognizers.pop(session_id, None)
+        if recognizer is not None:
+            recognizer.close()
+    
+    def reap_idle(self, exclude: str = None):
+        """Close recognizers whose connections have been idle past the timeout"""
+        with self._lock:
+            idle = [
+                session_id for session_id, recognizer in self._recognizers.items()
+                if session_id != exclude and recognizer.is_idle()
+            ]
+            recognizers = [self._recognizers.pop(session_id) for session_id in idle]
+        for recognizer in recognizers:
+            recognizer.close()
+        if recognizers:
+            self.logger.info(f"Closed {len(recognizers)} idle recognizer connections")
+
 class ASRService:
     """Automatic Speech Recognition service using DashScope with real API"""
     
+    # Containers whose index may sit at the end of the file, so FFmpeg cannot decode them from a pipe
+    SEEKABLE_ONLY_FORMATS = {'m4a', 'mp4', 'mov'}
+    
     def __init__(self, config):
         """
         Initialize ASR service
@@ -31,6 +264,12 @@ class ASRService:
             self.logger.info("FFmpeg detected - audio preprocessing enabled")
         else:
             self.logger.warning("FFmpeg not found - basic audio processing only")
+        
+        # Persistent streaming recognizers reused across utterances of a session
+        self.recognizer_pool = RecognizerPool(config)
+        
+        # VAD used to trim silence from audio that arrives without decisions
+        self._trim_vad = None
     
     def preprocess_audio(self, input_path: str) -> str:
         """
@@ -90,12 +329,20 @@ class ASRService:
             self.logger.warning(f"Audio preprocessing failed: {str(e)}, using original file")
             return input_path
     
-    def transcribe(self, audio_file_path: str) -> str:
+    def transcribe(self, audio_file_path: str, preprocess: bool = True,
+                   trim: bool = True, stats: Optional[Dict[str, Any]] = None,
+                   raise_on_error: bool = False) -> str:
         """
         Transcribe audio file to text using real DashScope API
         
         Args:
             audio_file_path: Path to audio file
+            preprocess: Whether to run FFmpeg preprocessing, False if the file
+                is already 16kHz mono wav
+            trim: Whether to trim leading/trailing silence and normalize gain
+            stats: Optional dictionary that receives the trimming statistics
+            raise_on_error: Raise when the recognition call fails instead of
+                returning placeholder text, for callers that report failures
             
         Returns:
             Transcribed text
@@ -110,10 +357,19 @@ class ASRService:
                 raise FileNotFoundError(f"Audio file not found: {audio_file_path}")
             
             # Preprocess audio file for better recognition
-            processed_file = self.preprocess_audio(audio_file_path)
+            processed_file = self.preprocess_audio(audio_file_path) if preprocess else audio_file_path
             preprocessed = processed_file != audio_file_path
+            trimmed_file = None
             
             try:
+                if trim:
+                    trimmed_file = self._trim_wav_file(processed_file, stats)
+                    if trimmed_file:
+                        if preprocessed:
+                            os.remove(processed_file)
+                        processed_file = trimmed_file
+                
+
                 # 使用真实的DashScope ASR API调用方式（基于官方文档）
                 self.logger.info(f"Calling DashScope ASR API with {'preprocessed' if preprocessed else 'original'} file")
                 
@@ -127,7 +383,8 @@ class ASRService:
                 )
                 
                 # 使用同步调用方式
-                result = recognition.call(processed_file)
+                with metrics.timer('asr.recognize'):
+                    result = recognition.call(processed_file)
                 
                 if result.status_code == HTTPStatus.OK:
                     self.logger.info("DashScope ASR API call successful")
@@ -156,6 +413,8 @@ class ASRService:
                 else:
                     error_msg = f"DashScope ASR API error: {getattr(result, 'message', 'Unknown error')}"
                     self.logger.warning(error_msg)
+                    if raise_on_error:
+                        raise Exception(error_msg)
                     # 降级到智能占位符
                     return self._get_intelligent_placeholder(audio_file_path, preprocessed)
                     
@@ -164,12 +423,14 @@ class ASRService:
                 # 记录详细错误信息用于调试
                 import traceback
                 self.logger.debug(f"ASR API error details: {traceback.format_exc()}")
+                if raise_on_error:
+                    raise
                 # 降级到智能占位符
                 return self._get_intelligent_placeholder(audio_file_path, preprocessed)
             
             finally:
-                # Clean up preprocessed file if it was created
-                if preprocessed and os.path.exists(processed_file):
+                # Clean up preprocessed or trimmed file if it was created
+                if (preprocessed or trimmed_file) and os.path.exists(processed_file):
                     try:
                         os.remove(processed_file)
                         self.logger.debug(f"Cleaned up preprocessed file: {processed_file}")
@@ -180,6 +441,219 @@ class ASRService:
             self.logger.error(f"Transcription failed: {str(e)}")
             raise Exception(f"语音识别失败: {str(e)}")
     
+    def transcribe_stream(self, chunks: Iterable[bytes], filename: str,
+                          stats: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Transcribe an upload while it is still arriving
+        
+        The bytes are piped into FFmpeg as they are received, so decoding runs
+        concurrently with the upload. Containers that need seeking (or hosts
+        without FFmpeg) are spooled to a unique temporary file instead.
+        
+        Args:
+            chunks: Iterable of audio bytes, e.g. UploadPart.iter_chunks()
+            filename: Original filename, used to determine the format
+            stats: Optional dictionary that receives the trimming statistics
+            
+        Returns:
+            Transcribed text
+        """
+        ext = os.path.splitext(filename)[1].lower()
+        
+        if not self.ffmpeg_available or ext.lstrip('.') in self.SEEKABLE_ONLY_FORMATS:
+            with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp_file:
+                temp_path = tmp_file.name
+                for chunk in chunks:
+                    tmp_file.write(chunk)
+            try:
+                return self.transcribe(temp_path, stats=stats)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        
+        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp_file:
+            output_path = tmp_file.name
+        # Keep a copy of the raw bytes in case FFmpeg cannot decode from a pipe
+        spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        fallback_path = None
+        
+        cmd = [
+            'ffmpeg', '-loglevel', 'error',
+            '-i', 'pipe:0',
+            '-ac', '1',  # Single channel (mono)
+            '-ar', '16000',  # 16kHz sample rate
+            '-acodec', 'pcm_s16le',
+            '-f', 'wav',
+            '-y', output_path
+        ]
+        process = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        
+        try:
+            start = time.perf_counter()
+            pipe_open = True
+            for chunk in chunks:
+                spool.write(chunk)
+                if pipe_open:
+                    try:
+                        process.stdin.write(chunk)
+                    except (BrokenPipeError, OSError):
+                        pipe_open = False
+            try:
+                process.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass
+            returncode = process.wait(timeout=30)
+            metrics.observe('asr.decode', time.perf_counter() - start)
+            
+            if returncode == 0 and os.path.getsize(output_path) > 44:
+                self.logger.info(f"Streamed upload decoded by FFmpeg: {output_path}")
+                return self.transcribe(output_path, preprocess=False, stats=stats)
+            
+            self.logger.warning("FFmpeg could not decode the streamed upload, using spooled file")
+            with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp_file:
+                fallback_path = tmp_file.name
+                spool.seek(0)
+                shutil.copyfileobj(spool, tmp_file)
+            return self.transcribe(fallback_path, stats=stats)
+            
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            spool.close()
+            for path in (output_path, fallback_path):
+                if path and os.path.exists(path):
+                    os.remove(path)
+    
+    def transcribe_pcm(self, pcm_data: bytes, session_id: str = None, sample_rate: int = 16000,
+                       speech_flags=None, stats: Optional[Dict[str, Any]] = None,
+                       on_partial: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Transcribe raw PCM audio, reusing the session's recognizer connection
+        
+        Args:
+            pcm_data: 16-bit mono PCM audio
+            session_id: Voice session identifier, enables connection reuse
+            sample_rate: Sample rate of the PCM audio
+            speech_flags: Per-frame VAD decisions used to trim silence
+            stats: Optional dictionary that receives the trimming statistics
+            on_partial: Optional callback receiving interim transcripts, only
+                called on the persistent recognizer path
+            
+        Returns:
+            Transcribed text
+        """
+        pcm_data, trim_stats = self.trim_pcm(pcm_data, speech_flags, sample_rate)
+        if stats is not None:
+            stats.update(trim_stats)
+        
+        if session_id and self.config.ASR_PERSISTENT_RECOGNIZER and sample_rate == 16000:
+            try:
+                with metrics.timer('asr.recognize'):
+                    text = self.recognizer_pool.get(session_id).transcribe_pcm(pcm_data, on_partial)
+                if text:
+                    self.logger.info(f"Persistent transcription successful: {text}")
+                    return text
+                self.logger.info("Persistent recognizer returned no text, falling back to file transcription")
+            except Exception as e:
+                self.logger.warning(f"Persistent recognizer failed, falling back to file transcription: {e}")
+                self.recognizer_pool.release(session_id)
+        
+        # 将原始PCM数据转换为WAV格式后走文件识别
+        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp_file:
+            temp_path = tmp_file.name
+        try:
+            with wave.open(temp_path, 'wb') as wav_file:
+                wav_file.setnchannels(1)  # 单声道
+                wav_file.setsampwidth(2)  # 16位音频
+                wav_file.setframerate(sample_rate)
+                wav_file.writeframes(pcm_data)
+            return self.transcribe(temp_path, preprocess=False, trim=False)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def trim_pcm(self, pcm_data: bytes, speech_flags=None,
+                 sample_rate: int = 16000) -> Tuple[bytes, Dict[str, Any]]:
+        """
+        Trim leading/trailing non-speech and normalize gain before upload
+        
+        Args:
+            pcm_data: 16-bit mono PCM audio
+            speech_flags: Per-frame VAD decisions already computed for the
+                audio; classified here if not given
+            sample_rate: Sample rate of the PCM audio
+            
+        Returns:
+            Tuple of (processed PCM bytes, statistics dictionary)
+        """
+        if not self.config.ASR_TRIM_SILENCE or sample_rate != 16000:
+            return pcm_data, {}
+        
+        if self._trim_vad is None:
+            self._trim_vad = VADProcessor(sample_rate=sample_rate, vad_mode=3, frame_duration_ms=20)
+        if speech_flags is None:
+            speech_flags = self._trim_vad.classify_frames(pcm_data)
+        
+        trimmed, trim_stats = trim_and_normalize(
+            pcm_data,
+            speech_flags,
+            self._trim_vad.frame_bytes,
+            sample_rate=sample_rate,
+            padding_ms=self.config.ASR_TRIM_PADDING_MS,
+            target_dbfs=self.config.ASR_TARGET_DBFS,
+            max_gain_db=self.config.ASR_MAX_GAIN_DB
+        )
+        
+        metrics.incr('asr.trim.bytes_saved', trim_stats['bytes_saved'])
+        metrics.incr('asr.trim.seconds_saved', trim_stats['seconds_saved'])
+        self.logger.info(
+            f"Trimmed audio: saved {trim_stats['bytes_saved']} bytes / "
+            f"{trim_stats['seconds_saved']}s, gain {trim_stats['gain_db']}dB"
+        )
+        return trimmed, trim_stats
+    
+    def _trim_wav_file(self, wav_path: str, stats: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        Write a trimmed copy of a 16kHz mono wav file
+        
+        Args:
+            wav_path: Path to wav file
+            stats: Optional dictionary that receives the trimming statistics
+            
+        Returns:
+            Path to the trimmed temporary file, None if nothing was trimmed
+        """
+        if not self.config.ASR_TRIM_SILENCE or not wav_path.lower().endswith('.wav'):
+            return None
+        
+        try:
+            pcm_data, sample_rate = read_wav_pcm(wav_path)
+            trimmed, trim_stats = self.trim_pcm(pcm_data, sample_rate=sample_rate)
+            if stats is not None:
+                stats.update(trim_stats)
+            if not trim_stats or trimmed is pcm_data:
+                return None
+            
+            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp_file:
+                trimmed_path = tmp_file.name
+            write_wav_pcm(trimmed_path, trimmed, sample_rate)
+            return trimmed_path
+            
+        except Exception as e:
+            self.logger.warning(f"Silence trimming skipped: {str(e)}")
+            return None
+    
+    def release_session(self, session_id: str):
+        """
+        Close the persistent recognizer of a finished session
+        
+        Args:
+            session_id: Voice session identifier
+        """
+        self.recognizer_pool.release(session_id)
+    
     def _get_intelligent_placeholder(self, audio_file_path: str, preprocessed: bool) -> str:
         """
         Get intelligent placeholder based on audio file characteristics
@@ -226,39 +700,53 @@ class ASRService:
         except Exception:
             return "语音识别测试中... (API调用失败)"
     
-    def transcribe_streaming(self, audio_file_path: str) -> str:
+    def transcribe_streaming(self, audio_file_path: str, pacing: float = None) -> str:
         """
         Transcribe audio file using streaming API (for real-time scenarios)
         
         Args:
             audio_file_path: Path to audio file
+            pacing: Send rate as a multiple of real time; 1.0 simulates a live
+                stream, 4.0 sends four times faster, 0 sends as fast as the
+                server accepts. Defaults to Config.ASR_STREAMING_PACING
             
         Returns:
             Transcribed text
         """
+        if pacing is None:
+            pacing = self.config.ASR_STREAMING_PACING
+        
         try:
-            self.logger.info(f"Starting streaming transcription for: {audio_file_path}")
+            self.logger.info(f"Starting streaming transcription for: {audio_file_path} (pacing: {pacing or 'max'})")
             
             # 流式识别回调类
             class StreamingCallback(RecognitionCallback):
                 def __init__(self):
                     self.results = []
-                    self.completed = False
+                    self.partial = ''
+                    self.done = threading.Event()
                     self.error_message = None
                 
                 def on_complete(self) -> None:
-                    self.completed = True
+                    self.done.set()
                 
                 def on_error(self, result: RecognitionResult) -> None:
                     self.error_message = f"Recognition error: {result.message}"
-                    self.completed = True
+                    self.done.set()
+                
+                def on_close(self) -> None:
+                    self.done.set()
                 
                 def on_event(self, result: RecognitionResult) -> None:
                     sentence = result.get_sentence()
                     if 'text' in sentence:
-                        self.results.append(sentence['text'])
+                        # 只保留句末结果，中间结果会被后续事件覆盖
                         if RecognitionResult.is_sentence_end(sentence):
+                            self.results.append(sentence['text'])
+                            self.partial = ''
                             logging.info(f"Sentence end: {sentence['text']}")
+                        else:
+                            self.partial = sentence['text']
             
             callback = StreamingCallback()
             
@@ -272,33 +760,47 @@ class ASRService:
             )
             
             # 开始流式识别
+            start_time = time.perf_counter()
             recognition.start()
             
             # 读取音频文件并分段发送
             try:
+                frame_bytes = 3200  # 每次读取3200字节（16kHz 16位单声道100ms）
+                frame_seconds = frame_bytes / (16000 * 2)
+                sent_seconds = 0.0
+                
                 with open(audio_file_path, 'rb') as f:
                     while True:
-                        audio_data = f.read(3200)  # 每次读取3200字节
+                        audio_data = f.read(frame_bytes)
                         if not audio_data:
                             break
                         recognition.send_audio_frame(audio_data)
-                        time.sleep(0.1)  # 模拟实时流
+                        
+                        if pacing and pacing > 0:
+                            # 按目标倍速发送，基于截止时间而非固定休眠，避免误差累积
+                            sent_seconds += frame_seconds
+                            delay = start_time + sent_seconds / pacing - time.perf_counter()
+                            if delay > 0:
+                                time.sleep(delay)
                 
                 # 停止识别
                 recognition.stop()
                 
-                # 等待完成
-                max_wait_time = 30  # 最多等待30秒
-                wait_count = 0
-                while not callback.completed and wait_count < max_wait_time * 10:
-                    time.sleep(0.1)
-                    wait_count += 1
+                # 等待完成事件
+                if not callback.done.wait(timeout=self.config.ASR_STREAMING_COMPLETE_TIMEOUT):
+                    self.logger.warning("Streaming recognition did not complete in time")
+                
+                metrics.observe('asr.streaming', time.perf_counter() - start_time)
                 
                 if callback.error_message:
                     raise Exception(callback.error_message)
                 
-                if callback.results:
-                    full_text = " ".join(callback.results)
+                texts = list(callback.results)
+                if callback.partial:
+                    texts.append(callback.partial)
+                
+                if texts:
+                    full_text = " ".join(texts)
                     self.logger.info(f"Streaming transcription successful: {full_text}")
                     return full_text
                 else:
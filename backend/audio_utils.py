@@ -0,0 +1,275 @@
+"""
+Audio helpers: PCM preprocessing before recognition and MP3 frame handling for synthesis
+"""
+
+import wave
+import struct
+import logging
+from typing import Dict, Any, List, Optional, Tuple, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def trim_and_normalize(pcm_data: bytes,
+                       speech_flags: Sequence[bool],
+                       frame_bytes: int,
+                       sample_rate: int = 16000,
+                       padding_ms: int = 200,
+                       target_dbfs: float = -20.0,
+                       max_gain_db: float = 20.0) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Trim leading and trailing non-speech and normalize the speech loudness
+
+    Args:
+        pcm_data: 16-bit mono PCM audio
+        speech_flags: Per-frame VAD decisions covering the start of pcm_data
+        frame_bytes: Size of one VAD frame in bytes
+        sample_rate: Sample rate of the audio
+        padding_ms: Non-speech kept on each side of the speech region
+        target_dbfs: Target RMS level of the speech frames
+        max_gain_db: Upper bound of the applied gain
+
+    Returns:
+        Tuple of (processed PCM bytes, statistics dictionary)
+    """
+    samples = np.frombuffer(pcm_data[:len(pcm_data) // 2 * 2], dtype=np.int16)
+    flags = np.asarray(speech_flags, dtype=bool)
+    frame_samples = frame_bytes // 2
+    frame_count = min(len(flags), len(samples) // frame_samples)
+    flags = flags[:frame_count]
+
+    stats = {
+        'original_bytes': len(pcm_data),
+        'trimmed_bytes': len(pcm_data),
+        'bytes_saved': 0,
+        'seconds_saved': 0.0,
+        'gain_db': 0.0
+    }
+
+    speech_index = np.flatnonzero(flags)
+    if speech_index.size == 0:
+        # Nothing detected as speech; leave the audio to the recognizer untouched
+        return pcm_data, stats
+
+    padding = int(np.ceil(padding_ms * sample_rate / 1000.0 / frame_samples))
+    first = max(int(speech_index[0]) - padding, 0)
+    last = int(speech_index[-1]) + 1 + padding
+    start = first * frame_samples
+    # Keep the partial frame at the end only if the padded region reaches it
+    end = len(samples) if last >= frame_count else last * frame_samples
+    trimmed = samples[start:end].astype(np.float32)
+
+    # Measure loudness on speech frames only so silence does not inflate the gain
+    region_flags = flags[first:min(last, frame_count)]
+    whole_frames = trimmed[:len(region_flags) * frame_samples].reshape(-1, frame_samples)
+    speech = whole_frames[region_flags]
+    rms = float(np.sqrt(np.mean(np.square(speech)))) if speech.size else 0.0
+    peak = float(np.max(np.abs(trimmed))) if trimmed.size else 0.0
+
+    gain = 1.0
+    if rms > 0:
+        target_rms = 32768.0 * 10 ** (target_dbfs / 20.0)
+        gain = min(target_rms / rms, 10 ** (max_gain_db / 20.0))
+        if peak > 0:
+            gain = min(gain, 32767.0 * 0.98 / peak)  # avoid clipping
+
+    if abs(gain - 1.0) > 1e-3:
+        trimmed = np.clip(np.rint(trimmed * gain), -32768, 32767)
+        stats['gain_db'] = round(float(20 * np.log10(gain)), 2)
+
+    output = trimmed.astype(np.int16).tobytes()
+    saved = len(pcm_data) - len(output)
+    stats.update({
+        'trimmed_bytes': len(output),
+        'bytes_saved': saved,
+        'seconds_saved': round(saved / 2.0 / sample_rate, 3)
+    })
+    return output, stats
+
+def read_wav_pcm(path: str) -> Tuple[bytes, int]:
+    """
+    Read 16-bit mono PCM frames from a wav file
+
+    Args:
+        path: Path to wav file
+
+    Returns:
+        Tuple of (PCM bytes, sample rate)
+
+    Raises:
+        ValueError: If the file is not 16-bit mono PCM
+    """
+    with wave.open(path, 'rb') as wav_file:
+        if wav_file.getnchannels() != 1 or wav_file.getsampwidth() != 2:
+            raise ValueError("Only 16-bit mono wav is supported")
+        return wav_file.readframes(wav_file.getnframes()), wav_file.getframerate()
+
+def write_wav_pcm(path: str, pcm_data: bytes, sample_rate: int = 16000):
+    """
+    Write 16-bit mono PCM frames to a wav file
+
+    Args:
+        path: Output path
+        pcm_data: 16-bit mono PCM audio
+        sample_rate: Sample rate of the audio
+    """
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm_data)
+
+# MPEG audio Layer III tables: bitrate in kbps by index, sample rate by version
+_MP3_BITRATES = {
+    'v1': (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    'v2': (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+}
+_MP3_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),  # MPEG-1
+    2: (22050, 24000, 16000),  # MPEG-2
+    0: (11025, 12000, 8000)    # MPEG-2.5
+}
+_VBR_HEADER_TAGS = (b'Xing', b'Info', b'VBRI')
+
+def _parse_mp3_header(data: bytes, pos: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a Layer III frame header
+
+    Args:
+        data: MP3 stream
+        pos: Offset of the candidate header
+
+    Returns:
+        Tuple of (frame length, side information length), None if no valid header starts at pos
+    """
+    if pos + 4 > len(data) or data[pos] != 0xFF or data[pos + 1] & 0xE0 != 0xE0:
+        return None
+
+    version = (data[pos + 1] >> 3) & 0x03
+    layer = (data[pos + 1] >> 1) & 0x03
+    bitrate_index = data[pos + 2] >> 4
+    sample_rate_index = (data[pos + 2] >> 2) & 0x03
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = _MP3_BITRATES['v1' if mpeg1 else 'v2'][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][sample_rate_index]
+    padding = (data[pos + 2] >> 1) & 0x01
+    mono = (data[pos + 3] >> 6) == 3
+
+    length = (144 if mpeg1 else 72) * bitrate // sample_rate + padding
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    return length, side_info
+
+def _mp3_payload_bounds(data: bytes) -> Tuple[int, int]:
+    """Locate the audio frames between a leading ID3v2 and a trailing ID3v1 tag"""
+    start = 0
+    if data[:3] == b'ID3' and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        start = 10 + size + (10 if data[5] & 0x10 else 0)
+
+    end = len(data)
+    if end - start >= 128 and data[end - 128:end - 125] == b'TAG':
+        end -= 128
+    return start, end
+
+def split_mp3_frames(data: bytes) -> List[Tuple[int, int, bool]]:
+    """
+    Split an MP3 stream into frames, skipping tags and junk between frames
+
+    Args:
+        data: MP3 stream
+
+    Returns:
+        List of (start, end, is_vbr_header) frame spans
+
+    Raises:
+        ValueError: If no frames are found
+    """
+    pos, end = _mp3_payload_bounds(data)
+    frames = []
+    while pos < end:
+        header = _parse_mp3_header(data, pos)
+        if header is None:
+            # Resynchronize on the next frame sync byte
+            pos = data.find(b'\xff', pos + 1, end)
+            if pos < 0:
+                break
+            continue
+
+        length, side_info = header
+        frame_end = min(pos + length, end)
+        # A Xing/Info/VBRI frame carries stream metadata instead of audio
+        tag_offset = pos + 4 + side_info
+        is_vbr_header = not frames and (
+            data[tag_offset:tag_offset + 4] in _VBR_HEADER_TAGS or
+            data[pos + 36:pos + 40] == b'VBRI'
+        )
+        frames.append((pos, frame_end, is_vbr_header))
+        pos = frame_end
+
+    if not frames:
+        raise ValueError("No MP3 frames found")
+    return frames
+
+def concat_mp3(segments: Sequence[bytes]) -> bytes:
+    """
+    Join MP3 segments at frame boundaries without re-encoding
+
+    Tags are stripped and each segment's Xing/Info/VBRI frame is dropped,
+    since it would describe only that segment's length.
+
+    Args:
+        segments: MP3 streams in playback order
+
+    Returns:
+        Single MP3 stream
+
+    Raises:
+        ValueError: If a segment contains no MP3 frames
+    """
+    output = bytearray()
+    for segment in segments:
+        for start, end, is_vbr_header in split_mp3_frames(segment):
+            if not is_vbr_header:
+                output += segment[start:end]
+    return bytes(output)
+
+def concat_wav(segments: Sequence[bytes]) -> bytes:
+    """
+    Join WAV segments of identical format into one file
+
+    Args:
+        segments: WAV streams in playback order
+
+    Returns:
+        Single WAV stream whose header is rewritten with the joined sizes
+
+    Raises:
+        ValueError: If a segment has no data chunk
+    """
+    header = None
+    pcm_parts = []
+    for segment in segments:
+        if segment[:4] != b'RIFF' or segment[8:12] != b'WAVE':
+            raise ValueError("Not a WAV stream")
+        pos = 12
+        while pos + 8 <= len(segment):
+            chunk_id = segment[pos:pos + 4]
+            chunk_size = struct.unpack_from('<I', segment, pos + 4)[0]
+            if chunk_id == b'data':
+                break
+            pos += 8 + chunk_size + (chunk_size & 1)
+        else:
+            raise ValueError("WAV data chunk not found")
+        if header is None:
+            header = bytearray(segment[:pos + 8])
+        # Streamed WAV may carry a placeholder data size, so take everything after the chunk header
+        pcm_parts.append(segment[pos + 8:])
+
+    data = b''.join(pcm_parts)
+    struct.pack_into('<I', header, 4, len(header) - 8 + len(data))
+    struct.pack_into('<I', header, len(header) - 4, len(data))
+    return bytes(header) + data
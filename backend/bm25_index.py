@@ -0,0 +1,273 @@
+"""
+Local BM25 inverted index over knowledge base chunks, and reciprocal rank fusion
+"""
+
+import os
+import re
+import json
+import math
+import heapq
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+import jieba
+
+from utils.metrics import metrics
+
+_TOKEN_RE = re.compile(r'\w')
+_STOPWORDS = frozenset(
+    '的 了 吗 呢 吧 啊 呀 是 在 有 和 与 及 或 就 都 也 还 而 被 把 给 让 这 那 这个 那个 之 其 '
+    'the a an and or of to in on for is are was were be by with as at it this that'.split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into index terms with jieba's search mode
+
+    Args:
+        text: Chunk or query text
+
+    Returns:
+        Lower-cased terms without punctuation and stopwords
+    """
+    return [
+        term for term in (token.strip().lower() for token in jieba.lcut_for_search(text))
+        if term and term not in _STOPWORDS and _TOKEN_RE.search(term)
+    ]
+
+class BM25Index:
+    """
+    Inverted index scoring chunks with Okapi BM25
+
+    Chunks are added and removed per document, mirroring the vector store,
+    and every change is persisted to a JSON file holding each chunk's text,
+    metadata and term frequencies, so loading needs no re-tokenization.
+
+    Each save rewrites the whole file, so its cost grows with the index.
+    Bulk imports pass save=False and call save() once at the end. The file
+    is written outside the index lock, so searches are not blocked by disk I/O.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        """
+        Initialize BM25 index
+
+        Args:
+            path: JSON file the index is persisted to
+            k1: Term frequency saturation
+            b: Length normalization strength
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.RLock()
+        # Serializes saves so a later snapshot is never replaced by an earlier one
+        self._save_lock = threading.Lock()
+        # chunk id -> {'document_id', 'content', 'metadata', 'terms', 'length'}
+        self._chunks: Dict[str, Dict[str, Any]] = {}
+        # term -> {chunk id: term frequency}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def _load(self):
+        """Load the persisted index if there is one, replacing the indexed chunks"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                chunks = json.load(f)
+            with self._lock:
+                self._chunks, self._postings, self._total_length = {}, {}, 0
+                for chunk_id, chunk in chunks.items():
+                    self._insert(chunk_id, chunk)
+            self.logger.info(f"BM25 index loaded: {len(self._chunks)} chunks, {len(self._postings)} terms")
+        except Exception as e:
+            self.logger.error(f"Failed to load BM25 index: {str(e)}")
+
+    def reload(self):
+        """Re-read the persisted index, picking up changes saved by another process"""
+        self._load()
+
+    def save(self):
+        """Persist the index atomically"""
+        with self._save_lock:
+            with self._lock:
+                payload = json.dumps(self._chunks, ensure_ascii=False)
+            # Each process and thread writes its own temp file, so concurrent
+            # saves never interleave before os.replace publishes one of them
+            temp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(payload)
+                os.replace(temp_path, self.path)
+            except Exception as e:
+                self.logger.error(f"Failed to save BM25 index: {str(e)}")
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    def _insert(self, chunk_id: str, chunk: Dict[str, Any]):
+        """Add a chunk to the postings (lock held)"""
+        if chunk_id in self._chunks:
+            self._delete(chunk_id)
+        self._chunks[chunk_id] = chunk
+        self._total_length += chunk['length']
+        for term, frequency in chunk['terms'].items():
+            self._postings.setdefault(term, {})[chunk_id] = frequency
+
+    def _delete(self, chunk_id: str):
+        """Remove a chunk from the postings (lock held)"""
+        chunk = self._chunks.pop(chunk_id)
+        self._total_length -= chunk['length']
+        for term in chunk['terms']:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def add_chunks(self, document_id: str, ids: List[str], texts: List[str],
+                   metadatas: Optional[List[Dict[str, Any]]] = None, save: bool = True):
+        """
+        Index the chunks of a document
+
+        Args:
+            document_id: Document the chunks belong to
+            ids: Chunk ids, the same as in the vector store
+            texts: Chunk texts
+            metadatas: Chunk metadata, stored alongside the text
+            save: Whether to persist the index afterwards
+        """
+        metadatas = metadatas or [{} for _ in ids]
+        prepared = []
+        for chunk_id, text, metadata in zip(ids, texts, metadatas):
+            terms = tokenize(text)
+            prepared.append((chunk_id, {
+                'document_id': document_id,
+                'content': text,
+                'metadata': metadata,
+                'terms': dict(Counter(terms)),
+                'length': len(terms)
+            }))
+
+        with self._lock:
+            for chunk_id, chunk in prepared:
+                self._insert(chunk_id, chunk)
+        if save:
+            self.save()
+
+    def remove_document(self, document_id: str, save: bool = True) -> int:
+        """
+        Drop every chunk of a document
+
+        Args:
+            document_id: Document to remove
+            save: Whether to persist the index afterwards
+
+        Returns:
+            Number of chunks removed
+        """
+        with self._lock:
+            chunk_ids = [cid for cid, chunk in self._chunks.items() if chunk['document_id'] == document_id]
+            for chunk_id in chunk_ids:
+                self._delete(chunk_id)
+        if chunk_ids and save:
+            self.save()
+        return len(chunk_ids)
+
+    def search(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
+        """
+        Find the chunks that best match a query
+
+        Args:
+            query: Search query
+            k: Number of results to return
+
+        Returns:
+            List of {'id', 'content', 'metadata', 'bm25_score', 'rank'} dictionaries
+        """
+        terms = Counter(tokenize(query))
+        scores: Dict[str, float] = {}
+        with self._lock:
+            count = len(self._chunks)
+            if not count or not terms:
+                return []
+            average_length = self._total_length / count or 1.0
+            for term, query_frequency in terms.items():
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, frequency in postings.items():
+                    length = self._chunks[chunk_id]['length']
+                    norm = frequency + self.k1 * (1 - self.b + self.b * length / average_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + \
+                        query_frequency * idf * frequency * (self.k1 + 1) / norm
+
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            results = [
+                {
+                    "id": chunk_id,
+                    "content": self._chunks[chunk_id]['content'],
+                    "metadata": self._chunks[chunk_id]['metadata'],
+                    "bm25_score": round(score, 4),
+                    "rank": rank
+                }
+                for rank, (chunk_id, score) in enumerate(best, 1)
+            ]
+        metrics.incr('bm25.searches')
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get index statistics
+
+        Returns:
+            Number of chunks and distinct terms
+        """
+        with self._lock:
+            return {'chunks': len(self._chunks), 'terms': len(self._postings)}
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict[str, Any]]], k: int,
+                           constant: int = 60) -> List[Dict[str, Any]]:
+    """
+    Merge ranked result lists by reciprocal rank fusion
+
+    Each chunk scores sum(1 / (constant + rank)) over the lists it appears
+    in, so chunks ranked well by several retrievers rise to the top without
+    having to compare their raw scores.
+
+    Args:
+        result_lists: Ranked results, each entry with an 'id'
+        k: Number of fused results to return
+        constant: Rank offset damping the weight of top positions
+
+    Returns:
+        Fused results with 'rrf_score' and a new 'rank'
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, 1):
+            entry = fused.get(result['id'])
+            if entry is None:
+                entry = fused[result['id']] = dict(result, rrf_score=0.0)
+            else:
+                # Keep the scores every retriever reported
+                for key, value in result.items():
+                    entry.setdefault(key, value)
+            entry['rrf_score'] += 1.0 / (constant + rank)
+
+    ranked = sorted(fused.values(), key=lambda entry: entry['rrf_score'], reverse=True)[:k]
+    for rank, entry in enumerate(ranked, 1):
+        entry['rrf_score'] = round(entry['rrf_score'], 6)
+        entry['rank'] = rank
+    return ranked
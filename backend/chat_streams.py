@@ -0,0 +1,165 @@
+"""
+Chat response streams decoupled from the HTTP connection, with bounded replay for resuming clients
+"""
+
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Deque, Iterable, List, Optional, Tuple
+
+from utils.metrics import metrics
+
+# (event id, event name or None for the default message event, JSON data)
+Event = Tuple[int, Optional[str], str]
+
+class _ChatStream:
+    """Buffered events of one chat response"""
+
+    __slots__ = ('stream_id', 'events', 'next_id', 'finished', 'finished_at', 'cond')
+
+    def __init__(self, stream_id: str, replay_size: int, lock: threading.Lock):
+        self.stream_id = stream_id
+        self.events: Deque[Event] = deque(maxlen=replay_size)
+        self.next_id = 1
+        self.finished = False
+        self.finished_at = 0.0
+        self.cond = threading.Condition(lock)
+
+class ChatStreamManager:
+    """
+    Run chat generators in the background and let clients follow them by event id
+
+    The response of a chat turn is produced on a worker thread whatever
+    happens to the HTTP connection, and its events are numbered and kept in a
+    per-stream ring buffer. A client that loses the connection reconnects
+    with the id of the last event it received and continues from there
+    without a new LLM call, as long as the events it missed are still
+    buffered. Finished streams are kept for a retention period.
+    """
+
+    def __init__(self, config):
+        """
+        Initialize chat stream manager
+
+        Args:
+            config: Application configuration object
+        """
+        self.replay_size = config.CHAT_STREAM_REPLAY_EVENTS
+        self.retention = config.CHAT_STREAM_RETENTION
+        self.max_streams = config.CHAT_STREAM_MAX_STREAMS
+        self.logger = logging.getLogger(__name__)
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.CHAT_STREAM_WORKERS,
+            thread_name_prefix='chat-stream'
+        )
+        self._lock = threading.Lock()
+        self._streams: "OrderedDict[str, _ChatStream]" = OrderedDict()
+
+    def start(self, producer: Callable[[], Iterable[Dict[str, Any]]]) -> str:
+        """
+        Start producing a chat response in the background
+
+        Args:
+            producer: Function returning the iterable of response chunks
+
+        Returns:
+            Stream ID, also delivered as the first event of the stream
+        """
+        stream_id = uuid.uuid4().hex
+        with self._lock:
+            self._purge()
+            stream = self._streams[stream_id] = _ChatStream(stream_id, self.replay_size, self._lock)
+            self._append(stream, {'stream_id': stream_id}, event='stream')
+
+        self.executor.submit(self._run, stream, producer)
+        metrics.incr('chat_stream.started')
+        return stream_id
+
+    def _run(self, stream: _ChatStream, producer: Callable[[], Iterable[Dict[str, Any]]]):
+        """Drain the producer into the stream's buffer on a worker thread"""
+        try:
+            for chunk in producer():
+                with self._lock:
+                    self._append(stream, chunk)
+            final = {'finished': True}
+        except Exception as e:
+            self.logger.error(f"Chat stream {stream.stream_id} failed: {str(e)}")
+            final = {'error': f'对话生成失败: {str(e)}'}
+        with self._lock:
+            self._append(stream, final)
+            stream.finished = True
+            stream.finished_at = time.monotonic()
+            stream.cond.notify_all()
+
+    @staticmethod
+    def _append(stream: _ChatStream, data: Dict[str, Any], event: Optional[str] = None):
+        """Number and buffer an event, waking followers (lock held)"""
+        stream.events.append((stream.next_id, event, json.dumps(data, ensure_ascii=False)))
+        stream.next_id += 1
+        stream.cond.notify_all()
+
+    def wait_for_events(self, stream_id: str, last_event_id: int,
+                        timeout: float) -> Optional[Tuple[List[Event], bool, bool]]:
+        """
+        Block until a stream has events after the given id, finishes, or the timeout expires
+
+        Args:
+            stream_id: Stream ID
+            last_event_id: Id of the last event the client received, 0 for none
+            timeout: Maximum wait in seconds
+
+        Returns:
+            Tuple of (events after last_event_id, whether the stream is
+            finished, whether events the client needs have already left the
+            replay buffer), None if the stream is unknown or expired
+        """
+        with self._lock:
+            stream = self._streams.get(stream_id)
+            if stream is None:
+                return None
+            stream.cond.wait_for(lambda: stream.next_id - 1 > last_event_id or stream.finished, timeout=timeout)
+            oldest = stream.events[0][0] if stream.events else stream.next_id
+            missed = last_event_id + 1 < oldest
+            events = [event for event in stream.events if event[0] > last_event_id]
+            return events, stream.finished, missed
+
+    def _purge(self):
+        """Drop expired finished streams and the oldest finished ones beyond the cap (lock held)"""
+        now = time.monotonic()
+        expired = [
+            stream_id for stream_id, stream in self._streams.items()
+            if stream.finished and now - stream.finished_at > self.retention
+        ]
+        excess = len(self._streams) - len(expired) - self.max_streams + 1
+        if excess > 0:
+            expired += [
+                stream_id for stream_id, stream in self._streams.items()
+                if stream.finished and stream_id not in expired
+            ][:excess]
+        for stream_id in expired:
+            del self._streams[stream_id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get stream statistics
+
+        Returns:
+            Dictionary with active and finished stream counts and buffered events
+        """
+        with self._lock:
+            active = sum(1 for stream in self._streams.values() if not stream.finished)
+            return {
+                'active': active,
+                'finished': len(self._streams) - active,
+                'buffered_events': sum(len(stream.events) for stream in self._streams.values()),
+                'replay_size': self.replay_size
+            }
+
+    def shutdown(self):
+        """Stop accepting streams and let running responses finish"""
+        self.executor.shutdown(wait=False)
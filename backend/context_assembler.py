@@ -0,0 +1,183 @@
+"""
+Token-budgeted assembly of the RAG prompt from retrieved chunks, history and the question
+"""
+
+import re
+import math
+import logging
+from functools import lru_cache
+from typing import Dict, Any, List
+
+import dashscope
+
+from utils.metrics import metrics
+
+_CJK_RE = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]')
+_WORD_RE = re.compile(r'[A-Za-z]+|\d+|[^\sA-Za-z\d]')
+
+class TokenCounter:
+    """
+    Prompt token counts with a per-string cache
+
+    Uses the DashScope tokenizer of the model when it can be loaded (it needs
+    tiktoken), otherwise an estimate tuned for Chinese text: Qwen vocabularies
+    hold most common words, so a CJK character costs a bit under one token,
+    while Latin words cost about one token per four letters.
+    """
+
+    CJK_TOKENS_PER_CHAR = 0.8
+
+    def __init__(self, model: str, cache_size: int = 4096):
+        """
+        Initialize token counter
+
+        Args:
+            model: LLM model name used to pick the tokenizer
+            cache_size: Number of distinct strings whose counts are cached
+        """
+        self.logger = logging.getLogger(__name__)
+        self.tokenizer = None
+        try:
+            self.tokenizer = dashscope.get_tokenizer(model)
+        except Exception as e:
+            self.logger.info(f"Tokenizer for {model} unavailable, estimating token counts: {str(e)}")
+
+        # System prompt, chunks and history turns repeat across requests
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    def _count(self, text: str) -> int:
+        """Token count of one string"""
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text))
+        return self.estimate(text)
+
+    @classmethod
+    def estimate(cls, text: str) -> int:
+        """
+        Estimate the token count of text without a tokenizer
+
+        Args:
+            text: Text to measure
+
+        Returns:
+            Estimated number of tokens
+        """
+        cjk = len(_CJK_RE.findall(text))
+        tokens = math.ceil(cjk * cls.CJK_TOKENS_PER_CHAR)
+        for word in _WORD_RE.findall(_CJK_RE.sub(' ', text)):
+            tokens += math.ceil(len(word) / 4) if word[0].isalnum() else 1
+        return tokens
+
+class ContextAssembler:
+    """
+    Build the user prompt within a token budget
+
+    The system prompt and the current question are always kept. What is
+    left of MAX_CONTEXT_TOKENS goes to retrieved chunks first (up to
+    CONTEXT_DOCUMENT_SHARE of it, in rank order) and then to history
+    (newest turns first); budget history leaves unused is offered back to
+    chunks that did not fit. Items are kept or dropped whole, never cut.
+    """
+
+    def __init__(self, config):
+        """
+        Initialize context assembler
+
+        Args:
+            config: Application configuration object
+        """
+        self.max_tokens = config.MAX_CONTEXT_TOKENS
+        self.document_share = config.CONTEXT_DOCUMENT_SHARE
+        self.counter = TokenCounter(config.LLM_MODEL)
+        self.logger = logging.getLogger(__name__)
+
+    def assemble(self, system_prompt: str, question: str, documents: List[Dict[str, Any]],
+                 history: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Assemble the user prompt
+
+        Args:
+            system_prompt: System message sent alongside the prompt
+            question: Current user message
+            documents: Retrieved chunks in rank order, each with 'content'
+            history: Conversation turns oldest first, each with 'user' and 'assistant'
+
+        Returns:
+            Dictionary with 'prompt', 'documents' and 'history' (the kept
+            items) and 'tokens' (per-part and total counts)
+        """
+        count = self.counter.count
+        question_line = f"当前问题: {question}"
+        tokens = {
+            'system': count(system_prompt),
+            'question': count(question_line),
+            'documents': 0,
+            'history': 0
+        }
+        remaining = self.max_tokens - tokens['system'] - tokens['question']
+        if remaining < 0:
+            self.logger.warning(f"System prompt and question alone use {-remaining} tokens over the budget")
+            remaining = 0
+
+        # Retrieved chunks, in rank order, within their share of the budget
+        document_costs = [count(f"{i}. {doc['content']}") for i, doc in enumerate(documents, 1)]
+        kept_documents = set()
+        document_budget = int(remaining * self.document_share)
+        for index, cost in enumerate(document_costs):
+            if tokens['documents'] + cost <= document_budget:
+                kept_documents.add(index)
+                tokens['documents'] += cost
+
+        # History, newest turn first, stopping at the first turn that does not fit
+        history_budget = remaining - tokens['documents']
+        kept_turns = []
+        for turn in reversed(history):
+            cost = count(f"用户: {turn['user']}\n助手: {turn['assistant']}")
+            if tokens['history'] + cost > history_budget:
+                break
+            kept_turns.insert(0, turn)
+            tokens['history'] += cost
+
+        # Budget history did not need goes to chunks that were skipped
+        leftover = remaining - tokens['documents'] - tokens['history']
+        for index, cost in enumerate(document_costs):
+            if index not in kept_documents and cost <= leftover:
+                kept_documents.add(index)
+                tokens['documents'] += cost
+                leftover -= cost
+
+        kept = [doc for index, doc in enumerate(documents) if index in kept_documents]
+        context_parts = []
+        if kept:
+            context_parts.append("相关参考信息：")
+            for i, doc in enumerate(kept, 1):
+                context_parts.append(f"{i}. {doc['content']}")
+            context_parts.append("")
+        if kept_turns:
+            context_parts.append("对话历史：")
+            for msg in kept_turns:
+                context_parts.append(f"用户: {msg['user']}")
+                context_parts.append(f"助手: {msg['assistant']}")
+            context_parts.append("")
+        context_parts.append(question_line)
+
+        tokens['total'] = sum(tokens.values())
+        dropped_documents = len(documents) - len(kept)
+        dropped_turns = len(history) - len(kept_turns)
+        metrics.incr('llm.prompt_tokens', tokens['total'])
+        if dropped_documents or dropped_turns:
+            metrics.incr('llm.context_items_dropped', dropped_documents + dropped_turns)
+        self.logger.info(
+            f"Prompt tokens: {tokens['total']} (system {tokens['system']}, documents {tokens['documents']}, "
+            f"history {tokens['history']}, question {tokens['question']}); "
+            f"dropped {dropped_documents} chunks, {dropped_turns} turns"
+        )
+
+        return {
+            'prompt': "\n".join(context_parts),
+            'documents': kept,
+            'history': kept_turns,
+            'tokens': tokens
+        }
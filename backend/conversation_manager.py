@@ -0,0 +1,173 @@
+"""
+Per-session conversation history with a bounded in-memory tier and optional Redis backing
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from utils.metrics import metrics
+
+class _Conversation:
+    """Recent turns of one session; turns are (user, assistant, timestamp) tuples"""
+
+    __slots__ = ('turns', 'last_access', 'shared')
+
+    def __init__(self, max_turns: int):
+        self.turns = deque(maxlen=max_turns)
+        self.last_access = time.monotonic()
+        # False once a turn could not be written to Redis
+        self.shared = True
+
+class ConversationStore:
+    """
+    Conversation history keyed by session id
+
+    Sessions live in an LRU capped at max_sessions and expire after ttl
+    seconds without activity. Each session keeps at most max_turns turns
+    with every message truncated to max_message_chars, so the footprint of
+    a session is bounded regardless of how long it runs.
+
+    When Redis is available every turn is also written through
+    DatabaseManager.add_to_recent_messages and reads go to Redis, so all
+    workers see the same history; the memory tier is then only read for
+    sessions whose turns could not be written to Redis.
+    """
+
+    def __init__(self, config, db_manager=None):
+        """
+        Initialize conversation store
+
+        Args:
+            config: Application configuration object
+            db_manager: Optional DatabaseManager providing the Redis tier
+        """
+        self.max_sessions = config.CONVERSATION_MAX_SESSIONS
+        self.max_turns = config.MAX_CHAT_HISTORY
+        self.max_message_chars = config.CONVERSATION_MAX_MESSAGE_CHARS
+        self.ttl = config.CONVERSATION_TTL
+        self.db_manager = db_manager
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, _Conversation]" = OrderedDict()
+
+    @property
+    def redis_enabled(self) -> bool:
+        """Whether turns are shared through Redis"""
+        return bool(self.db_manager and self.db_manager.redis_available)
+
+    def add_turn(self, session_id: str, user_message: str, assistant_response: str):
+        """
+        Append a completed turn to a session
+
+        Args:
+            session_id: Session identifier
+            user_message: User's message
+            assistant_response: Assistant's response
+        """
+        turn = (
+            user_message[:self.max_message_chars],
+            assistant_response[:self.max_message_chars],
+            datetime.now().isoformat()
+        )
+        with self._lock:
+            self._purge_expired()
+            conversation = self._sessions.get(session_id)
+            if conversation is None:
+                conversation = self._sessions[session_id] = _Conversation(self.max_turns)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    metrics.incr('conversation.evictions')
+            else:
+                self._sessions.move_to_end(session_id)
+            conversation.turns.append(turn)
+            conversation.last_access = time.monotonic()
+
+        if self.redis_enabled:
+            shared = self.db_manager.add_to_recent_messages(
+                session_id, self._to_dict(turn), max_messages=self.max_turns,
+                expiry_seconds=int(self.ttl)
+            )
+            with self._lock:
+                conversation.shared = shared
+
+    def get_history(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Get the recent turns of a session, oldest first
+
+        Args:
+            session_id: Session identifier
+            limit: Maximum number of most recent turns, all kept turns if None
+
+        Returns:
+            List of {'user', 'assistant', 'timestamp'} dictionaries
+        """
+        count = min(limit or self.max_turns, self.max_turns)
+
+        if self.redis_enabled:
+            with self._lock:
+                conversation = self._sessions.get(session_id)
+                local_only = conversation is not None and not conversation.shared
+            if not local_only:
+                # Redis keeps the newest turn first
+                return list(reversed(self.db_manager.get_recent_messages(session_id, count)))
+
+        with self._lock:
+            conversation = self._sessions.get(session_id)
+            if conversation is None:
+                return []
+            if time.monotonic() - conversation.last_access > self.ttl:
+                del self._sessions[session_id]
+                return []
+            self._sessions.move_to_end(session_id)
+            conversation.last_access = time.monotonic()
+            turns = list(conversation.turns)[-count:]
+        return [self._to_dict(turn) for turn in turns]
+
+    def clear(self, session_id: str):
+        """
+        Drop the history of one session
+
+        Args:
+            session_id: Session identifier
+        """
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        if self.redis_enabled:
+            self.db_manager.clear_recent_messages(session_id)
+
+    def _purge_expired(self):
+        """Drop sessions idle longer than the TTL (lock held)"""
+        now = time.monotonic()
+        # Least recently used sessions come first, so stop at the first live one
+        while self._sessions:
+            session_id, conversation = next(iter(self._sessions.items()))
+            if now - conversation.last_access <= self.ttl:
+                break
+            del self._sessions[session_id]
+            metrics.incr('conversation.expired')
+
+    @staticmethod
+    def _to_dict(turn) -> Dict[str, Any]:
+        """History entry of a stored turn"""
+        user_message, assistant_response, timestamp = turn
+        return {"user": user_message, "assistant": assistant_response, "timestamp": timestamp}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get store statistics
+
+        Returns:
+            Number of sessions held in memory and whether Redis is used
+        """
+        with self._lock:
+            sessions = len(self._sessions)
+        return {
+            'sessions': sessions,
+            'max_sessions': self.max_sessions,
+            'redis': self.redis_enabled
+        }
@@ -398,9 +398,31 @@ class DatabaseManager:
             self.logger.error(f"Failed to get cached chat messages: {str(e)}")
             return None
     
+    def cache_query_embedding(self, key: str, embedding: List[float],
+                              expiry_seconds: int = 86400) -> bool:
+        """Cache a query embedding in Redis"""
+        try:
+            self.redis_client.setex(f"query_embedding:{key}", expiry_seconds, json.dumps(embedding))
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to cache query embedding: {str(e)}")
+            return False
+    
+    def get_cached_query_embedding(self, key: str) -> Optional[List[float]]:
+        """Get a cached query embedding from Redis"""
+        try:
+            data = self.redis_client.get(f"query_embedding:{key}")
+            
+            if data:
+                return json.loads(data)
+            return None
+        except Exception as e:
+            self.logger.error(f"Failed to get cached query embedding: {str(e)}")
+            return None
+    
     def add_to_recent_messages(self, session_id: str, message: Dict[str, Any], 
-                              max_messages: int = 20) -> bool:
-        """Add message to recent messages list in Redis"""
+                              max_messages: int = 20, expiry_seconds: int = 3600) -> bool:
+        """Add message to recent messages list in Redis, expiring after expiry_seconds of inactivity"""
         try:
             key = f"recent_messages:{session_id}"
             message_str = json.dumps(message, default=str)
@@ -409,7 +431,7 @@ class DatabaseManager:
             pipe = self.redis_client.pipeline()
             pipe.lpush(key, message_str)
             pipe.ltrim(key, 0, max_messages - 1)
-            pipe.expire(key, 3600)  # Expire after 1 hour
+            pipe.expire(key, expiry_seconds)
             pipe.execute()
             
             return True
@@ -428,6 +450,16 @@ class DatabaseManager:
             self.logger.error(f"Failed to get recent messages: {str(e)}")
             return []
     
+    def clear_recent_messages(self, session_id: str) -> bool:
+        """Delete the recent messages list of a session from Redis"""
+        try:
+            key = f"recent_messages:{session_id}"
+            self.redis_client.delete(key)
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to clear recent messages: {str(e)}")
+            return False
+    
     def health_check(self) -> Dict[str, bool]:
         """Check health of both databases"""
         postgres_healthy = False
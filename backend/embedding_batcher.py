@@ -0,0 +1,166 @@
+"""
+Micro-batching of concurrent query embedding requests into shared API calls
+"""
+
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional
+
+from utils.metrics import metrics
+
+class _Request:
+    """One caller waiting for the embedding of a text"""
+
+    __slots__ = ('text', 'done', 'embedding', 'error')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.done = threading.Event()
+        self.embedding = None
+        self.error = None
+
+class EmbeddingBatcher:
+    """
+    Collect embedding requests for a few milliseconds and send them as one call
+
+    The first request of a batch opens a window of max_wait seconds; every
+    request arriving within it, up to max_batch texts, joins the same API
+    call. Up to `concurrency` batches are in flight at once; when all of them
+    are busy, new requests wait in the queue and go out together as soon as a
+    call returns, so batches grow with load instead of calls piling up.
+    Identical texts in a batch are embedded once.
+    """
+
+    def __init__(self, embed_fn: Callable[[List[str]], List[List[float]]], max_batch: int = 25,
+                 max_wait: float = 0.005, concurrency: int = 8):
+        """
+        Initialize embedding batcher
+
+        Args:
+            embed_fn: Function embedding a list of texts in one API call
+            max_batch: Most texts per call, the API's batch limit
+            max_wait: Seconds a batch stays open for more requests
+            concurrency: Batches that may be in flight at once
+        """
+        self.embed_fn = embed_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait)
+        self.logger = logging.getLogger(__name__)
+
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='embedding-batch')
+        self._slots = threading.Semaphore(concurrency)
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'batches': 0, 'texts_sent': 0, 'errors': 0}
+        self._collector = threading.Thread(target=self._collect_loop, name='embedding-batcher', daemon=True)
+        self._collector.start()
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        """
+        Embed one text as part of the next batch
+
+        Args:
+            text: Text to embed
+            timeout: Seconds to wait for the batch, None to wait indefinitely
+
+        Returns:
+            Embedding vector
+
+        Raises:
+            Exception: The error of the batched call, or a timeout
+        """
+        request = _Request(text)
+        with self._lock:
+            self._stats['requests'] += 1
+        self._queue.put(request)
+        if not request.done.wait(timeout):
+            raise Exception(f"Embedding batch timed out after {timeout}s")
+        if request.error is not None:
+            raise request.error
+        return request.embedding
+
+    def _collect_loop(self):
+        """Group queued requests into batches and hand them to the executor"""
+        while True:
+            # Collect only once a call can go out, so the backlog forms one batch
+            self._slots.acquire()
+            request = self._queue.get()
+            if request is None:
+                self._slots.release()
+                return
+            batch = [request]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._queue.put(None)
+                    break
+                batch.append(request)
+            try:
+                self._executor.submit(self._dispatch, batch)
+            except RuntimeError as e:
+                # Executor already shut down
+                self._slots.release()
+                self._fail(batch, e)
+
+    def _dispatch(self, batch: List[_Request]):
+        """Embed a batch in one call and wake its callers"""
+        texts = list(dict.fromkeys(request.text for request in batch))
+        try:
+            with metrics.timer('embedding.batch'):
+                embeddings = self.embed_fn(texts)
+            if len(embeddings) != len(texts):
+                raise Exception(f"Embedding API returned {len(embeddings)} vectors for {len(texts)} texts")
+        except Exception as e:
+            self.logger.error(f"Batched embedding of {len(texts)} texts failed: {str(e)}")
+            with self._lock:
+                self._stats['errors'] += 1
+            self._fail(batch, e)
+            return
+        finally:
+            self._slots.release()
+
+        by_text = dict(zip(texts, embeddings))
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['texts_sent'] += len(texts)
+        metrics.incr('embedding.batches')
+        metrics.incr('embedding.batched_requests', len(batch))
+        for request in batch:
+            request.embedding = by_text[request.text]
+            request.done.set()
+
+    @staticmethod
+    def _fail(batch: List[_Request], error: Exception):
+        """Wake every caller of a batch with an error"""
+        for request in batch:
+            request.error = error
+            request.done.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get batching statistics
+
+        Returns:
+            Dictionary with request, batch and API call counts and the
+            average batch size
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats['average_batch_size'] = round(stats['texts_sent'] / stats['batches'], 2) if stats['batches'] else 0.0
+        stats['max_batch'] = self.max_batch
+        stats['max_wait_ms'] = round(self.max_wait * 1000, 2)
+        return stats
+
+    def shutdown(self):
+        """Stop collecting and let in-flight batches finish"""
+        self._queue.put(None)
+        self._collector.join(timeout=1.0)
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,146 @@
+"""
+Cache of query embeddings so repeated questions skip the embedding round trip
+"""
+
+import re
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils.metrics import metrics
+
+_TRAILING_PUNCTUATION_RE = re.compile(r'[\s。．.！!？?～~]+$')
+
+class QueryEmbeddingCache:
+    """
+    LRU of query embeddings bounded by entry count and TTL
+
+    Queries are normalized first (NFKC, case, whitespace, trailing sentence
+    punctuation) so "你好" and "你好！" share an entry. Vectors are held as
+    float32 arrays to keep entries small. When Redis is available the cache
+    reads through to it on a local miss and writes every new vector to it,
+    so all workers reuse each other's embeddings.
+    """
+
+    def __init__(self, config, db_manager=None):
+        """
+        Initialize query embedding cache
+
+        Args:
+            config: Application configuration object
+            db_manager: Optional DatabaseManager providing the Redis tier
+        """
+        self.model = config.EMBEDDING_MODEL
+        self.max_entries = config.QUERY_EMBEDDING_CACHE_SIZE
+        self.ttl = config.QUERY_EMBEDDING_CACHE_TTL
+        self.db_manager = db_manager
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[array, float]]" = OrderedDict()
+        self._stats = {'memory_hits': 0, 'redis_hits': 0, 'misses': 0}
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """
+        Canonical form of a query for cache lookups
+
+        Args:
+            query: Raw query text
+
+        Returns:
+            Normalized query
+        """
+        text = unicodedata.normalize('NFKC', query).lower()
+        text = ' '.join(text.split())
+        return _TRAILING_PUNCTUATION_RE.sub('', text)
+
+    def _key(self, normalized: str) -> str:
+        """Cache key of a normalized query for the configured model"""
+        digest = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+        return f"{self.model}:{digest}"
+
+    @property
+    def redis_enabled(self) -> bool:
+        """Whether the Redis tier is used"""
+        return bool(self.db_manager and self.db_manager.redis_available)
+
+    def get(self, query: str) -> Optional[List[float]]:
+        """
+        Look up the embedding of a query
+
+        Args:
+            query: Raw query text
+
+        Returns:
+            Embedding vector, or None on a miss
+        """
+        key = self._key(self.normalize(query))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                vector, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._record('memory_hits')
+                    return vector.tolist()
+                del self._entries[key]
+
+        if self.redis_enabled:
+            embedding = self.db_manager.get_cached_query_embedding(key)
+            if embedding:
+                with self._lock:
+                    self._store(key, embedding)
+                    self._record('redis_hits')
+                return embedding
+
+        with self._lock:
+            self._record('misses')
+        return None
+
+    def put(self, query: str, embedding: List[float]):
+        """
+        Store the embedding of a query
+
+        Args:
+            query: Raw query text
+            embedding: Embedding vector
+        """
+        key = self._key(self.normalize(query))
+        with self._lock:
+            self._store(key, embedding)
+        if self.redis_enabled:
+            self.db_manager.cache_query_embedding(key, embedding, expiry_seconds=int(self.ttl))
+
+    def _store(self, key: str, embedding: List[float]):
+        """Insert into the LRU and evict beyond the entry cap (lock held)"""
+        self._entries[key] = (array('f', embedding), time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _record(self, name: str):
+        """Count a cache event locally and in the metrics registry (lock held)"""
+        self._stats[name] += 1
+        metrics.incr(f'embedding_cache.{name}')
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+
+        Returns:
+            Dictionary with hit/miss counts, hit rate and entry count
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['memory_hits'] + stats['redis_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['redis_hits']) / lookups, 4) if lookups else 0.0
+        stats['redis'] = self.redis_enabled
+        return stats
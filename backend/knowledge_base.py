@@ -1,6 +1,8 @@
 import os
 import json
+import time
 import logging
+import threading
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import hashlib
@@ -19,19 +21,36 @@ from dashscope import TextEmbedding
 # Text processing
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+from utils.metrics import metrics
+from .embedding_cache import QueryEmbeddingCache
+from .bm25_index import BM25Index, reciprocal_rank_fusion
+from .embedding_batcher import EmbeddingBatcher
+
 class KnowledgeBaseManager:
     """Knowledge base management with vector storage"""
     
-    def __init__(self, config):
+    def __init__(self, config, db_manager=None):
         """
         Initialize knowledge base manager
         
         Args:
             config: Application configuration object
+            db_manager: Optional DatabaseManager whose Redis shares cached query embeddings
         """
         self.config = config
         self.logger = logging.getLogger(__name__)
         
+        # Embeddings of recent queries, so repeated questions skip the API call
+        self.query_embeddings = QueryEmbeddingCache(config, db_manager)
+        
+        # Concurrent query misses share one embedding call
+        self.embedding_batcher = EmbeddingBatcher(
+            self._generate_embeddings,
+            max_batch=config.EMBEDDING_BATCH_SIZE,
+            max_wait=config.EMBEDDING_BATCH_MAX_WAIT_MS / 1000.0,
+            concurrency=config.EMBEDDING_BATCH_CONCURRENCY
+        ) if config.EMBEDDING_BATCH_ENABLED else None
+        
         # Initialize DashScope for embeddings
         dashscope.api_key = config.DASHSCOPE_API_KEY
         
@@ -45,9 +64,55 @@ class KnowledgeBaseManager:
         # Initialize ChromaDB
         self._init_vector_db()
         
-        # Document metadata storage
+        # Local lexical index over the same chunks, usable without the embedding API
+        self.bm25 = BM25Index(config.BM25_INDEX_PATH)
+        self._bootstrap_bm25()
+        
+        # Document metadata storage. Every add or delete, in any worker, rewrites the file
+        # with a fresh modification time, which serves as the shared knowledge base version
         self.metadata_file = os.path.join(config.KNOWLEDGE_BASE_FOLDER, 'metadata.json')
-        self.documents_metadata = self._load_metadata()
+        self._sync_lock = threading.Lock()
+        self._version = self._read_version()
+        self._documents_metadata = self._load_metadata()
+    
+    @property
+    def version(self) -> int:
+        """
+        Knowledge base version shared by all workers
+        
+        Returns:
+            Modification time of the metadata file in nanoseconds, 0 before
+            the first document; caches of search results compare it on lookup
+        """
+        self._sync_shared_state()
+        return self._version
+    
+    @property
+    def documents_metadata(self) -> Dict[str, Any]:
+        """Documents metadata, reloaded if another worker changed the knowledge base"""
+        self._sync_shared_state()
+        return self._documents_metadata
+    
+    def _read_version(self) -> int:
+        """Current modification time of the metadata file, 0 if it does not exist"""
+        try:
+            return os.stat(self.metadata_file).st_mtime_ns
+        except OSError:
+            return 0
+    
+    def _sync_shared_state(self):
+        """Reload the metadata and BM25 index when another worker has changed the knowledge base"""
+        version = self._read_version()
+        if version == self._version:
+            return
+        with self._sync_lock:
+            if version == self._version:
+                return
+            # The writer saves the BM25 index before the metadata, so the file already has its chunks
+            self.bm25.reload()
+            self._documents_metadata = self._load_metadata()
+            self._version = version
+        self.logger.info(f"Knowledge base changed by another worker (version {version}), metadata and BM25 index reloaded")
     
     def _init_vector_db(self):
         """Initialize ChromaDB vector database"""
@@ -76,6 +141,25 @@ class KnowledgeBaseManager:
             self.logger.error(f"Failed to initialize vector database: {str(e)}")
             raise
     
+    def _bootstrap_bm25(self):
+        """Build the lexical index from the vector store when it has not been persisted yet"""
+        try:
+            if len(self.bm25) or not self.collection.count():
+                return
+            results = self.collection.get(include=['documents', 'metadatas'])
+            by_document: Dict[str, Dict[str, list]] = {}
+            for chunk_id, doc, metadata in zip(results['ids'], results['documents'], results['metadatas']):
+                batch = by_document.setdefault(metadata.get('document_id', ''), {'ids': [], 'texts': [], 'metadatas': []})
+                batch['ids'].append(chunk_id)
+                batch['texts'].append(doc)
+                batch['metadatas'].append(metadata)
+            for document_id, batch in by_document.items():
+                self.bm25.add_chunks(document_id, batch['ids'], batch['texts'], batch['metadatas'], save=False)
+            self.bm25.save()
+            self.logger.info(f"BM25 index built from vector store: {len(self.bm25)} chunks")
+        except Exception as e:
+            self.logger.error(f"Failed to build BM25 index: {str(e)}")
+    
     def _load_metadata(self) -> Dict[str, Any]:
         """Load documents metadata from file"""
         try:
@@ -88,11 +172,18 @@ class KnowledgeBaseManager:
             return {}
     
     def _save_metadata(self):
-        """Save documents metadata to file"""
+        """Save documents metadata to file atomically and publish a new version"""
         try:
             os.makedirs(os.path.dirname(self.metadata_file), exist_ok=True)
-            with open(self.metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(self.documents_metadata, f, ensure_ascii=False, indent=2)
+            temp_path = f"{self.metadata_file}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._documents_metadata, f, ensure_ascii=False, indent=2)
+            # Set the modification time explicitly so two saves within one filesystem tick still differ
+            version = max(time.time_ns(), self._version + 1)
+            os.utime(temp_path, ns=(version, version))
+            os.replace(temp_path, self.metadata_file)
+            with self._sync_lock:
+                self._version = version
         except Exception as e:
             self.logger.error(f"Failed to save metadata: {str(e)}")
     
@@ -108,6 +199,8 @@ class KnowledgeBaseManager:
         """
         try:
             self.logger.info(f"Processing document: {file_path}")
+            # Start from the latest shared index so saving it does not drop other workers' chunks
+            self._sync_shared_state()
             
             # Extract text from document
             text_content = self._extract_text_from_file(file_path)
@@ -128,6 +221,7 @@ class KnowledgeBaseManager:
             # Process chunks in batches
             batch_size = 10
             total_chunks = 0
+            indexed_ids, indexed_chunks, indexed_metadata = [], [], []
             
             for i in range(0, len(chunks), batch_size):
                 batch_chunks = chunks[i:i + batch_size]
@@ -155,6 +249,12 @@ class KnowledgeBaseManager:
                 )
                 
                 total_chunks += len(batch_chunks)
+                indexed_ids.extend(batch_ids)
+                indexed_chunks.extend(batch_chunks)
+                indexed_metadata.extend(batch_metadata)
+            
+            # Same chunks in the lexical index
+            self.bm25.add_chunks(document_id, indexed_ids, indexed_chunks, indexed_metadata)
             
             # Update document metadata
             self.documents_metadata[document_id] = {
@@ -182,13 +282,15 @@ class KnowledgeBaseManager:
             self.logger.error(f"Failed to add document: {str(e)}")
             raise Exception(f"文档处理失败: {str(e)}")
     
-    def search_similar_documents(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
+    def search_similar_documents(self, query: str, k: int = 3, mode: Optional[str] = None) -> List[Dict[str, Any]]:
         """
-        Search for similar documents using vector similarity
+        Search for similar documents
         
         Args:
             query: Search query
             k: Number of results to return
+            mode: 'vector', 'bm25' or 'hybrid' (both fused by reciprocal rank),
+                RETRIEVAL_MODE if None
             
         Returns:
             List of similar document chunks
@@ -197,37 +299,78 @@ class KnowledgeBaseManager:
             if not query.strip():
                 return []
             
-            # Generate query embedding
-            query_embedding = self._generate_embeddings([query])[0]
+            self._sync_shared_state()
+            mode = mode or self.config.RETRIEVAL_MODE
+            if mode == 'bm25':
+                return self._lexical_search(query, k)
+            if mode == 'vector':
+                return self._vector_search(query, k)
+            
+            # Hybrid: take a deeper candidate list from each retriever and fuse them
+            depth = k * self.config.HYBRID_CANDIDATE_FACTOR
+            lexical = self._lexical_search(query, depth)
+            try:
+                semantic = self._vector_search(query, depth)
+            except Exception as e:
+                # The lexical index keeps retrieval working while the embedding API is unavailable
+                self.logger.warning(f"Vector search failed, using BM25 results only: {str(e)}")
+                metrics.incr('retrieval.vector_fallbacks')
+                return lexical[:k]
+            return reciprocal_rank_fusion([semantic, lexical], k, self.config.RRF_CONSTANT)
+            
+        except Exception as e:
+            self.logger.error(f"Failed to search documents: {str(e)}")
+            return []
+    
+    def _lexical_search(self, query: str, k: int) -> List[Dict[str, Any]]:
+        """Search the local BM25 index"""
+        with metrics.timer('retrieval.bm25'):
+            return self.bm25.search(query, k)
+    
+    def _vector_search(self, query: str, k: int) -> List[Dict[str, Any]]:
+        """
+        Search for similar documents using vector similarity
+        
+        Args:
+            query: Search query
+            k: Number of results to return
+            
+        Returns:
+            List of similar document chunks
             
-            # Search in ChromaDB
+        Raises:
+            Exception: If embedding or the vector query fails
+        """
+        # Generate query embedding
+        query_embedding = self.embed_query(query)
+        
+        # Search in ChromaDB
+        with metrics.timer('retrieval.vector'):
             results = self.collection.query(
                 query_embeddings=[query_embedding],
                 n_results=k,
                 include=['documents', 'metadatas', 'distances']
             )
-            
-            # Format results
-            similar_docs = []
-            if results['documents'] and results['documents'][0]:
-                for i, (doc, metadata, distance) in enumerate(zip(
-                    results['documents'][0],
-                    results['metadatas'][0],
-                    results['distances'][0]
-                )):
-                    similar_docs.append({
-                        "content": doc,
-                        "metadata": metadata,
-                        "similarity_score": 1 - distance,  # Convert distance to similarity
-                        "rank": i + 1
-                    })
-            
-            self.logger.info(f"Found {len(similar_docs)} similar documents for query: {query[:50]}...")
-            return similar_docs
-            
-        except Exception as e:
-            self.logger.error(f"Failed to search documents: {str(e)}")
-            return []
+        
+        # Format results
+        similar_docs = []
+        if results['documents'] and results['documents'][0]:
+            for i, (chunk_id, doc, metadata, distance) in enumerate(zip(
+                results['ids'][0],
+                results['documents'][0],
+                results['metadatas'][0],
+                results['distances'][0]
+            )):
+                similar_docs.append({
+                    "id": chunk_id,
+                    "content": doc,
+                    "metadata": metadata,
+                    "similarity_score": 1 - distance,  # Convert distance to similarity
+                    "rank": i + 1
+                })
+        
+        self.logger.info(f"Found {len(similar_docs)} similar documents for query: {query[:50]}...")
+        return similar_docs
     
     def delete_document(self, filename: str) -> bool:
         """
@@ -240,6 +383,8 @@ class KnowledgeBaseManager:
             True if successful, False otherwise
         """
         try:
+            self._sync_shared_state()
+            
             # Find document ID
             document_id = None
             for doc_id, metadata in self.documents_metadata.items():
@@ -260,6 +405,7 @@ class KnowledgeBaseManager:
             if results['ids']:
                 self.collection.delete(ids=results['ids'])
                 self.logger.info(f"Deleted {len(results['ids'])} chunks from vector database")
+            self.bm25.remove_document(document_id)
             
             # Delete file if it exists
             file_path = self.documents_metadata[document_id]['file_path']
@@ -379,6 +525,28 @@ class KnowledgeBaseManager:
             self.logger.error(f"Failed to generate embeddings: {str(e)}")
             raise
     
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Embed a search query, reusing the cached vector of an equivalent query
+        
+        Args:
+            query: Search query
+            
+        Returns:
+            Query embedding
+        """
+        embedding = self.query_embeddings.get(query)
+        if embedding is not None:
+            return embedding
+        
+        with metrics.timer('embedding.query'):
+            if self.embedding_batcher:
+                embedding = self.embedding_batcher.embed(query)
+            else:
+                embedding = self._generate_embeddings([query])[0]
+        self.query_embeddings.put(query, embedding)
+        return embedding
+    
     def _generate_document_id(self, filename: str) -> str:
         """Generate unique document ID"""
         timestamp = datetime.now().isoformat()
@@ -396,7 +564,8 @@ class KnowledgeBaseManager:
                 "total_documents": total_documents,
                 "total_chunks": total_chunks,
                 "total_size_bytes": total_size,
-                "total_size_mb": round(total_size / (1024 * 1024), 2)
+                "total_size_mb": round(total_size / (1024 * 1024), 2),
+                "bm25_index": self.bm25.get_stats()
             }
             
         except Exception as e:
@@ -0,0 +1,204 @@
+"""
+Per-request-class LLM model selection with latency-based fallback
+"""
+
+import math
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, Deque, Optional, Tuple
+
+from utils.metrics import metrics
+
+class ModelRouter:
+    """
+    Choose the model and answer length of each LLM call from its request class
+
+    Every class (voice, chat, batch) has a profile in Config.LLM_PROFILES
+    naming its primary model, a faster fallback model, max_tokens, an
+    answer style instruction and optional p95 budgets for the time to the
+    first token of streamed calls and for complete answers. The router keeps
+    the latencies of recent calls per model; while the primary's p95 over
+    the last LLM_LATENCY_WINDOW seconds exceeds the class budget, calls go
+    to the fallback. Failed calls count as slower than any budget, so a
+    primary that keeps erroring is demoted the same way. Samples age out, so
+    the primary is retried once it has had no recent slow or failed calls.
+    """
+
+    def __init__(self, config):
+        """
+        Initialize model router
+
+        Args:
+            config: Application configuration object
+        """
+        self.profiles = config.LLM_PROFILES
+        self.default_class = config.LLM_DEFAULT_CLASS
+        self.window = config.LLM_LATENCY_WINDOW
+        self.min_samples = config.LLM_LATENCY_MIN_SAMPLES
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        # (model, stage) -> recent (monotonic time, seconds)
+        self._samples: Dict[Tuple[str, str], Deque[Tuple[float, float]]] = {}
+        self._routed: Dict[str, Dict[str, int]] = {}
+
+    def request_class(self, request_class: Optional[str]) -> str:
+        """
+        Normalize a request class
+
+        Args:
+            request_class: Requested class, may be unknown or None
+
+        Returns:
+            The class itself if it has a profile, otherwise the default class
+        """
+        return request_class if request_class in self.profiles else self.default_class
+
+    def route(self, request_class: str, stream: bool = False) -> Dict[str, Any]:
+        """
+        Decide the model and max_tokens of a call
+
+        Args:
+            request_class: 'voice', 'chat' or 'batch'
+            stream: Whether the answer is streamed, which selects the
+                first-token budget instead of the complete-answer budget
+
+        Returns:
+            Routing decision with request_class, model, max_tokens,
+            fallback flag, reason, primary_model, primary_p95_ms and budget_ms
+        """
+        request_class = self.request_class(request_class)
+        profile = self.profiles[request_class]
+        primary = profile['model']
+        fallback_model = profile.get('fallback_model')
+        stage = 'first_token' if stream else 'complete'
+        budget_ms = profile.get(f'{stage}_budget_ms')
+
+        p95 = self.p95(primary, stage)
+        primary_p95_ms = self._to_ms(p95)
+        use_fallback = bool(
+            budget_ms and fallback_model and fallback_model != primary
+            and p95 is not None and p95 * 1000 > budget_ms
+        )
+        model = fallback_model if use_fallback else primary
+        reason = 'primary'
+        if use_fallback:
+            reason = 'failing' if primary_p95_ms is None else 'over_budget'
+
+        with self._lock:
+            counts = self._routed.setdefault(request_class, {})
+            counts[model] = counts.get(model, 0) + 1
+        if use_fallback:
+            metrics.incr(f'llm.fallbacks.{request_class}')
+            self.logger.info(f"{request_class} call routed to {model}: {primary} {reason}, "
+                             f"p95 {primary_p95_ms}ms, budget {budget_ms}ms")
+
+        return {
+            'request_class': request_class,
+            'model': model,
+            'max_tokens': profile['max_tokens'],
+            'fallback': use_fallback,
+            'reason': reason,
+            'primary_model': primary,
+            'primary_p95_ms': primary_p95_ms,
+            'budget_ms': budget_ms
+        }
+
+    def system_prompt(self, request_class: str, base_prompt: str) -> str:
+        """
+        System prompt with the answer style instruction of a request class
+
+        Args:
+            request_class: 'voice', 'chat' or 'batch'
+            base_prompt: Shared system prompt
+
+        Returns:
+            System prompt for the call
+        """
+        instruction = self.profiles[self.request_class(request_class)].get('instruction')
+        return f"{base_prompt}\n{instruction}" if instruction else base_prompt
+
+    def record(self, model: str, stage: str, seconds: float):
+        """
+        Record the latency of a successful call
+
+        Args:
+            model: Model that served the call
+            stage: 'first_token' or 'complete'
+            seconds: Observed latency
+        """
+        now = time.monotonic()
+        with self._lock:
+            samples = self._samples.get((model, stage))
+            if samples is None:
+                samples = self._samples[(model, stage)] = deque(maxlen=500)
+            samples.append((now, seconds))
+        metrics.observe(f'llm.{stage}.{model}', seconds)
+
+    def record_failure(self, model: str, stage: str):
+        """
+        Record a call that failed before reaching a stage
+
+        The failure is kept as a sample slower than any budget, so it counts
+        as a budget miss in the p95.
+
+        Args:
+            model: Model that was called
+            stage: 'first_token' or 'complete'
+        """
+        now = time.monotonic()
+        with self._lock:
+            samples = self._samples.get((model, stage))
+            if samples is None:
+                samples = self._samples[(model, stage)] = deque(maxlen=500)
+            samples.append((now, math.inf))
+        metrics.incr(f'llm.failures.{model}')
+
+    def p95(self, model: str, stage: str) -> Optional[float]:
+        """
+        Get the p95 latency of a model's calls within the window
+
+        Args:
+            model: Model name
+            stage: 'first_token' or 'complete'
+
+        Returns:
+            p95 in seconds, infinite when more than 5% of the calls failed,
+            None with fewer than LLM_LATENCY_MIN_SAMPLES recent calls
+        """
+        cutoff = time.monotonic() - self.window
+        with self._lock:
+            samples = self._samples.get((model, stage))
+            if not samples:
+                return None
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+            values = sorted(seconds for _, seconds in samples)
+        if len(values) < self.min_samples:
+            return None
+        return values[int(round(0.95 * (len(values) - 1)))]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get routing statistics
+
+        Returns:
+            Calls per class and model, and the recent p95 per model and stage
+        """
+        with self._lock:
+            routed = {request_class: dict(counts) for request_class, counts in self._routed.items()}
+            keys = list(self._samples)
+        latency = {}
+        for model, stage in keys:
+            p95 = self.p95(model, stage)
+            latency.setdefault(model, {})[f'{stage}_p95_ms'] = self._to_ms(p95)
+        return {'routed': routed, 'latency': latency}
+
+    @staticmethod
+    def _to_ms(seconds: Optional[float]) -> Optional[float]:
+        """Milliseconds for reporting, None when unknown or dominated by failures"""
+        if seconds is None or math.isinf(seconds):
+            return None
+        return round(seconds * 1000, 1)
@@ -2,99 +2,223 @@ import dashscope
 from dashscope import Generation
 from typing import Dict, Any, List, Generator, Optional
 import json
+import time
 import logging
 from datetime import datetime
 
+from .conversation_manager import ConversationStore
+from .context_assembler import ContextAssembler
+from .answer_cache import SemanticAnswerCache
+from .retrieval_classifier import RetrievalGate
+from .speculative_retrieval import SpeculativeRetriever
+from .model_router import ModelRouter
+from utils.metrics import metrics
+
 class RAGSystem:
     """RAG (Retrieval-Augmented Generation) system using DashScope"""
     
-    def __init__(self, config):
+    def __init__(self, config, db_manager=None, kb_manager=None):
         """
         Initialize RAG system
         
         Args:
             config: Application configuration object
+            db_manager: Optional DatabaseManager whose Redis shares history across workers
+            kb_manager: KnowledgeBaseManager to search, a new one if None
         """
         self.config = config
-        self.chat_history = []
+        self.conversations = ConversationStore(config, db_manager)
+        self.context_assembler = ContextAssembler(config)
         self.logger = logging.getLogger(__name__)
         
         # Initialize DashScope
         dashscope.api_key = config.DASHSCOPE_API_KEY
         
         # Import vector store after initialization
-        from .knowledge_base import KnowledgeBaseManager
-        self.kb_manager = KnowledgeBaseManager(config)
+        if kb_manager is None:
+            from .knowledge_base import KnowledgeBaseManager
+            kb_manager = KnowledgeBaseManager(config, db_manager)
+        self.kb_manager = kb_manager
+        
+        # Greetings and thanks are answered without an embedding call and vector query
+        self.retrieval_gate = RetrievalGate(config, self.kb_manager)
+        
+        # Answers to first-turn questions, reused for near-identical questions of the same
+        # request class (a spoken voice answer is not a chat answer). Lookups embed the
+        # question, so BM25-only retrieval, which exists to avoid embedding calls, skips it
+        self.answer_caches = {
+            request_class: SemanticAnswerCache(config) for request_class in config.LLM_PROFILES
+        } if config.ANSWER_CACHE_ENABLED and config.RETRIEVAL_MODE != 'bm25' else {}
+        
+        # Voice turns start retrieval from interim transcripts while recognition finishes
+        self.speculation = SpeculativeRetriever(
+            config,
+            lambda query: self.kb_manager.search_similar_documents(query, k=config.RETRIEVAL_K),
+            self.retrieval_gate.classifier
+        ) if config.SPECULATIVE_RETRIEVAL_ENABLED else None
         
-    def _build_context_prompt(self, user_message: str) -> str:
+        # Model and answer length per request class, with fallback when the primary is slow
+        self.router = ModelRouter(config)
+        
+    def _build_context_prompt(self, user_message: str, session_id: str, retrieve: bool = True,
+                              system_prompt: Optional[str] = None) -> Dict[str, Any]:
         """
         Build context-aware prompt using RAG
         
         Args:
             user_message: User's input message
+            session_id: Conversation whose history is included
+            retrieve: Whether to search the knowledge base
+            system_prompt: System prompt of the call, counted against the token budget
             
         Returns:
-            Enhanced prompt with context
+            Dictionary with the enhanced 'prompt' and the retrieved 'documents' it includes
         """
         try:
             # Retrieve relevant documents
-            relevant_docs = self.kb_manager.search_similar_documents(
-                user_message, 
-                k=self.config.RETRIEVAL_K
-            )
-            
-            # Build context
-            context_parts = []
-            if relevant_docs:
-                context_parts.append("相关参考信息：")
-                for i, doc in enumerate(relevant_docs, 1):
-                    context_parts.append(f"{i}. {doc['content']}")
-                context_parts.append("")
-            
-            # Add chat history
-            if self.chat_history:
-                context_parts.append("对话历史：")
-                for msg in self.chat_history[-5:]:  # Last 5 messages
-                    context_parts.append(f"用户: {msg['user']}")
-                    context_parts.append(f"助手: {msg['assistant']}")
-                context_parts.append("")
-            
-            # Add current question
-            context_parts.append(f"当前问题: {user_message}")
-            
-            full_context = "\n".join(context_parts)
+            relevant_docs = []
+            if retrieve:
+                # A voice turn may already have searched a matching interim transcript
+                speculated = self.speculation.take(
+                    session_id, user_message, self.kb_manager.version,
+                    timeout=self.config.SPECULATIVE_WAIT_TIMEOUT
+                ) if self.speculation else None
+                if speculated is not None:
+                    relevant_docs = speculated
+                else:
+                    with metrics.timer('retrieval.search'):
+                        relevant_docs = self.kb_manager.search_similar_documents(
+                            user_message, 
+                            k=self.config.RETRIEVAL_K
+                        )
+            else:
+                self.discard_speculation(session_id)
             
-            # Ensure context doesn't exceed max length
-            if len(full_context) > self.config.MAX_CONTEXT_LENGTH:
-                # Truncate context while preserving current question
-                truncated_context = full_context[:self.config.MAX_CONTEXT_LENGTH-len(user_message)-50]
-                full_context = truncated_context + f"\n\n当前问题: {user_message}"
+            # Recent turns of this conversation
+            chat_history = self.conversations.get_history(session_id, limit=self.config.CONTEXT_HISTORY_TURNS)
             
-            return full_context
+            # Keep whole chunks and turns within the prompt token budget
+            context = self.context_assembler.assemble(
+                system_prompt or self.config.SYSTEM_PROMPT, user_message, relevant_docs, chat_history
+            )
+            return context
             
         except Exception as e:
             self.logger.error(f"Error building context: {str(e)}")
-            return user_message
+            return {"prompt": user_message, "documents": []}
     
-    def chat_stream(self, user_message: str) -> Generator[Dict[str, Any], None, None]:
+    def speculate(self, session_id: str, partial_text: str):
+        """
+        Feed an interim transcript of a voice turn to speculative retrieval
+        
+        Args:
+            session_id: Voice session the utterance belongs to
+            partial_text: Transcript recognized so far
+        """
+        if not self.speculation or not self.kb_manager.documents_metadata:
+            return
+        self.speculation.observe(session_id, partial_text, self.kb_manager.version)
+    
+    def discard_speculation(self, session_id: str):
+        """
+        Drop the speculative retrieval of a turn that will not reach chat
+        
+        Args:
+            session_id: Voice session identifier
+        """
+        if self.speculation:
+            self.speculation.discard(session_id)
+    
+    def _lookup_cached_answer(self, user_message: str, session_id: str, request_class: str):
+        """
+        Look up a cached answer for a question asked without prior history
+        
+        Args:
+            user_message: User's input message
+            session_id: Conversation the message belongs to
+            request_class: Request class whose answers are searched
+            
+        Returns:
+            Tuple of (cached answer or None, query embedding to store the new
+            answer under or None when the answer must not be cached)
+        """
+        answer_cache = self.answer_caches.get(request_class)
+        if not answer_cache or self.conversations.get_history(session_id, limit=1):
+            return None, None
+        try:
+            query_embedding = self.kb_manager.embed_query(user_message)
+            hit = answer_cache.lookup(query_embedding, self.kb_manager.version)
+        except Exception as e:
+            self.logger.warning(f"Answer cache lookup failed: {str(e)}")
+            return None, None
+        if hit:
+            self.logger.info(f"Answer cache hit (similarity {hit['similarity']}) for: {user_message[:50]}")
+            return hit['answer'], None
+        return None, query_embedding
+    
+    def _store_answer(self, query_embedding, context: Dict[str, Any], answer: str, kb_version: int,
+                      request_class: str):
+        """Cache the answer of a first-turn question"""
+        if query_embedding is None or not answer:
+            return
+        chunk_ids = [doc.get('id') for doc in context['documents']]
+        self.answer_caches[request_class].store(query_embedding, chunk_ids, answer, kb_version)
+    
+    def chat_stream(self, user_message: str, session_id: str = 'default',
+                    request_class: str = 'chat') -> Generator[Dict[str, Any], None, None]:
         """
         Stream chat response using RAG
         
         Args:
             user_message: User's input message
+            session_id: Conversation the message belongs to
+            request_class: 'voice', 'chat' or 'batch', selects the model profile
             
         Yields:
-            Chunks of response data
+            Chunks of response data, the first one carrying the routing decision
         """
+        calling, full_response = None, ""
         try:
+            request_class = self.router.request_class(request_class)
+            
+            # Chit-chat skips retrieval and with it the answer cache lookup
+            retrieve = self.retrieval_gate.should_retrieve(user_message)
+            
+            # Near-identical first-turn questions reuse an earlier answer
+            cached_answer, query_embedding = None, None
+            if retrieve:
+                cached_answer, query_embedding = self._lookup_cached_answer(user_message, session_id, request_class)
+            if cached_answer is not None:
+                self._add_to_history(session_id, user_message, cached_answer)
+                yield {
+                    "route": {"request_class": request_class, "model": None, "reason": "answer_cache"},
+                    "timestamp": datetime.now().isoformat()
+                }
+                yield {
+                    "content": cached_answer,
+                    "cached": True,
+                    "timestamp": datetime.now().isoformat()
+                }
+                return
+            
+            # Pick the model and answer length for this kind of request
+            route = self.router.route(request_class, stream=True)
+            yield {
+                "route": route,
+                "timestamp": datetime.now().isoformat()
+            }
+            system_prompt = self.router.system_prompt(request_class, self.config.SYSTEM_PROMPT)
+            
             # Build enhanced prompt
-            enhanced_prompt = self._build_context_prompt(user_message)
+            kb_version = self.kb_manager.version
+            context = self._build_context_prompt(user_message, session_id, retrieve, system_prompt)
+            enhanced_prompt = context['prompt']
             
             # Prepare messages for API
             messages = [
                 {
                     "role": "system", 
-                    "content": self.config.SYSTEM_PROMPT
+                    "content": system_prompt
                 },
                 {
                     "role": "user", 
@@ -103,22 +227,24 @@ class RAGSystem:
             ]
             
             # Call DashScope API with streaming
+            calling = route['model']
+            start = time.perf_counter()
             responses = Generation.call(
-                model=self.config.LLM_MODEL,
+                model=route['model'],
                 messages=messages,
                 result_format='message',
                 stream=True,
                 incremental_output=True,
-                max_tokens=2000,
+                max_tokens=route['max_tokens'],
                 temperature=0.7
             )
             
-            full_response = ""
-            
             for response in responses:
                 if response.status_code == 200:
                     content = response.output.choices[0].message.content
                     if content:
+                        if not full_response:
+                            self.router.record(route['model'], 'first_token', time.perf_counter() - start)
                         full_response += content
                         yield {
                             "content": content,
@@ -126,41 +252,76 @@ class RAGSystem:
                         }
                 else:
                     self.logger.error(f"API error: {response.message}")
+                    self._record_failure(calling, full_response)
                     yield {
                         "error": f"API调用失败: {response.message}",
                         "timestamp": datetime.now().isoformat()
                     }
                     return
             
+            self.router.record(route['model'], 'complete', time.perf_counter() - start)
+            calling = None
+            
             # Save to chat history
-            self._add_to_history(user_message, full_response)
+            self._add_to_history(session_id, user_message, full_response)
+            self._store_answer(query_embedding, context, full_response, kb_version, request_class)
             
         except Exception as e:
             self.logger.error(f"Chat streaming error: {str(e)}")
+            if calling:
+                self._record_failure(calling, full_response)
             yield {
                 "error": f"生成回答时发生错误: {str(e)}",
                 "timestamp": datetime.now().isoformat()
             }
     
-    def chat(self, user_message: str) -> str:
+    def chat(self, user_message: str, session_id: str = 'default', request_class: str = 'chat',
+             route: Optional[Dict[str, Any]] = None) -> str:
         """
         Non-streaming chat response using RAG
         
         Args:
             user_message: User's input message
+            session_id: Conversation the message belongs to
+            request_class: 'voice', 'chat' or 'batch', selects the model profile
+            route: Optional dictionary that receives the routing decision
             
         Returns:
             Complete response text
         """
+        calling = None
         try:
+            request_class = self.router.request_class(request_class)
+            
+            # Chit-chat skips retrieval and with it the answer cache lookup
+            retrieve = self.retrieval_gate.should_retrieve(user_message)
+            
+            # Near-identical first-turn questions reuse an earlier answer
+            cached_answer, query_embedding = None, None
+            if retrieve:
+                cached_answer, query_embedding = self._lookup_cached_answer(user_message, session_id, request_class)
+            if cached_answer is not None:
+                if route is not None:
+                    route.update(request_class=request_class, model=None, reason='answer_cache')
+                self._add_to_history(session_id, user_message, cached_answer)
+                return cached_answer
+            
+            # Pick the model and answer length for this kind of request
+            decision = self.router.route(request_class)
+            if route is not None:
+                route.update(decision)
+            system_prompt = self.router.system_prompt(request_class, self.config.SYSTEM_PROMPT)
+            
             # Build enhanced prompt
-            enhanced_prompt = self._build_context_prompt(user_message)
+            kb_version = self.kb_manager.version
+            context = self._build_context_prompt(user_message, session_id, retrieve, system_prompt)
+            enhanced_prompt = context['prompt']
             
             # Prepare messages for API
             messages = [
                 {
                     "role": "system", 
-                    "content": self.config.SYSTEM_PROMPT
+                    "content": system_prompt
                 },
                 {
                     "role": "user", 
@@ -169,57 +330,72 @@ class RAGSystem:
             ]
             
             # Call DashScope API
+            calling = decision['model']
+            start = time.perf_counter()
             response = Generation.call(
-                model=self.config.LLM_MODEL,
+                model=decision['model'],
                 messages=messages,
                 result_format='message',
-                max_tokens=2000,
+                max_tokens=decision['max_tokens'],
                 temperature=0.7
             )
             
+            calling = None
             if response.status_code == 200:
+                self.router.record(decision['model'], 'complete', time.perf_counter() - start)
                 assistant_response = response.output.choices[0].message.content
                 
                 # Save to chat history
-                self._add_to_history(user_message, assistant_response)
+                self._add_to_history(session_id, user_message, assistant_response)
+                self._store_answer(query_embedding, context, assistant_response, kb_version, request_class)
                 
                 return assistant_response
             else:
                 self.logger.error(f"API error: {response.message}")
+                self.router.record_failure(decision['model'], 'complete')
                 return f"抱歉，生成回答时发生错误: {response.message}"
                 
         except Exception as e:
             self.logger.error(f"Chat error: {str(e)}")
+            if calling:
+                self.router.record_failure(calling, 'complete')
             return f"抱歉，生成回答时发生错误: {str(e)}"
     
-    def _add_to_history(self, user_message: str, assistant_response: str):
+    def _record_failure(self, model: str, partial_response: str):
+        """Count a failed streamed call against the model's budgets"""
+        if not partial_response:
+            self.router.record_failure(model, 'first_token')
+        self.router.record_failure(model, 'complete')
+    
+    def _add_to_history(self, session_id: str, user_message: str, assistant_response: str):
         """
         Add conversation to chat history
         
         Args:
+            session_id: Conversation the turn belongs to
             user_message: User's message
             assistant_response: Assistant's response
         """
-        self.chat_history.append({
-            "user": user_message,
-            "assistant": assistant_response,
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        # Keep only recent history
-        if len(self.chat_history) > self.config.MAX_CHAT_HISTORY:
-            self.chat_history = self.chat_history[-self.config.MAX_CHAT_HISTORY:]
+        self.conversations.add_turn(session_id, user_message, assistant_response)
     
-    def clear_history(self):
-        """Clear chat history"""
-        self.chat_history = []
-        self.logger.info("Chat history cleared")
+    def clear_history(self, session_id: str):
+        """
+        Clear chat history of one conversation
+        
+        Args:
+            session_id: Conversation to clear
+        """
+        self.conversations.clear(session_id)
+        self.logger.info(f"Chat history cleared for session {session_id}")
     
-    def get_history(self) -> List[Dict[str, Any]]:
+    def get_history(self, session_id: str) -> List[Dict[str, Any]]:
         """
         Get chat history
         
+        Args:
+            session_id: Conversation to read
+            
         Returns:
             List of chat history entries
         """
-        return self.chat_history.copy()
+        return self.conversations.get_history(session_id)
@@ -0,0 +1,164 @@
+"""
+Local decision whether a chat turn needs knowledge base retrieval
+"""
+
+import re
+import logging
+import unicodedata
+from typing import Dict, Any, Tuple
+
+import jieba
+
+from utils.metrics import metrics
+
+# Whole-message chit-chat (matched with separators removed): greetings, thanks, farewells, acknowledgements and small talk about the assistant
+_CHITCHAT_RE = re.compile(
+    r'(?:(?:你好|您好|嗨|哈喽|hi|hello|hey|在吗|在不在|早上好|早安|中午好|下午好|晚上好|晚安'
+    r'|谢谢|多谢|感谢|谢啦|thanks|thankyou|thx|不客气|辛苦了'
+    r'|再见|拜拜|bye|回头见|下次见'
+    r'|好的|好|好吧|行|可以|ok|okay|嗯|嗯嗯|哦|噢|知道了|明白了|收到|了解|对|是的|没错|没事了'
+    r'|哈哈|哈哈哈|呵呵|厉害|太棒了|不错|很好'
+    r'|你是谁|你叫什么|你叫什么名字|你是机器人吗|你能做什么|你会什么|介绍一下你自己)'
+    r'[啊呀呢吧哈啦哦嘛的了]*)+'
+)
+_SEPARATOR_RE = re.compile(r'[\s,，。.!！?？~～、;；:：…]+')
+
+# Words that carry no topic on their own
+_STOPWORDS = frozenset(
+    '请问 请 问 一下 我 我们 你 你们 您 他 她 它 的 了 吗 呢 吧 啊 呀 是 在 有 和 与 就 都 也 还 要 想 能 会 可以 '
+    '这个 那个 这 那 什么 怎么 怎么样 如何 为什么 哪 哪里 哪些 哪个 多少 几 吗 么 个 给 让 把 被 说 告诉 知道 帮 帮忙'.split()
+)
+_QUESTION_WORDS = frozenset('什么 怎么 怎么样 如何 为什么 哪 哪里 哪些 哪个 多少 几 是否 能否 可否 有没有'.split())
+
+class RetrievalClassifier:
+    """
+    Rules plus a jieba keyword score deciding whether retrieval is worth it
+
+    Messages that consist only of chit-chat phrases never retrieve. Anything
+    else is segmented with jieba and scored: each content word (not a
+    stopword, at least two characters or an ASCII letter/digit) counts one point and
+    a question word adds half a point. Messages scoring below the threshold
+    are answered without retrieval.
+    """
+
+    def __init__(self, config):
+        """
+        Initialize retrieval classifier
+
+        Args:
+            config: Application configuration object
+        """
+        self.threshold = config.RETRIEVAL_MIN_KEYWORD_SCORE
+        self.logger = logging.getLogger(__name__)
+        # Load the dictionary now rather than on the first chat turn
+        jieba.initialize()
+
+    @staticmethod
+    def _normalize(message: str) -> str:
+        """Lower-cased NFKC form of a message"""
+        return unicodedata.normalize('NFKC', message).strip().lower()
+
+    def keyword_score(self, message: str) -> float:
+        """
+        Score how much topical content a message carries
+
+        Args:
+            message: User message
+
+        Returns:
+            Keyword score
+        """
+        score = 0.0
+        for word in jieba.lcut(self._normalize(message)):
+            word = word.strip()
+            if not word or _SEPARATOR_RE.fullmatch(word):
+                continue
+            if word in _QUESTION_WORDS:
+                score += 0.5
+            elif word not in _STOPWORDS and (len(word) >= 2 or (word.isascii() and word.isalnum())):
+                score += 1.0
+        return score
+
+    def classify(self, message: str) -> Tuple[bool, str]:
+        """
+        Decide whether a message needs retrieval
+
+        Args:
+            message: User message
+
+        Returns:
+            Tuple of (needs retrieval, reason) where reason is 'chitchat',
+            'low_score' or 'keywords'
+        """
+        text = _SEPARATOR_RE.sub('', self._normalize(message))
+        if not text or _CHITCHAT_RE.fullmatch(text):
+            return False, 'chitchat'
+        score = self.keyword_score(message)
+        if score < self.threshold:
+            return False, 'low_score'
+        return True, 'keywords'
+
+class RetrievalGate:
+    """Apply the classifier and the empty knowledge base check, and account for skipped retrievals"""
+
+    def __init__(self, config, kb_manager):
+        """
+        Initialize retrieval gate
+
+        Args:
+            config: Application configuration object
+            kb_manager: KnowledgeBaseManager whose size is checked
+        """
+        self.skip_chitchat = config.RETRIEVAL_SKIP_CHITCHAT
+        self.skip_empty_kb = config.RETRIEVAL_SKIP_EMPTY_KB
+        self.kb_manager = kb_manager
+        self.classifier = RetrievalClassifier(config) if self.skip_chitchat else None
+        self.logger = logging.getLogger(__name__)
+
+    def should_retrieve(self, message: str) -> bool:
+        """
+        Decide whether to retrieve for a message and count the decision
+
+        Args:
+            message: User message
+
+        Returns:
+            True if retrieval should run
+        """
+        reason = 'keywords'
+        retrieve = True
+        if self.skip_empty_kb and not self.kb_manager.documents_metadata:
+            retrieve, reason = False, 'empty_kb'
+        elif self.classifier:
+            retrieve, reason = self.classifier.classify(message)
+
+        if retrieve:
+            metrics.incr('retrieval.performed')
+        else:
+            metrics.incr(f'retrieval.skipped.{reason}')
+            self.logger.info(f"Retrieval skipped ({reason}) for: {message[:50]}")
+        return retrieve
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get retrieval decisions and their estimated savings
+
+        Returns:
+            Dictionary with performed and skipped counts, embedding calls
+            avoided and the latency saved based on the median search time
+        """
+        snapshot = metrics.snapshot()
+        counters = snapshot.get('counters', {})
+        skipped = {
+            reason: int(counters.get(f'retrieval.skipped.{reason}', 0))
+            for reason in ('chitchat', 'low_score', 'empty_kb')
+        }
+        total_skipped = sum(skipped.values())
+        search_ms = round(metrics.percentile('retrieval.search', 50) * 1000, 2)
+        return {
+            'performed': int(counters.get('retrieval.performed', 0)),
+            'skipped': skipped,
+            'embedding_calls_avoided': total_skipped,
+            'search_p50_ms': search_ms,
+            'estimated_saved_ms': round(total_skipped * search_ms, 1)
+        }
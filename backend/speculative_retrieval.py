@@ -0,0 +1,256 @@
+"""
+Speculative knowledge base retrieval from interim ASR hypotheses
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional
+
+import jieba
+
+from utils.metrics import metrics
+from .bm25_index import tokenize
+
+class _Speculation:
+    """One retrieval started from a partial transcript"""
+
+    __slots__ = ('text', 'terms', 'kb_version', 'future', 'duration')
+
+    def __init__(self, text: str, kb_version: int):
+        self.text = text
+        self.terms = frozenset(tokenize(text))
+        self.kb_version = kb_version
+        self.future = None
+        self.duration = 0.0
+
+class _Turn:
+    """Latest interim hypothesis and speculation of a session's current utterance"""
+
+    __slots__ = ('hypothesis', 'kb_version', 'deadline', 'speculation', 'launched')
+
+    def __init__(self):
+        self.hypothesis = ''
+        self.kb_version = 0
+        # When the hypothesis counts as stable, None once it has been handled
+        self.deadline: Optional[float] = None
+        self.speculation: Optional[_Speculation] = None
+        self.launched = 0
+
+class SpeculativeRetriever:
+    """
+    Start retrieval while the recognizer is still working on an utterance
+
+    Every interim hypothesis of a session is observed; once a hypothesis of
+    at least `min_chars` characters has gone unrevised for `stable_time`
+    seconds, a settling thread searches it in the background. A later stable
+    hypothesis whose terms differ enough replaces the speculation, up to
+    `max_per_turn` searches per utterance. When the final transcript arrives
+    it takes the speculation if their content terms overlap (Jaccard) at
+    least `match_threshold` and the knowledge base has not changed in
+    between; otherwise the speculative result is dropped and retrieval runs
+    as usual.
+    """
+
+    def __init__(self, config, search_fn: Callable[[str], List[Dict[str, Any]]],
+                 classifier=None):
+        """
+        Initialize speculative retriever
+
+        Args:
+            config: Application configuration object
+            search_fn: Function retrieving documents for a query
+            classifier: Optional RetrievalClassifier; hypotheses it would not
+                retrieve for are not speculated on
+        """
+        self.search_fn = search_fn
+        self.classifier = classifier
+        self.stable_time = config.SPECULATIVE_STABLE_MS / 1000.0
+        self.min_chars = config.SPECULATIVE_MIN_CHARS
+        self.match_threshold = config.SPECULATIVE_MATCH_THRESHOLD
+        self.max_per_turn = config.SPECULATIVE_MAX_PER_TURN
+        self.logger = logging.getLogger(__name__)
+        # Load the dictionary now rather than while the first utterance settles
+        jieba.initialize()
+
+        self._executor = ThreadPoolExecutor(max_workers=config.SPECULATIVE_WORKERS,
+                                            thread_name_prefix='speculative-retrieval')
+        self._lock = threading.Lock()
+        self._settled = threading.Condition(self._lock)
+        self._turns: Dict[str, _Turn] = {}
+        self._stats = {'started': 0, 'hits': 0, 'misses': 0, 'discarded': 0, 'errors': 0, 'saved_ms': 0.0}
+        self._settler = threading.Thread(target=self._settle_loop, name='speculation-settler', daemon=True)
+        self._settler.start()
+
+    @staticmethod
+    def similarity(a: frozenset, b: frozenset) -> float:
+        """
+        Jaccard overlap of two term sets
+
+        Args:
+            a: Terms of one text
+            b: Terms of the other text
+
+        Returns:
+            Overlap between 0 and 1, 0 if either set is empty
+        """
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+
+    def observe(self, session_id: str, hypothesis: str, kb_version: int):
+        """
+        Record an interim hypothesis; it is speculated on once it stays unrevised
+
+        Args:
+            session_id: Voice session the utterance belongs to
+            hypothesis: Transcript recognized so far
+            kb_version: Current knowledge base version
+        """
+        text = hypothesis.strip()
+        with self._settled:
+            turn = self._turns.get(session_id)
+            if turn is None:
+                turn = self._turns[session_id] = _Turn()
+            if text == turn.hypothesis:
+                return
+            turn.hypothesis = text
+            turn.kb_version = kb_version
+            turn.deadline = time.monotonic() + self.stable_time if len(text) >= self.min_chars else None
+            self._settled.notify()
+
+    def _settle_loop(self):
+        """Speculate on hypotheses whose stability deadline has passed"""
+        while True:
+            with self._settled:
+                now = time.monotonic()
+                due = []
+                for session_id, turn in self._turns.items():
+                    if turn.deadline is not None and turn.deadline <= now:
+                        turn.deadline = None
+                        due.append((session_id, turn.hypothesis, turn.kb_version))
+                if not due:
+                    deadlines = [turn.deadline for turn in self._turns.values() if turn.deadline is not None]
+                    self._settled.wait(timeout=min(deadlines) - now if deadlines else None)
+                    continue
+            for session_id, text, kb_version in due:
+                try:
+                    self._speculate(session_id, text, kb_version)
+                except Exception as e:
+                    self.logger.warning(f"Speculation failed to start: {str(e)}")
+
+    def _speculate(self, session_id: str, text: str, kb_version: int):
+        """Search a stable hypothesis unless the current speculation already covers it"""
+        with self._lock:
+            turn = self._turns.get(session_id)
+            if turn is None or turn.launched >= self.max_per_turn:
+                return
+            previous = turn.speculation
+
+        speculation = _Speculation(text, kb_version)
+        if previous is not None and self.similarity(previous.terms, speculation.terms) >= self.match_threshold:
+            return
+        if not speculation.terms or (self.classifier and not self.classifier.classify(text)[0]):
+            return
+
+        with self._lock:
+            if self._turns.get(session_id) is not turn or turn.speculation is not previous:
+                return
+            turn.speculation = speculation
+            turn.launched += 1
+            self._stats['started'] += 1
+            speculation.future = self._executor.submit(self._search, speculation)
+        if previous is not None:
+            previous.future.cancel()
+        metrics.incr('speculation.started')
+        self.logger.debug(f"Speculative retrieval started for: {text[:50]}")
+
+    def _search(self, speculation: _Speculation) -> List[Dict[str, Any]]:
+        """Run the search of a speculation and time it"""
+        start = time.perf_counter()
+        try:
+            return self.search_fn(speculation.text)
+        finally:
+            speculation.duration = time.perf_counter() - start
+
+    def take(self, session_id: str, final_text: str, kb_version: int,
+             timeout: Optional[float] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Use the session's speculation for its final transcript if it matches
+
+        Args:
+            session_id: Voice session the utterance belongs to
+            final_text: Final transcript
+            kb_version: Current knowledge base version
+            timeout: Seconds to wait for a speculation still in flight
+
+        Returns:
+            Retrieved documents, or None when retrieval must run normally
+        """
+        with self._lock:
+            turn = self._turns.pop(session_id, None)
+        speculation = turn.speculation if turn else None
+        if speculation is None:
+            return None
+
+        score = self.similarity(speculation.terms, frozenset(tokenize(final_text)))
+        if score < self.match_threshold or speculation.kb_version != kb_version:
+            speculation.future.cancel()
+            self._record('misses')
+            self.logger.info(f"Speculation discarded (overlap {score:.2f}): "
+                             f"'{speculation.text[:30]}' vs '{final_text[:30]}'")
+            return None
+
+        start = time.perf_counter()
+        try:
+            documents = speculation.future.result(timeout=timeout)
+        except Exception as e:
+            self.logger.warning(f"Speculative retrieval failed: {str(e)}")
+            self._record('errors')
+            return None
+        waited = time.perf_counter() - start
+
+        # The final transcript only waited for the part of the search that was still running
+        saved = max(0.0, speculation.duration - waited)
+        metrics.observe('speculation.saved', saved)
+        with self._lock:
+            self._stats['saved_ms'] += saved * 1000
+        self._record('hits')
+        return documents
+
+    def discard(self, session_id: str):
+        """
+        Drop the session's speculation, e.g. when recognition failed
+
+        Args:
+            session_id: Voice session identifier
+        """
+        with self._lock:
+            turn = self._turns.pop(session_id, None)
+        if turn and turn.speculation:
+            turn.speculation.future.cancel()
+            self._record('discarded')
+
+    def _record(self, name: str):
+        """Count a speculation outcome locally and in the metrics registry"""
+        with self._lock:
+            self._stats[name] += 1
+        metrics.incr(f'speculation.{name}')
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get speculation statistics
+
+        Returns:
+            Dictionary with outcome counts, hit rate and the retrieval time
+            saved in total and per voice turn
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._turns)
+        decided = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / decided, 4) if decided else 0.0
+        stats['saved_ms_per_turn'] = round(stats['saved_ms'] / decided, 1) if decided else 0.0
+        stats['saved_ms'] = round(stats['saved_ms'], 1)
+        return stats
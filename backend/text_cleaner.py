@@ -0,0 +1,207 @@
+"""
+Precompiled text cleaning for TTS, with an incremental variant for streamed tokens
+
+Both variants produce the output of these rules applied in order:
+
+1. remove markdown characters  # * ` _ [ ] ( ) { }
+2. remove inline math  $...$  (pairs on one line)
+3. remove http(s) URLs
+4. collapse whitespace runs to one space
+5. collapse !! and ?? runs, shorten .... runs to ...
+6. strip leading and trailing whitespace
+
+The incremental cleaner runs steps 2-5 as one regex scan so that only the
+unfinished tail of the stream is ever rescanned. Because removing math can
+join characters on either side, its URL pattern tolerates math spans between
+URL characters, and runs of whitespace or punctuation are merged across
+removed spans.
+"""
+
+import re
+from typing import List, Optional
+
+_MARKDOWN_RE = re.compile(r'[#*`_\[\](){}]')
+
+_MATH = r'\$[^\n$]*\$'
+_GAP = rf'(?:{_MATH})*'
+# Same set as the original [a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|%XX alternatives,
+# except that a $ opening a math span belongs to the math span
+_URL_CHAR = r'(?:[!%-_a-z]|\$(?![^\n$]*\$))'
+_URL = (
+    rf'h{_GAP}t{_GAP}t{_GAP}p{_GAP}(?:s{_GAP})?:{_GAP}/{_GAP}/{_GAP}'
+    rf'{_URL_CHAR}(?:{_MATH}|{_URL_CHAR})*'
+)
+
+_TOKEN_RE = re.compile(
+    rf'(?P<math>{_MATH})|(?P<url>{_URL})|(?P<space>\s+)|(?P<bang>!+)|(?P<question>\?+)|(?P<dot>\.+)'
+)
+
+# A buffer suffix that could still grow into a URL, possibly ending in an unclosed math span
+_PARTIAL_URL_RE = re.compile(
+    rf'h{_GAP}(?:t{_GAP}(?:t{_GAP}(?:p{_GAP}(?:s{_GAP})?(?::{_GAP}(?:/{_GAP}(?:/{_GAP})?)?)?)?)?)?'
+    r'(?:\$[^\n$]*)?\Z'
+)
+
+_REMOVED = ('math', 'url')
+
+# Rules applied one after another by clean_text_for_tts
+_MATH_RE = re.compile(_MATH)
+_URL_RE = re.compile(r'https?://[!$-_a-z]+')
+_SPACE_RE = re.compile(r'\s+')
+_BANG_RE = re.compile(r'!{2,}')
+_QUESTION_RE = re.compile(r'\?{2,}')
+_DOT_RE = re.compile(r'\.{3,}')
+
+class TTSTextCleaner:
+    """
+    Incremental TTS text cleaner
+
+    feed() returns the cleaned text that can no longer change; text whose
+    cleaning depends on what follows (an open math span, a URL that may still
+    grow, a trailing run of spaces or punctuation) is held until flush().
+    """
+
+    def __init__(self):
+        self._pending = ''
+        self._run_kind: Optional[str] = None
+        self._run_len = 0
+        self._started = False
+
+    def feed(self, text: str) -> str:
+        """
+        Add streamed text
+
+        Args:
+            text: Next piece of raw text
+
+        Returns:
+            Newly finalized cleaned text, possibly empty
+        """
+        self._pending += _MARKDOWN_RE.sub('', text)
+        return self._consume(final=False)
+
+    def flush(self) -> str:
+        """
+        Finish the stream
+
+        Returns:
+            Remaining cleaned text
+        """
+        output = self._consume(final=True)
+        if self._run_kind != 'space':
+            output += self._close_run()
+        self._run_kind = None
+        self._run_len = 0
+        return output
+
+    def _consume(self, final: bool) -> str:
+        """Clean the safe prefix of the pending buffer and keep the rest"""
+        buffer = self._pending
+        matches = list(_TOKEN_RE.finditer(buffer))
+        cut = len(buffer) if final else self._safe_length(buffer, matches)
+
+        out: List[str] = []
+        pos = 0
+        for match in matches:
+            start, end = match.span()
+            if end > cut:
+                break
+            if start > pos:
+                if self._run_kind is not None:
+                    out.append(self._close_run())
+                out.append(buffer[pos:start])
+                self._started = True
+            pos = end
+
+            kind = match.lastgroup
+            if kind in _REMOVED:
+                continue
+            if kind == self._run_kind:
+                self._run_len += end - start
+            else:
+                if self._run_kind is not None:
+                    out.append(self._close_run())
+                self._run_kind = kind
+                self._run_len = end - start
+
+        if cut > pos:
+            out.append(self._close_run())
+            out.append(buffer[pos:cut])
+            self._started = True
+
+        self._pending = buffer[cut:]
+        return ''.join(out)
+
+    @staticmethod
+    def _safe_length(buffer: str, matches) -> int:
+        """Length of the buffer prefix whose cleaning cannot change"""
+        cut = len(buffer)
+
+        # A URL touching the end may still grow
+        if matches and matches[-1].lastgroup == 'url' and matches[-1].end() == len(buffer):
+            cut = matches[-1].start()
+
+        partial = _PARTIAL_URL_RE.search(buffer)
+        if partial:
+            cut = min(cut, partial.start())
+
+        # An unpaired $ on the last line may still open a math span
+        line_start = buffer.rfind('\n') + 1
+        dollar = buffer.find('$', line_start)
+        while 0 <= dollar < cut:
+            inside = next((m for m in matches if m.start() <= dollar < m.end()), None)
+            if inside is None or inside.lastgroup == 'url':
+                cut = min(cut, inside.start() if inside else dollar)
+                break
+            dollar = buffer.find('$', inside.end())
+
+        # Never split a removed span or run
+        for match in matches:
+            if match.start() < cut < match.end():
+                cut = match.start()
+                break
+        return cut
+
+    def _close_run(self) -> str:
+        """Emit the open whitespace or punctuation run"""
+        kind = self._run_kind
+        if kind is None:
+            return ''
+        length = self._run_len
+        self._run_kind = None
+        self._run_len = 0
+
+        if kind == 'space':
+            return ' ' if self._started else ''
+        self._started = True
+        if kind == 'bang':
+            return '!'
+        if kind == 'question':
+            return '?'
+        return '...' if length >= 3 else '.' * length
+
+def clean_text_for_tts(text: str) -> str:
+    """
+    Clean text for TTS processing
+
+    Args:
+        text: Raw text
+
+    Returns:
+        Cleaned text suitable for TTS
+    """
+    # Each rule is a precompiled C-level scan that only runs when its trigger
+    # character is present; most answers need just the markdown and whitespace passes
+    text = _MARKDOWN_RE.sub('', text)
+    if '$' in text:
+        text = _MATH_RE.sub('', text)
+    if 'http' in text:
+        text = _URL_RE.sub('', text)
+    text = _SPACE_RE.sub(' ', text)
+    if '!!' in text:
+        text = _BANG_RE.sub('!', text)
+    if '??' in text:
+        text = _QUESTION_RE.sub('?', text)
+    if '...' in text:
+        text = _DOT_RE.sub('...', text)
+    return text.strip()
@@ -0,0 +1,215 @@
+"""
+Content-addressed cache for synthesized TTS audio
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+from utils.metrics import metrics
+
+class TTSAudioCache:
+    """Two-tier audio cache: byte-bounded in-memory LRU backed by content-addressed files"""
+
+    def __init__(self, cache_dir: str, max_memory_bytes: int, max_disk_bytes: int):
+        """
+        Initialize TTS audio cache
+
+        Args:
+            cache_dir: Directory of the disk tier
+            max_memory_bytes: Byte budget of the in-memory LRU
+            max_disk_bytes: Byte budget of the disk tier
+        """
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0
+        }
+
+        self._load_disk_index()
+
+    @staticmethod
+    def make_key(text: str, voice: str, model: str, audio_format: str) -> str:
+        """
+        Build the content address of a synthesis request
+
+        Args:
+            text: Cleaned text
+            voice: Voice name
+            model: TTS model name
+            audio_format: Output format identifier
+
+        Returns:
+            Hex SHA-256 digest
+        """
+        payload = json.dumps([text, voice, model, audio_format], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        """Disk location of a key, sharded by its first two hex digits"""
+        return os.path.join(self.cache_dir, key[:2], f"{key}.audio")
+
+    def _load_disk_index(self):
+        """Index existing cache files, oldest first"""
+        if self.max_disk_bytes <= 0:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            entries = []
+            for shard in os.listdir(self.cache_dir):
+                shard_dir = os.path.join(self.cache_dir, shard)
+                if not os.path.isdir(shard_dir):
+                    continue
+                for name in os.listdir(shard_dir):
+                    if not name.endswith('.audio'):
+                        continue
+                    stat = os.stat(os.path.join(shard_dir, name))
+                    entries.append((stat.st_mtime, name[:-len('.audio')], stat.st_size))
+            for _, key, size in sorted(entries):
+                self._disk[key] = size
+                self._disk_bytes += size
+            self.logger.info(f"TTS cache loaded {len(self._disk)} files ({self._disk_bytes} bytes)")
+        except Exception as e:
+            self.logger.warning(f"Failed to load TTS disk cache: {str(e)}")
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Look up cached audio
+
+        Args:
+            key: Cache key from make_key
+
+        Returns:
+            Audio bytes, or None on a miss
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self._record('memory_hits')
+                return data
+            on_disk = key in self._disk
+
+        if on_disk:
+            try:
+                with open(self._path(key), 'rb') as f:
+                    data = f.read()
+            except OSError:
+                data = None
+                with self._lock:
+                    self._disk_bytes -= self._disk.pop(key, 0)
+
+            if data is not None:
+                with self._lock:
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self._store_memory(key, data)
+                    self._record('disk_hits')
+                return data
+
+        with self._lock:
+            self._record('misses')
+        return None
+
+    def put(self, key: str, data: bytes):
+        """
+        Store audio in both tiers
+
+        Args:
+            key: Cache key from make_key
+            data: Audio bytes
+        """
+        if not data:
+            return
+
+        with self._lock:
+            self._store_memory(key, data)
+            if self.max_disk_bytes <= 0 or key in self._disk or len(data) > self.max_disk_bytes:
+                return
+
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            self.logger.warning(f"Failed to write TTS cache file: {str(e)}")
+            return
+
+        with self._lock:
+            if key not in self._disk:
+                self._disk[key] = len(data)
+                self._disk_bytes += len(data)
+            evicted = self._evict_disk()
+
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def _store_memory(self, key: str, data: bytes):
+        """Insert into the memory tier and evict least recently used entries (lock held)"""
+        if len(data) > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._record('memory_evictions')
+
+    def _evict_disk(self):
+        """Drop least recently used files beyond the disk budget (lock held)"""
+        evicted = []
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            evicted.append(key)
+            self._record('disk_evictions')
+        return evicted
+
+    def _record(self, name: str):
+        """Count a cache event locally and in the metrics registry (lock held)"""
+        self._stats[name] += 1
+        metrics.incr(f'tts.cache.{name}')
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+
+        Returns:
+            Dictionary with hit/miss/eviction counts and tier sizes
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_bytes
+            })
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,220 @@
+"""
+Sentence-level TTS audio cache with frequency-based (TinyLFU) admission
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+from utils.metrics import metrics
+
+class CountMinSketch:
+    """
+    Approximate access counts in fixed memory
+
+    Counters saturate at 15 and are halved once sample_size increments have
+    been recorded, so old popularity fades and new phrases can overtake it.
+    """
+
+    DEPTH = 4
+    MAX_COUNT = 15
+
+    def __init__(self, width: int):
+        """
+        Initialize count-min sketch
+
+        Args:
+            width: Counters per row, rounded up to a power of two
+        """
+        self.width = 1 << max(width - 1, 1).bit_length()
+        self.mask = self.width - 1
+        self.sample_size = 10 * self.width
+        self.rows = [bytearray(self.width) for _ in range(self.DEPTH)]
+        self.additions = 0
+
+    def _indexes(self, key: str):
+        """Row positions of a hex digest key"""
+        return [int(key[i * 8:(i + 1) * 8], 16) & self.mask for i in range(self.DEPTH)]
+
+    def increment(self, key: str) -> int:
+        """
+        Count one access of a key
+
+        Args:
+            key: Hex digest of at least 32 characters
+
+        Returns:
+            Estimated count after the increment
+        """
+        estimate = self.MAX_COUNT
+        for row, index in zip(self.rows, self._indexes(key)):
+            if row[index] < self.MAX_COUNT:
+                row[index] += 1
+            estimate = min(estimate, row[index])
+
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._age()
+        return estimate
+
+    def estimate(self, key: str) -> int:
+        """
+        Estimate how often a key has been seen
+
+        Args:
+            key: Hex digest of at least 32 characters
+
+        Returns:
+            Estimated count (never below the true recent count)
+        """
+        return min(row[index] for row, index in zip(self.rows, self._indexes(key)))
+
+    def _age(self):
+        """Halve every counter"""
+        for row in self.rows:
+            row[:] = bytes(count >> 1 for count in row)
+        self.additions //= 2
+
+class PhraseAudioCache:
+    """
+    Byte-bounded LRU of sentence audio guarded by a TinyLFU admission filter
+
+    Every lookup is counted in a sketch. A sentence is only stored once it
+    has been seen min_count times, and when the cache is full it only
+    replaces entries that are seen less often than itself, so one-off
+    sentences pass through without evicting stock phrases.
+    """
+
+    def __init__(self, max_bytes: int, sketch_width: int, min_count: int):
+        """
+        Initialize phrase audio cache
+
+        Args:
+            max_bytes: Byte budget of stored audio
+            sketch_width: Counters per sketch row
+            min_count: Sightings required before a sentence is stored
+        """
+        self.max_bytes = max_bytes
+        self.min_count = min_count
+        self.sketch = CountMinSketch(sketch_width)
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._voices: Dict[str, Dict[str, int]] = {}
+
+    def get(self, key: str, voice: str) -> Optional[bytes]:
+        """
+        Look up sentence audio and count the access
+
+        Args:
+            key: Cache key from TTSAudioCache.make_key
+            voice: Voice name, for per-voice statistics
+
+        Returns:
+            Audio bytes, or None on a miss
+        """
+        return self.lookup(key, voice)[0]
+
+    def lookup(self, key: str, voice: str, count: bool = True) -> Tuple[Optional[bytes], bool]:
+        """
+        Look up sentence audio and decide admission in one step
+
+        Args:
+            key: Cache key from TTSAudioCache.make_key
+            voice: Voice name, for per-voice statistics
+            count: Whether to record a sighting; False when the same request
+                already counted this sentence
+
+        Returns:
+            Tuple of (audio bytes or None on a miss, whether the sentence has
+            been seen often enough to be stored)
+        """
+        with self._lock:
+            frequency = self.sketch.increment(key) if count else self.sketch.estimate(key)
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            self._record(voice, 'hits' if data is not None else 'misses')
+            return data, frequency >= self.min_count
+
+    def is_frequent(self, key: str) -> bool:
+        """
+        Check whether a sentence has been seen often enough to be stored
+
+        Args:
+            key: Cache key from TTSAudioCache.make_key
+
+        Returns:
+            True if the sentence would pass the admission threshold
+        """
+        with self._lock:
+            return self.sketch.estimate(key) >= self.min_count
+
+    def put(self, key: str, voice: str, data: bytes) -> bool:
+        """
+        Offer sentence audio to the cache
+
+        Args:
+            key: Cache key from TTSAudioCache.make_key
+            voice: Voice name, for per-voice statistics
+            data: Audio bytes
+
+        Returns:
+            True if the audio was admitted
+        """
+        if not data or len(data) > self.max_bytes:
+            return False
+
+        with self._lock:
+            if key in self._entries:
+                return True
+
+            frequency = self.sketch.estimate(key)
+            if frequency < self.min_count:
+                self._record(voice, 'rejected')
+                return False
+
+            # Pick victims first so a rejected candidate evicts nothing
+            victims = []
+            freed = 0
+            for old_key, old_data in self._entries.items():
+                if self._bytes - freed + len(data) <= self.max_bytes:
+                    break
+                if self.sketch.estimate(old_key) >= frequency:
+                    self._record(voice, 'rejected')
+                    return False
+                victims.append(old_key)
+                freed += len(old_data)
+
+            for old_key in victims:
+                self._bytes -= len(self._entries.pop(old_key))
+                metrics.incr('tts.phrase_cache.evictions')
+            self._entries[key] = data
+            self._bytes += len(data)
+            self._record(voice, 'admitted')
+            return True
+
+    def _record(self, voice: str, name: str):
+        """Count a cache event per voice and in the metrics registry (lock held)"""
+        stats = self._voices.get(voice)
+        if stats is None:
+            stats = self._voices[voice] = {'hits': 0, 'misses': 0, 'admitted': 0, 'rejected': 0}
+        stats[name] += 1
+        metrics.incr(f'tts.phrase_cache.{name}')
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+
+        Returns:
+            Dictionary with entry and byte totals and hit rate per voice
+        """
+        with self._lock:
+            voices = {voice: dict(stats) for voice, stats in self._voices.items()}
+            stats = {'entries': len(self._entries), 'bytes': self._bytes}
+        for voice_stats in voices.values():
+            lookups = voice_stats['hits'] + voice_stats['misses']
+            voice_stats['hit_rate'] = round(voice_stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['voices'] = voices
+        return stats
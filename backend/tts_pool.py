@@ -0,0 +1,329 @@
+"""
+Pre-started CosyVoice synthesis sessions kept per voice so calls skip connection setup
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Deque, Optional, Set, Tuple
+
+from dashscope.audio.tts_v2 import SpeechSynthesizer, ResultCallback
+
+from utils.metrics import metrics
+
+class _RelayCallback(ResultCallback):
+    """Forward synthesizer events to the consumer that currently owns the session"""
+
+    def __init__(self):
+        self.target: Optional[ResultCallback] = None
+        self.opened = False
+        self.failed = False
+        self.closed = False
+
+    def on_open(self) -> None:
+        self.opened = True
+
+    def on_data(self, data: bytes) -> None:
+        if self.target:
+            self.target.on_data(data)
+
+    def on_complete(self) -> None:
+        if self.target:
+            self.target.on_complete()
+
+    def on_error(self, message) -> None:
+        self.failed = True
+        if self.target:
+            self.target.on_error(message)
+
+    def on_close(self) -> None:
+        self.closed = True
+
+class SynthesizerSession:
+    """
+    One synthesis task opened ahead of its text
+
+    Only the public streaming lifecycle is used: the first streaming_call
+    connects and starts the task, and the task ends with the connection once
+    the text is complete. A session therefore serves exactly one text; what a
+    pooled session saves is the WebSocket and run-task handshake on the
+    caller's critical path, not the connection itself.
+    """
+
+    def __init__(self, model: str, voice: str, audio_format):
+        self.relay = _RelayCallback()
+        self.synthesizer = SpeechSynthesizer(
+            model=model,
+            voice=voice,
+            format=audio_format,
+            callback=self.relay
+        )
+        self.started_at = None
+
+    def start(self):
+        """
+        Connect and start the task before the text is known
+
+        The task is opened with an empty first text, so run() only has to
+        send the real text. Sessions that are not started connect in run().
+
+        Raises:
+            Exception: If the connection or task handshake fails
+        """
+        start = time.perf_counter()
+        self.synthesizer.streaming_call('')
+        self.started_at = time.monotonic()
+        metrics.observe('tts.connect', time.perf_counter() - start)
+
+    def is_healthy(self, max_idle: float) -> bool:
+        """
+        Check whether the session can still take text
+
+        Args:
+            max_idle: Seconds after which an unused task is considered stale
+
+        Returns:
+            True if the task is open, has not failed or closed, and is recent enough
+        """
+        if self.started_at is None or not self.relay.opened or self.relay.failed or self.relay.closed:
+            return False
+        return time.monotonic() - self.started_at <= max_idle
+
+    def run(self, text: str, target: ResultCallback):
+        """
+        Send the text and finish the task; audio is delivered to target
+
+        Args:
+            text: Cleaned text
+            target: Callback receiving on_data/on_complete/on_error
+        """
+        self.relay.target = target
+        self.synthesizer.streaming_call(text)
+        self.synthesizer.async_streaming_complete()
+
+    def cancel(self):
+        """Stop the task and drop any undelivered audio"""
+        try:
+            self.synthesizer.streaming_cancel()
+        except Exception:
+            pass
+
+    def close(self):
+        """Close the connection of an unused session"""
+        try:
+            self.synthesizer.close()
+        except Exception:
+            pass
+
+class SynthesizerPool:
+    """
+    Keeps a few started sessions for the (model, voice, format) keys that
+    were explicitly warmed and refills them in the background
+
+    Calls for other keys connect inline and do not add keys. Keys warmed with
+    pinned=False are dropped after TTS_POOL_KEY_TTL seconds without a call,
+    and keys whose sessions fail to start are retried with exponential backoff.
+    """
+
+    def __init__(self, config):
+        """
+        Initialize synthesizer pool
+
+        Args:
+            config: Application configuration object
+        """
+        self.size = config.TTS_POOL_SIZE
+        self.max_idle = config.TTS_POOL_MAX_IDLE
+        self.key_ttl = config.TTS_POOL_KEY_TTL
+        self.max_backoff = config.TTS_POOL_MAX_BACKOFF
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._idle: Dict[Tuple[str, str, str], Deque[SynthesizerSession]] = {}
+        self._starting: Dict[Tuple[str, str, str], int] = {}
+        self._formats: Dict[Tuple[str, str, str], Any] = {}
+        self._last_used: Dict[Tuple[str, str, str], float] = {}
+        self._failures: Dict[Tuple[str, str, str], int] = {}
+        self._retry_at: Dict[Tuple[str, str, str], float] = {}
+        self._pinned: Set[Tuple[str, str, str]] = set()
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.TTS_POOL_WARMERS,
+            thread_name_prefix='tts-warm'
+        )
+        self._stop = threading.Event()
+        self._sweeper = threading.Thread(target=self._sweep_loop, name='tts-pool-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def warm(self, model: str, voice: str, audio_format, pinned: bool = False):
+        """
+        Start keeping sessions ready for a voice and format
+
+        Args:
+            model: TTS model name
+            voice: Voice name
+            audio_format: AudioFormat member
+            pinned: Keep the key warm even while it is unused
+        """
+        key = (model, voice, audio_format.name)
+        with self._lock:
+            if key not in self._idle:
+                self._idle[key] = deque()
+                self._starting[key] = 0
+                self._formats[key] = audio_format
+            self._last_used[key] = time.monotonic()
+            if pinned:
+                self._pinned.add(key)
+        self._refill(key)
+
+    def acquire(self, model: str, voice: str, audio_format) -> SynthesizerSession:
+        """
+        Take a started session of a warmed key, or a new one that connects when run
+
+        Args:
+            model: TTS model name
+            voice: Voice name
+            audio_format: AudioFormat member
+
+        Returns:
+            SynthesizerSession owned by the caller
+        """
+        key = (model, voice, audio_format.name)
+        session = None
+        stale = []
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle is not None:
+                self._last_used[key] = time.monotonic()
+                while idle:
+                    candidate = idle.popleft()
+                    if candidate.is_healthy(self.max_idle):
+                        session = candidate
+                        break
+                    stale.append(candidate)
+
+        if idle is not None:
+            self._recycle(stale)
+            self._refill(key)
+
+        if session:
+            metrics.incr('tts.pool.hits')
+            return session
+
+        metrics.incr('tts.pool.misses')
+        return SynthesizerSession(model, voice, audio_format)
+
+    def _refill(self, key: Tuple[str, str, str]):
+        """Start sessions in the background until the key has its target size"""
+        if self._stop.is_set():
+            return
+        with self._lock:
+            if key not in self._idle or time.monotonic() < self._retry_at.get(key, 0.0):
+                return
+            missing = self.size - len(self._idle[key]) - self._starting[key]
+            if missing <= 0:
+                return
+            self._starting[key] += missing
+        for _ in range(missing):
+            self.executor.submit(self._start_session, key)
+
+    def _start_session(self, key: Tuple[str, str, str]):
+        """Start one session on a warmer thread"""
+        model, voice, _ = key
+        with self._lock:
+            audio_format = self._formats.get(key)
+        if audio_format is None:
+            # The key expired before the warmer got to it
+            return
+        session = None
+        try:
+            session = SynthesizerSession(model, voice, audio_format)
+            session.start()
+        except Exception as e:
+            self.logger.warning(f"Failed to pre-start TTS session for {voice}: {str(e)}")
+            metrics.incr('tts.pool.warm_failures')
+            if session:
+                session.close()
+            session = None
+
+        with self._lock:
+            if key not in self._idle:
+                # The key expired while the session was starting
+                if session:
+                    session.close()
+                return
+            self._starting[key] -= 1
+            if session:
+                self._idle[key].append(session)
+                self._failures.pop(key, None)
+                self._retry_at.pop(key, None)
+            else:
+                failures = self._failures[key] = self._failures.get(key, 0) + 1
+                self._retry_at[key] = time.monotonic() + min(2.0 ** failures, self.max_backoff)
+
+    def _recycle(self, sessions):
+        """Close sessions that failed their health check"""
+        for session in sessions:
+            session.close()
+            metrics.incr('tts.pool.recycled')
+
+    def _expire(self, key: Tuple[str, str, str]) -> bool:
+        """Drop an unpinned key that has not been used within the TTL"""
+        with self._lock:
+            if key in self._pinned or time.monotonic() - self._last_used[key] <= self.key_ttl:
+                return False
+            sessions = list(self._idle.pop(key))
+            for table in (self._starting, self._formats, self._last_used, self._failures, self._retry_at):
+                table.pop(key, None)
+        for session in sessions:
+            session.close()
+        self.logger.info(f"Stopped keeping TTS sessions for unused {key[1]}/{key[2]}")
+        return True
+
+    def _sweep_loop(self):
+        """Replace stale or broken idle sessions before a caller meets them"""
+        interval = max(self.max_idle / 2.0, 1.0)
+        while not self._stop.wait(interval):
+            with self._lock:
+                keys = list(self._idle)
+            for key in keys:
+                if self._expire(key):
+                    continue
+                with self._lock:
+                    idle = self._idle[key]
+                    healthy = [s for s in idle if s.is_healthy(self.max_idle)]
+                    stale = [s for s in idle if s not in healthy]
+                    self._idle[key] = deque(healthy)
+                self._recycle(stale)
+                self._refill(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get pool statistics
+
+        Returns:
+            Idle and starting session counts and warm failures per voice and format
+        """
+        with self._lock:
+            return {
+                f"{voice}/{format_name}": {
+                    'idle': len(self._idle[(model, voice, format_name)]),
+                    'starting': self._starting[(model, voice, format_name)],
+                    'failures': self._failures.get((model, voice, format_name), 0),
+                    'pinned': (model, voice, format_name) in self._pinned
+                }
+                for model, voice, format_name in self._idle
+            }
+
+    def shutdown(self):
+        """Stop refilling and close idle sessions"""
+        self._stop.set()
+        self.executor.shutdown(wait=False)
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            for idle in self._idle.values():
+                idle.clear()
+        for session in sessions:
+            session.close()
@@ -0,0 +1,147 @@
+"""
+Priority admission of TTS work so real-time voice turns are not starved by bulk requests
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+from utils.metrics import metrics
+
+class TTSScheduler:
+    """
+    Slots for remote synthesis split into an interactive and a batch pool
+
+    Each class waits in its own earliest-deadline-first queue. Interactive
+    work may also borrow idle batch slots, while batch work never takes
+    interactive slots, so a bulk job cannot push voice latency up.
+    """
+
+    PRIORITIES = ('interactive', 'batch')
+
+    def __init__(self, config):
+        """
+        Initialize TTS scheduler
+
+        Args:
+            config: Application configuration object
+        """
+        self.logger = logging.getLogger(__name__)
+        self.capacity = {
+            'interactive': config.TTS_INTERACTIVE_CONCURRENCY,
+            'batch': config.TTS_BATCH_CONCURRENCY
+        }
+        self.default_deadline = {
+            'interactive': config.TTS_INTERACTIVE_DEADLINE,
+            'batch': config.TTS_BATCH_DEADLINE
+        }
+        self.active = {priority: 0 for priority in self.PRIORITIES}
+        self.waiting: Dict[str, List[list]] = {priority: [] for priority in self.PRIORITIES}
+        self.deadline_missed = {priority: 0 for priority in self.PRIORITIES}
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+
+    @contextmanager
+    def slot(self, priority: str = 'interactive', deadline: Optional[float] = None):
+        """
+        Hold a synthesis slot for the duration of a with block
+
+        Args:
+            priority: 'interactive' or 'batch'
+            deadline: Seconds from now by which the work should start,
+                class default if None
+        """
+        pool = self.acquire(priority, deadline)
+        try:
+            yield
+        finally:
+            self.release(pool)
+
+    def acquire(self, priority: str = 'interactive', deadline: Optional[float] = None) -> str:
+        """
+        Block until a slot is granted
+
+        Args:
+            priority: 'interactive' or 'batch'
+            deadline: Seconds from now by which the work should start,
+                class default if None
+
+        Returns:
+            Pool the slot was taken from, to be passed to release
+
+        Raises:
+            ValueError: If the priority is unknown
+        """
+        if priority not in self.PRIORITIES:
+            raise ValueError(f"Unknown TTS priority: {priority}")
+
+        enqueued = time.monotonic()
+        due = enqueued + (self.default_deadline[priority] if deadline is None else deadline)
+        entry = [due, next(self._seq)]
+
+        with self._cond:
+            queue = self.waiting[priority]
+            heapq.heappush(queue, entry)
+            pool = self._grant(priority, entry)
+            while pool is None:
+                self._cond.wait()
+                pool = self._grant(priority, entry)
+            heapq.heappop(queue)
+            self.active[pool] += 1
+            # The next waiter of this class may also be grantable now
+            self._cond.notify_all()
+
+        started = time.monotonic()
+        metrics.observe(f'tts.queue_wait.{priority}', started - enqueued)
+        if pool != priority:
+            metrics.incr('tts.scheduler.borrowed')
+        if started > due:
+            with self._cond:
+                self.deadline_missed[priority] += 1
+            metrics.incr(f'tts.deadline_missed.{priority}')
+            self.logger.warning(f"{priority} TTS work started {started - due:.2f}s after its deadline")
+        return pool
+
+    def _grant(self, priority: str, entry: list) -> Optional[str]:
+        """Pool with a free slot for entry if it is first in line (lock held)"""
+        if self.waiting[priority][0] is not entry:
+            return None
+        if self.active[priority] < self.capacity[priority]:
+            return priority
+        if priority == 'interactive' and self.active['batch'] < self.capacity['batch']:
+            return 'batch'
+        return None
+
+    def release(self, pool: str):
+        """
+        Return a slot
+
+        Args:
+            pool: Pool returned by acquire
+        """
+        with self._cond:
+            self.active[pool] -= 1
+            self._cond.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get scheduler statistics
+
+        Returns:
+            Capacity, active slots, queue length and missed deadlines per priority class
+        """
+        with self._cond:
+            return {
+                priority: {
+                    'capacity': self.capacity[priority],
+                    'active': self.active[priority],
+                    'waiting': len(self.waiting[priority]),
+                    'deadline_missed': self.deadline_missed[priority]
+                }
+                for priority in self.PRIORITIES
+            }
@@ -1,13 +1,65 @@
 import dashscope
-from dashscope.audio.tts_v2 import SpeechSynthesizer, AudioFormat
+from dashscope.audio.tts_v2 import AudioFormat, ResultCallback
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Generator, List, Tuple
 import tempfile
 import os
+import re
+import time
+import queue
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, nullcontext
+
+from utils.metrics import metrics
+from utils.singleflight import SingleFlight
+from .tts_cache import TTSAudioCache
+from .tts_phrase_cache import PhraseAudioCache
+from .tts_scheduler import TTSScheduler
+from .tts_pool import SynthesizerPool, SynthesizerSession
+from .audio_utils import concat_mp3, concat_wav
+from .text_cleaner import clean_text_for_tts
+
+_STREAM_END = object()
+
+# Half-width sentence punctuation mapped to the full-width forms most answers use
+_FULL_WIDTH_PUNCTUATION = str.maketrans({',': '，', '!': '！', '?': '？', ';': '；', ':': '：'})
+
+class StreamingSynthesisCallback(ResultCallback):
+    """Relay synthesizer callbacks into a queue consumed by a generator"""
+    
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.finished = False
+    
+    def on_data(self, data: bytes) -> None:
+        self.queue.put(bytes(data))
+    
+    def on_complete(self) -> None:
+        self.finished = True
+        self.queue.put(_STREAM_END)
+    
+    def on_error(self, message) -> None:
+        self.finished = True
+        self.queue.put(Exception(f"TTS stream error: {message}"))
 
 class TTSService:
     """Text-to-Speech service using DashScope CosyVoice"""
     
+    # Formats clients may ask for; those missing from the installed SDK fall back to the default
+    REQUESTABLE_FORMATS = ('pcm', 'mp3', 'opus', 'wav')
+    
+    # Formats whose separately synthesized pieces can be streamed back to back
+    STREAM_JOINABLE_FORMATS = ('pcm', 'mp3')
+    
+    MIME_TYPES = {
+        'mp3': 'audio/mpeg',
+        'wav': 'audio/wav',
+        'opus': 'audio/ogg; codecs=opus',
+        'pcm': 'audio/L16'
+    }
+    
     def __init__(self, config):
         """
         Initialize TTS service
@@ -20,14 +72,68 @@ class TTSService:
         
         # Initialize DashScope
         dashscope.api_key = config.DASHSCOPE_API_KEY
+        
+        # Output formats offered by the installed SDK, keyed by (format, sample rate)
+        self.formats = self._resolve_formats()
+        self.default_format = self._pick_format(config.TTS_DEFAULT_FORMAT, config.TTS_DEFAULT_SAMPLE_RATE)
+        if self.default_format is None:
+            raise Exception(f"语音合成不支持默认音频格式: {config.TTS_DEFAULT_FORMAT}")
+        self.logger.info(f"TTS formats resolved: {sorted(self.formats)}, default {self.default_format.name}")
+        
+        # Cache of synthesized audio keyed by (cleaned text, voice, model, format)
+        self.cache = None
+        if config.TTS_CACHE_ENABLED:
+            self.cache = TTSAudioCache(
+                config.TTS_CACHE_FOLDER,
+                max_memory_bytes=config.TTS_CACHE_MEMORY_BYTES,
+                max_disk_bytes=config.TTS_CACHE_DISK_BYTES
+            )
+        
+        # Audio of frequently repeated sentences, reused across different answers
+        self.phrase_cache = None
+        if config.TTS_PHRASE_CACHE_ENABLED:
+            self.phrase_cache = PhraseAudioCache(
+                max_bytes=config.TTS_PHRASE_CACHE_BYTES,
+                sketch_width=config.TTS_PHRASE_SKETCH_WIDTH,
+                min_count=config.TTS_PHRASE_MIN_COUNT
+            )
+        
+        # Concurrent identical requests share one remote synthesis
+        self.inflight = SingleFlight()
+        
+        # Remote synthesis slots, split between voice turns and bulk callers
+        self.scheduler = TTSScheduler(config)
+        
+        # Segment workers per priority class, so queued batch segments never sit ahead of
+        # interactive ones; each segment takes its own scheduler slot
+        self.segment_executors = {
+            priority: ThreadPoolExecutor(
+                max_workers=config.TTS_SEGMENT_CONCURRENCY,
+                thread_name_prefix=f'tts-segment-{priority}'
+            )
+            for priority in TTSScheduler.PRIORITIES
+        }
+        
+        # Pre-started synthesis sessions so calls skip connection setup
+        self.pool = SynthesizerPool(config) if config.TTS_POOL_ENABLED else None
+        for voice in config.TTS_POOL_VOICES:
+            self.warm_voice(voice, pinned=True)
+        
+        # Acknowledgement clips keyed by (voice, format name)
+        self.ack_clips: Dict[Tuple[str, str], List[bytes]] = {}
+        self._ack_lock = threading.Lock()
     
-    def synthesize(self, text: str, voice: str = 'longxiaochun_v2') -> bytes:
+    def synthesize(self, text: str, voice: str = 'longxiaochun_v2', audio_format=None,
+                   priority: str = 'interactive', deadline: Optional[float] = None) -> bytes:
         """
         Synthesize speech from text
         
         Args:
             text: Text to synthesize
             voice: Voice to use for synthesis
+            audio_format: AudioFormat from negotiate_format, default format if None
+            priority: Scheduling class, 'interactive' or 'batch'
+            deadline: Seconds from now by which synthesis should start, class default if None
             
         Returns:
             Audio data as bytes
@@ -46,45 +152,669 @@ class TTSService:
             cleaned_text = self._clean_text_for_tts(text)
             
             # Use CosyVoice v2 model and voice
-            model = "cosyvoice-v2"
-              # Create synthesizer instance with correct format
-            try:
-                # Try different audio format options
-                audio_format = None
-                if hasattr(AudioFormat, 'MP3_22050HZ_MONO_16BIT'):
-                    audio_format = AudioFormat.MP3_22050HZ_MONO_16BIT
-                elif hasattr(AudioFormat, 'MP3_22050_MONO'):
-                    audio_format = AudioFormat.MP3_22050_MONO
-                elif hasattr(AudioFormat, 'WAV_16000HZ_MONO_16BIT'):
-                    audio_format = AudioFormat.WAV_16000HZ_MONO_16BIT
-                else:
-                    # Use default format
-                    audio_format = AudioFormat.MP3_44100HZ_MONO_16BIT if hasattr(AudioFormat, 'MP3_44100HZ_MONO_16BIT') else None
+            model = self.config.TTS_MODEL
+            
+            audio_format = audio_format or self.default_format
+            
+            # Serve repeated requests from the cache
+            key = TTSAudioCache.make_key(cleaned_text, voice, model, audio_format.name)
+            if self.cache:
+                cached_audio = self.cache.get(key)
+                if cached_audio:
+                    self.logger.info(f"TTS cache hit, audio size: {len(cached_audio)} bytes")
+                    return cached_audio
+            
+            # Wait on an identical in-flight request instead of issuing another
+            audio_data, shared = self.inflight.do(
+                key, self._synthesize_uncached, key, cleaned_text, voice, model, audio_format,
+                priority, deadline
+            )
+            if shared:
+                metrics.incr('tts.singleflight.shared')
+                self.logger.info(f"TTS request coalesced with an in-flight synthesis, audio size: {len(audio_data)} bytes")
+            return audio_data
                 
-                synthesizer = SpeechSynthesizer(
-                    model=model,
-                    voice=voice,
-                    format=audio_format
-                )
-            except Exception as format_error:
-                self.logger.warning(f"Audio format issue, trying without format parameter: {format_error}")
-                synthesizer = SpeechSynthesizer(
-                    model=model,
-                    voice=voice
-                )
+        except Exception as e:
+            self.logger.error(f"TTS synthesis failed: {str(e)}")
+            raise Exception(f"语音合成失败: {str(e)}")
+    
+    def _synthesize_uncached(self, key: str, text: str, voice: str, model: str, audio_format,
+                             priority: str, deadline: Optional[float]) -> bytes:
+        """
+        Synthesize cleaned text remotely and cache the result
+        
+        Args:
+            key: Cache key of the request
+            text: Cleaned text
+            voice: Voice to use for synthesis
+            model: TTS model name
+            audio_format: AudioFormat member
+            priority: Scheduling class
+            deadline: Seconds from now by which synthesis should start
             
+        Returns:
+            Audio data as bytes
+        """
+        metrics.incr('tts.remote_requests')
+        
+        # Long text is split at sentence boundaries and synthesized concurrently
+        start = time.perf_counter()
+        segments = self._split_segments(text, self.config.TTS_SEGMENT_MAX_CHARS)
+        joinable = self._format_family(audio_format) in ('mp3', 'wav', 'pcm')
+        audio_data = None
+        if joinable and self.phrase_cache:
+            audio_data = self._synthesize_phrases(text, voice, model, audio_format, priority, deadline)
+        if audio_data is None and len(segments) > 1 and joinable:
+            audio_data = self._synthesize_segments(segments, voice, model, audio_format, priority, deadline)
+        elif audio_data is None:
+            with self.scheduler.slot(priority, deadline):
+                audio_data = self._call_synthesizer(text, voice, model, audio_format)
+        metrics.observe('tts.synthesize', time.perf_counter() - start)
+        
+        if not audio_data:
+            raise Exception("No audio data received from TTS API")
+        
+        self.logger.info(f"TTS synthesis successful, audio size: {len(audio_data)} bytes")
+        if self.cache:
+            self.cache.put(key, audio_data)
+        return audio_data
+    
+    def _call_synthesizer(self, text: str, voice: str, model: str, audio_format) -> Optional[bytes]:
+        """
+        Run one blocking synthesis call
+        
+        Args:
+            text: Cleaned text
+            voice: Voice to use for synthesis
+            model: TTS model name
+            audio_format: AudioFormat member
+            
+        Returns:
+            Audio data as bytes
+        """
+        callback = StreamingSynthesisCallback()
+        session = self._open_session(model, voice, audio_format)
+        try:
             # Call TTS API
-            audio_data = synthesizer.call(cleaned_text)
+            session.run(text, callback)
+            chunks = []
+            while True:
+                item = self._next_audio(callback)
+                if item is _STREAM_END:
+                    return b''.join(chunks)
+                chunks.append(item)
+        finally:
+            if not callback.finished:
+                session.cancel()
+    
+    def _open_session(self, model: str, voice: str, audio_format) -> SynthesizerSession:
+        """
+        Get a synthesis session, pre-started from the pool when one is ready
+        
+        Args:
+            model: TTS model name
+            voice: Voice to use for synthesis
+            audio_format: AudioFormat member
+            
+        Returns:
+            SynthesizerSession; one that is not pre-started connects when run
+        """
+        if self.pool:
+            return self.pool.acquire(model, voice, audio_format)
+        return SynthesizerSession(model, voice, audio_format)
+    
+    def _next_audio(self, callback: StreamingSynthesisCallback):
+        """Wait for the next audio chunk or the end marker of a session"""
+        try:
+            item = callback.queue.get(timeout=self.config.TTS_STREAM_TIMEOUT)
+        except queue.Empty:
+            raise Exception("TTS stream timed out waiting for audio")
+        if isinstance(item, Exception):
+            metrics.incr('tts.session_errors')
+            raise item
+        return item
+    
+    def _synthesize_segments(self, segments: List[str], voice: str, model: str, audio_format,
+                             priority: str, deadline: Optional[float]) -> bytes:
+        """
+        Synthesize segments concurrently and join them in order
+        
+        Args:
+            segments: Text segments in reading order
+            voice: Voice to use for synthesis
+            model: TTS model name
+            audio_format: AudioFormat member
+            priority: Scheduling class of the request
+            deadline: Seconds from now by which synthesis should start
+            
+        Returns:
+            Joined audio data
+        """
+        self.logger.info(f"Synthesizing {len(segments)} segments concurrently")
+        metrics.incr('tts.segmented_requests')
+        
+        executor = self.segment_executors[priority]
+        futures = [
+            executor.submit(self._synthesize_segment, segment, voice, model, audio_format, priority, deadline)
+            for segment in segments
+        ]
+        return self._join_audio([future.result() for future in futures], audio_format)
+    
+    def _join_audio(self, parts: List[bytes], audio_format) -> bytes:
+        """
+        Join separately synthesized audio in order
+        
+        Args:
+            parts: Audio of consecutive segments
+            audio_format: AudioFormat member shared by all parts
             
-            if audio_data:
-                self.logger.info(f"TTS synthesis successful, audio size: {len(audio_data)} bytes")
+        Returns:
+            Joined audio data
+        """
+        family = self._format_family(audio_format)
+        if family == 'pcm':
+            return b''.join(parts)
+        try:
+            return concat_wav(parts) if family == 'wav' else concat_mp3(parts)
+        except ValueError as e:
+            self.logger.warning(f"Container-aware {family} join failed, concatenating raw segments: {str(e)}")
+            return b''.join(parts)
+    
+    def _synthesize_segment(self, text: str, voice: str, model: str, audio_format,
+                            priority: str, deadline: Optional[float]) -> bytes:
+        """
+        Synthesize one segment, retrying it on its own when it fails
+        
+        Each attempt holds its own scheduler slot, released while backing off.
+        
+        Args:
+            text: Segment text
+            voice: Voice to use for synthesis
+            model: TTS model name
+            audio_format: AudioFormat member
+            priority: Scheduling class of the request
+            deadline: Seconds from now by which synthesis should start
+            
+        Returns:
+            Audio data as bytes
+        """
+        attempts = self.config.TTS_SEGMENT_RETRIES + 1
+        for attempt in range(attempts):
+            try:
+                with self.scheduler.slot(priority, deadline):
+                    start = time.perf_counter()
+                    audio_data = self._call_synthesizer(text, voice, model, audio_format)
+                if not audio_data:
+                    raise Exception("No audio data received from TTS API")
+                metrics.observe('tts.segment', time.perf_counter() - start)
                 return audio_data
+            except Exception as e:
+                if attempt + 1 >= attempts:
+                    raise
+                self.logger.warning(f"TTS segment failed (attempt {attempt + 1}/{attempts}), retrying: {str(e)}")
+                metrics.incr('tts.segment.retries')
+                time.sleep(0.2 * 2 ** attempt)
+    
+    def _plan_phrases(self, text: str, voice: str, model: str, audio_format) -> Optional[List[Any]]:
+        """
+        Split text into sentences served from the phrase cache and the rest
+        
+        Each sentence is counted once per request, so a sentence repeated
+        within one answer does not reach the admission threshold on its own.
+        
+        Args:
+            text: Cleaned text
+            voice: Voice to use for synthesis
+            model: TTS model name
+            audio_format: AudioFormat member
+            
+        Returns:
+            Parts in reading order, each cached audio bytes, a frequent
+            (phrase, key) to synthesize and store, or a list of other
+            sentences; None if no sentence is cached or frequent
+        """
+        parts = []
+        pending = []
+        counted = set()
+        reused = False
+        for sentence in self._split_sentences(text, self.config.TTS_SEGMENT_MAX_CHARS):
+            phrase = self._normalize_phrase(sentence)
+            if not phrase or len(phrase) > self.config.TTS_PHRASE_MAX_CHARS:
+                pending.append(sentence)
+                continue
+            key = TTSAudioCache.make_key(phrase, voice, model, audio_format.name)
+            cached, frequent = self.phrase_cache.lookup(key, voice, count=key not in counted)
+            counted.add(key)
+            if cached is None and not frequent:
+                pending.append(sentence)
+                continue
+            if pending:
+                parts.append(pending)
+                pending = []
+            parts.append(cached if cached is not None else (phrase, key))
+            reused = True
+        
+        if not reused:
+            return None
+        if pending:
+            parts.append(pending)
+        return parts
+    
+    def _synthesize_phrases(self, text: str, voice: str, model: str, audio_format,
+                            priority: str, deadline: Optional[float]) -> Optional[bytes]:
+        """
+        Synthesize text reusing cached audio of frequently repeated sentences
+        
+        Sentences found in the phrase cache are used as they are, and
+        sentences seen often enough to be admitted are synthesized on their
+        own so their audio can be stored. The remaining sentences are packed
+        into segments as usual.
+        
+        Args:
+            text: Cleaned text
+            voice: Voice to use for synthesis
+            model: TTS model name
+            audio_format: AudioFormat member
+            priority: Scheduling class of the request
+            deadline: Seconds from now by which synthesis should start
+            
+        Returns:
+            Joined audio data, or None if no sentence is cached or frequent
+            (the caller then synthesizes the text as before)
+        """
+        plan = self._plan_phrases(text, voice, model, audio_format)
+        if plan is None:
+            return None
+        parts = []
+        for part in plan:
+            if isinstance(part, list):
+                parts.extend(self._pack_segments(part, self.config.TTS_SEGMENT_MAX_CHARS))
             else:
-                raise Exception("No audio data received from TTS API")
+                parts.append(part)
+        
+        executor = self.segment_executors[priority]
+        futures = {
+            index: executor.submit(
+                self._synthesize_segment, part if isinstance(part, str) else part[0], voice, model, audio_format,
+                priority, deadline
+            )
+            for index, part in enumerate(parts)
+            if not isinstance(part, bytes)
+        }
+        metrics.incr('tts.phrase_requests')
+        self.logger.info(f"Reusing sentence audio: {len(parts) - len(futures)} cached, {len(futures)} synthesized")
+        
+        audio_parts = []
+        for index, part in enumerate(parts):
+            if index not in futures:
+                audio_parts.append(part)
+                continue
+            audio = futures[index].result()
+            if isinstance(part, tuple):
+                self.phrase_cache.put(part[1], voice, audio)
+            audio_parts.append(audio)
+        return self._join_audio(audio_parts, audio_format)
+    
+    @staticmethod
+    def _normalize_phrase(sentence: str) -> str:
+        """Phrase-cache form of a sentence: trimmed, inner whitespace collapsed, full-width punctuation"""
+        return ' '.join(sentence.split()).translate(_FULL_WIDTH_PUNCTUATION)
+    
+    @staticmethod
+    def _split_segments(text: str, max_chars: int) -> List[str]:
+        """
+        Split text at sentence boundaries into segments of at most max_chars
+        
+        Args:
+            text: Cleaned text
+            max_chars: Maximum segment length
+            
+        Returns:
+            List of segments; a single segment when the text is short enough
+        """
+        if len(text) <= max_chars:
+            return [text]
+        return TTSService._pack_segments(TTSService._split_sentences(text, max_chars), max_chars)
+    
+    @staticmethod
+    def _split_sentences(text: str, max_chars: int) -> List[str]:
+        """
+        Split text into sentences of at most max_chars
+        
+        Args:
+            text: Cleaned text
+            max_chars: Maximum sentence length
+            
+        Returns:
+            Sentences in reading order, including their trailing punctuation
+        """
+        pieces = []
+        for sentence in re.findall(r'[^。！？!?；;\n]+[。！？!?；;\n]*|[。！？!?；;\n]+', text):
+            # Overlong sentences fall back to clause boundaries, then a hard cut
+            if len(sentence) > max_chars:
+                for clause in re.findall(r'[^，,、：:]+[，,、：:]*|[，,、：:]+', sentence):
+                    pieces.extend(clause[i:i + max_chars] for i in range(0, len(clause), max_chars))
+            else:
+                pieces.append(sentence)
+        return pieces
+    
+    @staticmethod
+    def _pack_segments(pieces: List[str], max_chars: int) -> List[str]:
+        """
+        Greedily pack consecutive sentences into segments of at most max_chars
+        
+        Args:
+            pieces: Sentences from _split_sentences
+            max_chars: Maximum segment length
+            
+        Returns:
+            Non-blank segments in reading order
+        """
+        segments = []
+        current = ''
+        for piece in pieces:
+            if current and len(current) + len(piece) > max_chars:
+                segments.append(current)
+                current = ''
+            current += piece
+        if current:
+            segments.append(current)
+        
+        return [segment for segment in segments if segment.strip()]
+    
+    @staticmethod
+    def _format_family(audio_format) -> str:
+        """Container of an AudioFormat member"""
+        return audio_format.format.lower()
+    
+    def synthesize_stream(self, text: str, voice: str = 'longxiaochun_v2', audio_format=None,
+                          priority: str = 'interactive', deadline: Optional[float] = None) -> Generator[bytes, None, None]:
+        """
+        Synthesize speech and yield audio chunks as the synthesizer produces them
+        
+        Sentences held in the phrase cache are sent from it, and frequent
+        sentences are streamed on their own so their audio can be stored.
+        
+        Args:
+            text: Text to synthesize
+            voice: Voice to use for synthesis
+            audio_format: AudioFormat from negotiate_format, default format if None
+            priority: Scheduling class, 'interactive' or 'batch'
+            deadline: Seconds from now by which synthesis should start, class default if None
+            
+        Yields:
+            Audio data chunks
+            
+        Raises:
+            Exception: If synthesis fails
+        """
+        self.logger.info(f"Starting streaming TTS synthesis for text: {text[:50]}...")
+        
+        # Validate text
+        if not text or not text.strip():
+            raise ValueError("Text cannot be empty")
+        
+        cleaned_text = self._clean_text_for_tts(text)
+        model = self.config.TTS_MODEL
+        audio_format = audio_format or self.default_format
+        
+        cache_key = None
+        if self.cache:
+            cache_key = TTSAudioCache.make_key(cleaned_text, voice, model, audio_format.name)
+            cached_audio = self.cache.get(cache_key)
+            if cached_audio:
+                self.logger.info(f"TTS cache hit, audio size: {len(cached_audio)} bytes")
+                yield cached_audio
+                return
+        
+        # Raw PCM and MP3 frames can be played back to back, so cached sentences are
+        # sent as they are and only the remaining runs are streamed from the synthesizer
+        parts = None
+        if self.phrase_cache and self._format_family(audio_format) in self.STREAM_JOINABLE_FORMATS:
+            parts = self._plan_phrases(cleaned_text, voice, model, audio_format)
+        if parts is None:
+            parts = [[cleaned_text]]
+        else:
+            metrics.incr('tts.phrase_streams')
+        
+        start = time.perf_counter()
+        # The slot is held until the stream finishes or the consumer goes away;
+        # a stream made only of cached sentences needs none
+        needs_synthesis = any(not isinstance(part, bytes) for part in parts)
+        slot = self.scheduler.acquire(priority, deadline) if needs_synthesis else None
+        
+        chunks = []
+        try:
+            for part in parts:
+                if isinstance(part, bytes):
+                    pieces = nullcontext([part])
+                else:
+                    part_text = part[0] if isinstance(part, tuple) else ''.join(part)
+                    pieces = closing(self._stream_session(part_text, voice, model, audio_format))
                 
-        except Exception as e:
-            self.logger.error(f"TTS synthesis failed: {str(e)}")
-            raise Exception(f"语音合成失败: {str(e)}")
+                part_chunks = []
+                with pieces as items:
+                    for item in items:
+                        if not chunks:
+                            metrics.observe('tts.first_byte', time.perf_counter() - start)
+                        chunks.append(item)
+                        part_chunks.append(item)
+                        yield item
+                if isinstance(part, tuple):
+                    self.phrase_cache.put(part[1], voice, b''.join(part_chunks))
+            
+            total = time.perf_counter() - start
+            metrics.observe('tts.total', total)
+            audio_data = b''.join(chunks)
+            self.logger.info(f"Streaming TTS synthesis finished: {len(audio_data)} bytes in {total:.2f}s")
+            
+            if cache_key and audio_data:
+                self.cache.put(cache_key, audio_data)
+                
+        finally:
+            if slot is not None:
+                self.scheduler.release(slot)
+    
+    def _stream_session(self, text: str, voice: str, model: str, audio_format) -> Generator[bytes, None, None]:
+        """
+        Stream one synthesis call
+        
+        Args:
+            text: Cleaned text
+            voice: Voice to use for synthesis
+            model: TTS model name
+            audio_format: AudioFormat member
+            
+        Yields:
+            Audio data chunks
+        """
+        callback = StreamingSynthesisCallback()
+        session = self._open_session(model, voice, audio_format)
+        try:
+            # The call returns at once and audio arrives through on_data
+            session.run(text, callback)
+            while True:
+                item = self._next_audio(callback)
+                if item is _STREAM_END:
+                    return
+                yield item
+        finally:
+            # Stop the remote task if the consumer went away early
+            if not callback.finished:
+                session.cancel()
+    
+    def _resolve_formats(self) -> Dict[Tuple[str, int], AudioFormat]:
+        """
+        Collect the output formats of the installed SDK
+        
+        Returns:
+            Dictionary mapping (format, sample rate) to AudioFormat
+        """
+        formats = {}
+        for member in AudioFormat:
+            family = str(member.format).lower()
+            if family not in self.REQUESTABLE_FORMATS or not member.sample_rate:
+                continue
+            # Keep the first (lowest bitrate) variant of each format and rate
+            formats.setdefault((family, int(member.sample_rate)), member)
+        return formats
+    
+    def _pick_format(self, family: str, sample_rate: Optional[int]) -> Optional[AudioFormat]:
+        """Resolved format of a family at the closest available sample rate"""
+        rates = [rate for fmt, rate in self.formats if fmt == family]
+        if not rates:
+            return None
+        target = sample_rate or self.config.TTS_DEFAULT_SAMPLE_RATE
+        return self.formats[(family, min(rates, key=lambda rate: (abs(rate - target), rate)))]
+    
+    def negotiate_format(self, family: Optional[str] = None, sample_rate: Optional[int] = None) -> AudioFormat:
+        """
+        Choose the output format for a client request
+        
+        Args:
+            family: Requested format (pcm, mp3, opus or wav), default format if None
+            sample_rate: Requested sample rate, nearest available rate is used
+            
+        Returns:
+            AudioFormat to pass to synthesize
+        """
+        if not family:
+            family = self.default_format.format
+            if sample_rate is None:
+                return self.default_format
+        
+        audio_format = self._pick_format(str(family).lower(), sample_rate)
+        if audio_format is None:
+            self.logger.warning(f"TTS format {family} is not supported, using {self.default_format.name}")
+            metrics.incr('tts.format_fallbacks')
+            return self.default_format
+        return audio_format
+    
+    def describe_format(self, audio_format=None) -> Dict[str, Any]:
+        """
+        Describe an output format for clients
+        
+        Args:
+            audio_format: AudioFormat member, default format if None
+            
+        Returns:
+            Dictionary with format, sample_rate and mime_type
+        """
+        audio_format = audio_format or self.default_format
+        family = self._format_family(audio_format)
+        mime_type = self.MIME_TYPES.get(family, 'application/octet-stream')
+        if family == 'pcm':
+            mime_type = f"{mime_type};rate={audio_format.sample_rate};channels=1"
+        return {
+            'format': family,
+            'sample_rate': int(audio_format.sample_rate),
+            'mime_type': mime_type
+        }
+    
+    def prepare_ack_clips(self, voice: str, audio_format=None, background: bool = False):
+        """
+        Synthesize, or load from the cache, the acknowledgement clips of a voice
+        
+        Args:
+            voice: Voice of the clips
+            audio_format: AudioFormat member, default format if None
+            background: Prepare on a daemon thread instead of blocking
+        """
+        audio_format = audio_format or self.default_format
+        key = (voice, audio_format.name)
+        with self._ack_lock:
+            if key in self.ack_clips:
+                return
+            self.ack_clips[key] = []  # reserved while preparing
+        
+        if background:
+            threading.Thread(
+                target=self._build_ack_clips, args=(key, voice, audio_format),
+                name='tts-ack', daemon=True
+            ).start()
+        else:
+            self._build_ack_clips(key, voice, audio_format)
+    
+    def _build_ack_clips(self, key: Tuple[str, str], voice: str, audio_format):
+        """Synthesize every acknowledgement phrase as batch work"""
+        clips = []
+        for phrase in self.config.TTS_ACK_PHRASES:
+            try:
+                clips.append(self.synthesize(phrase, voice, audio_format, priority='batch'))
+            except Exception as e:
+                self.logger.warning(f"Failed to prepare acknowledgement clip '{phrase}': {str(e)}")
+        
+        with self._ack_lock:
+            if clips:
+                self.ack_clips[key] = clips
+            else:
+                # Allow a later retry
+                self.ack_clips.pop(key, None)
+        self.logger.info(f"Prepared {len(clips)} acknowledgement clips for {voice} ({audio_format.name})")
+    
+    def get_ack_clip(self, voice: str, audio_format=None) -> Optional[bytes]:
+        """
+        Pick a prepared acknowledgement clip
+        
+        Args:
+            voice: Voice of the clip
+            audio_format: AudioFormat member, default format if None
+            
+        Returns:
+            Audio data, None if no clip is ready for this voice and format
+        """
+        audio_format = audio_format or self.default_format
+        clips = self.ack_clips.get((voice, audio_format.name))
+        return random.choice(clips) if clips else None
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get TTS audio cache statistics
+        
+        Returns:
+            Cache statistics, empty if caching is disabled
+        """
+        return self.cache.get_stats() if self.cache else {}
+    
+    def warm_voice(self, voice: str, audio_format=None, pinned: bool = False):
+        """
+        Keep started sessions ready for a voice and format
+        
+        Args:
+            voice: Voice to keep warm
+            audio_format: AudioFormat member, default format if None
+            pinned: Keep the sessions even while the voice is unused,
+                otherwise they stop being kept after TTS_POOL_KEY_TTL
+        """
+        if self.pool:
+            self.pool.warm(self.config.TTS_MODEL, voice, audio_format or self.default_format, pinned)
+    
+    def get_phrase_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get sentence-level cache statistics
+        
+        Returns:
+            Entry totals and hit rate per voice, empty if the phrase cache is disabled
+        """
+        return self.phrase_cache.get_stats() if self.phrase_cache else {}
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """
+        Get synthesizer pool statistics
+        
+        Returns:
+            Idle and starting sessions per voice, empty if pooling is disabled
+        """
+        return self.pool.get_stats() if self.pool else {}
+    
+    def get_scheduler_stats(self) -> Dict[str, Any]:
+        """
+        Get TTS scheduler statistics
+        
+        Returns:
+            Capacity, active slots and queue length per priority class
+        """
+        return self.scheduler.get_stats()
     
     def synthesize_to_file(self, text: str, output_path: str, voice: str = 'longxiaochun_v2') -> str:
         """
@@ -123,29 +853,8 @@ class TTSService:
         Returns:
             Cleaned text suitable for TTS
         """
-        import re
-        
-        # Remove markdown formatting
-        text = re.sub(r'[#*`_\[\](){}]', '', text)
-        
-        # Remove mathematical expressions
-        text = re.sub(r'\$.*?\$', '', text)
-        
-        # Remove URLs
-        text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
-        
-        # Replace multiple spaces with single space
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Remove excessive punctuation
-        text = re.sub(r'[!]{2,}', '!', text)
-        text = re.sub(r'[?]{2,}', '?', text)
-        text = re.sub(r'[.]{3,}', '...', text)
-        
-        # Trim whitespace
-        text = text.strip()
-        
-        return text
+        return clean_text_for_tts(text)
+    
     def get_available_voices(self) -> Dict[str, str]:
         """
         Get available voices for CosyVoice v2
@@ -6,8 +6,9 @@
 import webrtcvad
 import logging
 import time
+import numpy as np
 from collections import deque
-from typing import Optional, Callable
+from typing import Optional, Callable, List
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +47,8 @@ class VADProcessor:
         # 状态变量
         self.is_speaking = False
         self.speech_frames = []
+        self.speech_flags: List[bool] = []  # 与speech_frames对应的逐帧VAD判定
+        self.last_speech_flags: List[bool] = []  # 最近一次语音段的逐帧判定，供on_speech_end使用
         self.audio_buffer = bytearray()
         self.last_speech_time = 0
         self.last_silence_time = 0
@@ -98,16 +101,22 @@ class VADProcessor:
                     logger.info("检测到语音开始")
                     self.is_speaking = True
                     self.speech_frames = []
+                    self.speech_flags = []
                     
                     if self.on_speech_start:
                         self.on_speech_start()
                 
                 # 收集语音帧
                 self.speech_frames.append(frame)
+                self.speech_flags.append(True)
                 
             else:
                 # 静音帧
                 if self.is_speaking:
+                    # 语音段内的静音也保留，保证音频连续；首尾静音在识别前按逐帧判定裁剪
+                    self.speech_frames.append(frame)
+                    self.speech_flags.append(False)
+                    
                     # 检查是否应该结束语音
                     silence_duration = current_time - self.last_speech_time
                     
@@ -119,9 +128,11 @@ class VADProcessor:
                         if self.speech_frames and self.on_speech_end:
                             # 合并所有语音帧
                             full_audio = b''.join(self.speech_frames)
+                            self.last_speech_flags = self.speech_flags
                             self.on_speech_end(full_audio)
                         
                         self.speech_frames = []
+                        self.speech_flags = []
                 
         except Exception as e:
             logger.error(f"VAD帧处理错误: {e}")
@@ -165,10 +176,31 @@ class VADProcessor:
             logger.error(f"批量VAD检测错误: {e}")
             return False
     
+    def classify_frames(self, audio_data: bytes) -> np.ndarray:
+        """
+        逐帧判定音频中的语音活动
+        
+        Args:
+            audio_data: 音频数据（16位PCM格式）
+            
+        Returns:
+            每个完整VAD帧的布尔判定数组
+        """
+        frame_count = len(audio_data) // self.frame_bytes
+        flags = np.zeros(frame_count, dtype=bool)
+        for i in range(frame_count):
+            frame = audio_data[i * self.frame_bytes:(i + 1) * self.frame_bytes]
+            try:
+                flags[i] = self.vad.is_speech(frame, self.sample_rate)
+            except Exception as e:
+                logger.error(f"VAD帧判定错误: {e}")
+        return flags
+    
     def reset(self):
         """重置处理器状态"""
         self.is_speaking = False
         self.speech_frames = []
+        self.speech_flags = []
         self.audio_buffer = bytearray()
         self.last_speech_time = 0
         self.last_silence_time = 0
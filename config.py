@@ -20,6 +20,26 @@ class Config:
     ASR_MODEL = os.getenv('ASR_MODEL', 'paraformer-realtime-v1')
     TTS_MODEL = os.getenv('TTS_MODEL', 'cosyvoice-v2')
     
+    # ASR recognizer connection reuse
+    ASR_PERSISTENT_RECOGNIZER = os.getenv('ASR_PERSISTENT_RECOGNIZER', 'True').lower() == 'true'
+    ASR_RECOGNIZER_IDLE_TIMEOUT = int(os.getenv('ASR_RECOGNIZER_IDLE_TIMEOUT', 15))  # seconds
+    ASR_UTTERANCE_TIMEOUT = 5.0  # seconds to wait for the final sentence of an utterance
+    
+    # Streaming ASR pacing: 1.0 = real time, N = N× real time, 0 = as fast as accepted
+    ASR_STREAMING_PACING = float(os.getenv('ASR_STREAMING_PACING', 1.0))
+    ASR_STREAMING_COMPLETE_TIMEOUT = 30  # seconds
+    
+    # Silence trimming and loudness normalization before ASR upload
+    ASR_TRIM_SILENCE = os.getenv('ASR_TRIM_SILENCE', 'True').lower() == 'true'
+    ASR_TRIM_PADDING_MS = 200  # non-speech kept around the speech region
+    ASR_TARGET_DBFS = -20.0
+    ASR_MAX_GAIN_DB = 20.0
+    
+    # Batch transcription jobs
+    ASR_JOB_CONCURRENCY = int(os.getenv('ASR_JOB_CONCURRENCY', 4))
+    ASR_JOB_MAX_FILES = 50
+    ASR_JOB_RETENTION = 100  # finished jobs kept for polling
+    
     # File upload settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = 'uploads'
@@ -34,14 +54,94 @@ class Config:
     CHUNK_SIZE = 1000
     CHUNK_OVERLAP = 200
     MAX_CONTEXT_LENGTH = 4000
+    MAX_CONTEXT_TOKENS = int(os.getenv('MAX_CONTEXT_TOKENS', 3000))  # system prompt + user prompt
+    CONTEXT_DOCUMENT_SHARE = 0.7  # of the tokens left after system prompt and question
+    CONTEXT_HISTORY_TURNS = 5
     RETRIEVAL_K = 3
     
+    # Retrieval is skipped for chit-chat and while the knowledge base is empty
+    RETRIEVAL_SKIP_CHITCHAT = os.getenv('RETRIEVAL_SKIP_CHITCHAT', 'True').lower() == 'true'
+    RETRIEVAL_SKIP_EMPTY_KB = os.getenv('RETRIEVAL_SKIP_EMPTY_KB', 'True').lower() == 'true'
+    RETRIEVAL_MIN_KEYWORD_SCORE = 1.0
+    
+    # Retrieval mode: 'vector', 'bm25' (local, no network) or 'hybrid' (both, fused by reciprocal rank)
+    RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'hybrid')
+    BM25_INDEX_PATH = os.path.join('knowledge_base', 'bm25_index.json')
+    HYBRID_CANDIDATE_FACTOR = 3  # candidates per retriever = RETRIEVAL_K * factor
+    RRF_CONSTANT = 60
+    
+    # Speculative retrieval from interim ASR transcripts in voice turns
+    SPECULATIVE_RETRIEVAL_ENABLED = os.getenv('SPECULATIVE_RETRIEVAL_ENABLED', 'True').lower() == 'true'
+    SPECULATIVE_STABLE_MS = 150  # an interim hypothesis unrevised this long is searched
+    SPECULATIVE_MIN_CHARS = 4
+    SPECULATIVE_MATCH_THRESHOLD = float(os.getenv('SPECULATIVE_MATCH_THRESHOLD', 0.75))  # term overlap with the final transcript
+    SPECULATIVE_MAX_PER_TURN = 3
+    SPECULATIVE_WORKERS = 4
+    SPECULATIVE_WAIT_TIMEOUT = 5.0  # seconds the final transcript waits for a matching speculation
+    
+    # Query embedding cache (memory LRU, shared through Redis when available)
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', 5000))
+    QUERY_EMBEDDING_CACHE_TTL = int(os.getenv('QUERY_EMBEDDING_CACHE_TTL', 86400))  # seconds
+    
+    # Micro-batching of concurrent query embeddings into one API call
+    EMBEDDING_BATCH_ENABLED = os.getenv('EMBEDDING_BATCH_ENABLED', 'True').lower() == 'true'
+    EMBEDDING_BATCH_SIZE = 25  # texts per call, the embedding API's batch limit
+    EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv('EMBEDDING_BATCH_MAX_WAIT_MS', 5))
+    EMBEDDING_BATCH_CONCURRENCY = 8  # batches in flight at once
+    
+    # Semantic answer cache for questions asked without prior history
+    ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'True').lower() == 'true'
+    ANSWER_CACHE_SIZE = 1000
+    ANSWER_CACHE_THRESHOLD = float(os.getenv('ANSWER_CACHE_THRESHOLD', 0.95))  # cosine similarity
+    ANSWER_CACHE_TTL = 3600  # seconds
+    
     # Chat settings
     MAX_CHAT_HISTORY = 20
     SYSTEM_PROMPT = """你是一个有用的AI助手，能够基于提供的上下文信息来回答问题。
 请根据给定的上下文信息来回答用户的问题。如果上下文中没有相关信息，请诚实地说明你不知道答案。
 回答要准确、有用且简洁。"""
     
+    # Per-session conversation memory
+    CONVERSATION_MAX_SESSIONS = int(os.getenv('CONVERSATION_MAX_SESSIONS', 10000))
+    CONVERSATION_TTL = int(os.getenv('CONVERSATION_TTL', 3600))  # seconds of inactivity
+    CONVERSATION_MAX_MESSAGE_CHARS = 2000
+    
+    # /chat_stream server-sent events
+    CHAT_STREAM_HEARTBEAT = 15.0  # seconds between keepalive comments
+    CHAT_STREAM_RETRY_MS = 3000  # client reconnect delay
+    CHAT_STREAM_REPLAY_EVENTS = 2048  # events buffered per stream for Last-Event-ID resume
+    CHAT_STREAM_RETENTION = 120  # seconds a finished stream stays resumable
+    CHAT_STREAM_MAX_STREAMS = 1000
+    CHAT_STREAM_WORKERS = int(os.getenv('CHAT_STREAM_WORKERS', 32))
+    
+    # LLM routing per request class: model, answer length and latency budgets (p95, ms)
+    LLM_FAST_MODEL = os.getenv('LLM_FAST_MODEL', 'qwen-turbo')
+    LLM_PROFILES = {
+        'voice': {
+            'model': os.getenv('LLM_VOICE_MODEL', LLM_MODEL),
+            'fallback_model': LLM_FAST_MODEL,
+            'max_tokens': 300,
+            'first_token_budget_ms': 1200,
+            'complete_budget_ms': 3000,
+            'instruction': '回答会被直接朗读给用户，请用两三句简短的口语化中文回答，不要使用Markdown、列表、链接或表情符号。'
+        },
+        'chat': {
+            'model': LLM_MODEL,
+            'fallback_model': LLM_FAST_MODEL,
+            'max_tokens': 2000,
+            'first_token_budget_ms': 2500,
+            'complete_budget_ms': 15000
+        },
+        'batch': {
+            'model': os.getenv('LLM_BATCH_MODEL', LLM_MODEL),
+            'fallback_model': None,
+            'max_tokens': 2000
+        }
+    }
+    LLM_DEFAULT_CLASS = 'chat'
+    LLM_LATENCY_WINDOW = 300  # seconds of calls the p95 is computed over
+    LLM_LATENCY_MIN_SAMPLES = 5
+    
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     
@@ -60,6 +160,53 @@ class Config:
         'loongbella_v2': 'Bella - 女声'
     }
     
+    # Voice used for spoken answers in real-time voice chat
+    VOICE_CHAT_VOICE = os.getenv('VOICE_CHAT_VOICE', 'longwan_v2')
+    
+    # Short clips played as soon as an utterance ends, while the answer is prepared
+    TTS_ACK_ENABLED = os.getenv('TTS_ACK_ENABLED', 'True').lower() == 'true'
+    TTS_ACK_PHRASES = ['嗯，好的。', '好的，我想一下。', '收到，请稍等。']
+    
+    # Default TTS output; clients may negotiate pcm, mp3 or opus per request
+    TTS_DEFAULT_FORMAT = os.getenv('TTS_DEFAULT_FORMAT', 'mp3')
+    TTS_DEFAULT_SAMPLE_RATE = int(os.getenv('TTS_DEFAULT_SAMPLE_RATE', 22050))
+    
+    # TTS audio cache (memory LRU + content-addressed disk tier)
+    TTS_CACHE_ENABLED = os.getenv('TTS_CACHE_ENABLED', 'True').lower() == 'true'
+    TTS_CACHE_FOLDER = 'tts_cache'
+    TTS_CACHE_MEMORY_BYTES = int(os.getenv('TTS_CACHE_MEMORY_BYTES', 64 * 1024 * 1024))
+    TTS_CACHE_DISK_BYTES = int(os.getenv('TTS_CACHE_DISK_BYTES', 512 * 1024 * 1024))
+    
+    # Sentence-level audio cache; a sentence is stored once seen TTS_PHRASE_MIN_COUNT times
+    TTS_PHRASE_CACHE_ENABLED = os.getenv('TTS_PHRASE_CACHE_ENABLED', 'True').lower() == 'true'
+    TTS_PHRASE_CACHE_BYTES = int(os.getenv('TTS_PHRASE_CACHE_BYTES', 32 * 1024 * 1024))
+    TTS_PHRASE_MIN_COUNT = 2
+    TTS_PHRASE_MAX_CHARS = 60
+    TTS_PHRASE_SKETCH_WIDTH = 8192
+    
+    # Streaming TTS
+    TTS_STREAM_TIMEOUT = 10  # seconds without audio before a stream is abandoned
+    
+    # Segmented synthesis of long text
+    TTS_SEGMENT_MAX_CHARS = int(os.getenv('TTS_SEGMENT_MAX_CHARS', 200))
+    TTS_SEGMENT_CONCURRENCY = int(os.getenv('TTS_SEGMENT_CONCURRENCY', 4))
+    TTS_SEGMENT_RETRIES = 2
+    
+    # TTS scheduling: separate slot pools for voice turns and bulk callers
+    TTS_INTERACTIVE_CONCURRENCY = int(os.getenv('TTS_INTERACTIVE_CONCURRENCY', 4))
+    TTS_BATCH_CONCURRENCY = int(os.getenv('TTS_BATCH_CONCURRENCY', 2))
+    TTS_INTERACTIVE_DEADLINE = 1.0  # seconds a voice turn may wait for a slot
+    TTS_BATCH_DEADLINE = 60.0
+    
+    # Pre-started synthesis sessions per voice in active use
+    TTS_POOL_ENABLED = os.getenv('TTS_POOL_ENABLED', 'True').lower() == 'true'
+    TTS_POOL_VOICES = list(filter(TTS_VOICES.__contains__, os.getenv('TTS_POOL_VOICES', VOICE_CHAT_VOICE).split(',')))
+    TTS_POOL_SIZE = int(os.getenv('TTS_POOL_SIZE', 2))
+    TTS_POOL_MAX_IDLE = 20.0  # seconds before an unused session is replaced
+    TTS_POOL_WARMERS = 4
+    TTS_POOL_KEY_TTL = 300.0  # seconds before a voice/format warmed by a client stops being kept
+    TTS_POOL_MAX_BACKOFF = 60.0  # upper bound of the retry delay after failed pre-starts
+    
     # Redis settings
     REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
     REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
@@ -0,0 +1,78 @@
+"""
+测试共用夹具：替换DashScope流式合成器的假合成器，以及按测试配置创建TTS服务
+所有替换都通过monkeypatch完成，测试结束后自动还原
+"""
+
+import threading
+import time
+
+import pytest
+
+import backend.tts_pool as pool_module
+from config import Config
+
+class FakeSynthesizer:
+    """模拟流式合成：首次streaming_call建立连接，记录每次合成的文本，输出即文本的UTF-8字节，可设置耗时与失败"""
+
+    texts = []
+    starts = 0
+    delay = 0.0
+    connect_delay = 0.0
+    fail = False
+    fail_connect = False
+    lock = threading.Lock()
+
+    def __init__(self, model, voice, format=None, callback=None):
+        self.callback = callback
+        self.text = ''
+        self.started = False
+        self.closed = False
+
+    def streaming_call(self, text):
+        if not self.started:
+            time.sleep(FakeSynthesizer.connect_delay)
+            if FakeSynthesizer.fail_connect:
+                raise ConnectionError('handshake failed')
+            with FakeSynthesizer.lock:
+                FakeSynthesizer.starts += 1
+            self.started = True
+            self.callback.on_open()
+        self.text += text
+
+    def async_streaming_complete(self):
+        with FakeSynthesizer.lock:
+            FakeSynthesizer.texts.append(self.text)
+        time.sleep(FakeSynthesizer.delay)
+        if FakeSynthesizer.fail:
+            self.callback.on_error('remote failure')
+            return
+        self.callback.on_data(self.text.encode('utf-8'))
+        self.callback.on_complete()
+
+    def streaming_cancel(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+def tts_config(**settings):
+    """在默认配置上关闭整段缓存与预建会话池，再覆盖指定设置"""
+    settings = {'TTS_CACHE_ENABLED': False, 'TTS_POOL_ENABLED': False, **settings}
+    return type('TTSTestConfig', (Config,), settings)
+
+@pytest.fixture
+def fake_synthesizer(monkeypatch):
+    monkeypatch.setattr(pool_module, 'SpeechSynthesizer', FakeSynthesizer)
+    for name, value in (('texts', []), ('starts', 0), ('delay', 0.0), ('connect_delay', 0.0),
+                        ('fail', False), ('fail_connect', False)):
+        monkeypatch.setattr(FakeSynthesizer, name, value)
+    return FakeSynthesizer
+
+@pytest.fixture
+def make_tts_service(fake_synthesizer):
+    """返回按给定设置创建TTSService的函数"""
+    from backend.tts_service import TTSService
+
+    def make(**settings):
+        return TTSService(tts_config(**settings))
+    return make
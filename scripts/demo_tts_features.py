@@ -25,7 +25,8 @@ def test_tts_api():
     url = f"{BASE_URL}/tts"
     payload = {
         "text": test_text,
-        "voice": "longxiaochun_v2"
+        "voice": "longxiaochun_v2",
+        "priority": "batch"  # 演示脚本不与实时语音对话抢占合成资源
     }
     
     try:
@@ -107,7 +108,8 @@ def test_chat_with_tts():
                 print("\n🎵 正在为AI回复生成语音...")
                 tts_payload = {
                     "text": ai_response,
-                    "voice": "longxiaochun_v2"
+                    "voice": "longxiaochun_v2",
+                    "priority": "batch"
                 }
                 
                 tts_response = requests.post(f"{BASE_URL}/tts", json=tts_payload, timeout=30)
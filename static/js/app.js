@@ -14,6 +14,14 @@ let mediaStreamSource;
 let isVoiceChatActive = false;
 const audioQueue = [];
 let isPlaying = false;
+let ttsStream = null; // 当前正在接收的流式TTS
+// 语音对话请求原始PCM，省去解码，由Web Audio直接排程播放
+const TTS_FORMAT = { format: 'pcm', sample_rate: 24000 };
+let playbackContext = null;
+let playbackTime = 0;
+let pcmCarry = null;
+const pcmSources = new Set();
+let ackPlayback = null; // 正在播放的确认音
 
 const SAMPLE_RATE = 16000;
 const BUFFER_SIZE = 4096;
@@ -321,7 +329,8 @@ async function speakText(text) {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 text: text,
-                voice: 'longxiaochun_v2'
+                voice: 'longxiaochun_v2',
+                priority: 'interactive'
             })
         });
 
@@ -630,6 +639,11 @@ function initSocket() {
     socket.on('connect', () => {
         console.log('成功连接到Socket.IO服务器');
         showToast('实时连接已建立');
+        socket.emit('tts_config', TTS_FORMAT);
+    });
+
+    socket.on('tts_config', (data) => {
+        console.log(`TTS输出格式: ${data.format} ${data.sample_rate}Hz`);
     });
 
     socket.on('disconnect', () => {
@@ -668,6 +682,47 @@ function initSocket() {
         playFromQueue();
     });
 
+    socket.on('tts_ack', (data) => {
+        stopAck();
+        const bytes = base64ToBytes(data.audio);
+        if (data.format === 'pcm') {
+            ackPlayback = playPCMClip(bytes, data.sample_rate);
+            return;
+        }
+        const audioUrl = URL.createObjectURL(new Blob([bytes], { type: data.mime_type }));
+        const audio = new Audio(audioUrl);
+        audio.onended = () => URL.revokeObjectURL(audioUrl);
+        audio.play().catch(err => console.warn('确认音播放失败:', err));
+        ackPlayback = {
+            stop: () => {
+                audio.pause();
+                URL.revokeObjectURL(audioUrl);
+            }
+        };
+    });
+
+    socket.on('tts_chunk', (data) => {
+        // 真实回答音频到达，立即停止确认音
+        stopAck();
+        if (data.format === 'pcm') {
+            playPCMChunk(base64ToBytes(data.audio), data.sample_rate);
+            return;
+        }
+        if (!ttsStream) {
+            ttsStream = startTTSStream(data.mime_type || 'audio/mpeg');
+        }
+        appendTTSStream(ttsStream, base64ToBytes(data.audio));
+    });
+
+    socket.on('tts_end', (data) => {
+        console.log(`流式TTS结束: 首包 ${data.first_byte_ms}ms, 语音结束到首段回答 ${data.turn_first_audio_ms}ms, 总计 ${data.total_ms}ms, ${data.size} bytes`);
+        if (ttsStream) {
+            endTTSStream(ttsStream);
+            ttsStream = null;
+        }
+        pcmCarry = null;
+    });
+
     socket.on('llm_response', (data) => {
         console.log('LLM回复:', data.text);
         renderMessage('assistant', data.text, new Date().toLocaleTimeString());
@@ -831,6 +886,116 @@ function playFromQueue() {
     };
 }
 
+// 流式TTS：支持MediaSource时边收边播，否则收齐后整段播放
+function startTTSStream(mimeType) {
+    const stream = { mimeType, chunks: [], pending: [], ended: false, mediaSource: null, sourceBuffer: null };
+    if (window.MediaSource && MediaSource.isTypeSupported(mimeType)) {
+        stream.mediaSource = new MediaSource();
+        const audioUrl = URL.createObjectURL(stream.mediaSource);
+        stream.mediaSource.addEventListener('sourceopen', () => {
+            stream.sourceBuffer = stream.mediaSource.addSourceBuffer(mimeType);
+            stream.sourceBuffer.addEventListener('updateend', () => flushTTSStream(stream));
+            flushTTSStream(stream);
+        });
+        // 排在已有音频之后播放
+        audioQueue.push(audioUrl);
+        playFromQueue();
+    }
+    return stream;
+}
+
+function appendTTSStream(stream, bytes) {
+    if (stream.mediaSource) {
+        stream.pending.push(bytes);
+        flushTTSStream(stream);
+    } else {
+        stream.chunks.push(bytes);
+    }
+}
+
+function flushTTSStream(stream) {
+    if (!stream.sourceBuffer || stream.sourceBuffer.updating) {
+        return;
+    }
+    if (stream.pending.length > 0) {
+        stream.sourceBuffer.appendBuffer(stream.pending.shift());
+    } else if (stream.ended && stream.mediaSource.readyState === 'open') {
+        stream.mediaSource.endOfStream();
+    }
+}
+
+function endTTSStream(stream) {
+    stream.ended = true;
+    if (stream.mediaSource) {
+        flushTTSStream(stream);
+    } else if (stream.chunks.length > 0) {
+        const audioBlob = new Blob(stream.chunks, { type: stream.mimeType });
+        audioQueue.push(URL.createObjectURL(audioBlob));
+        playFromQueue();
+    }
+}
+
+// 16位单声道PCM分片按时间顺序无缝排程
+function playPCMChunk(bytes, sampleRate) {
+    if (!playbackContext) {
+        playbackContext = new (window.AudioContext || window.webkitAudioContext)();
+    }
+    // 分片可能切在采样中间，拼上上一片剩下的字节
+    if (pcmCarry) {
+        const merged = new Uint8Array(pcmCarry.length + bytes.length);
+        merged.set(pcmCarry);
+        merged.set(bytes, pcmCarry.length);
+        bytes = merged;
+        pcmCarry = null;
+    }
+    const usable = bytes.length - (bytes.length % 2);
+    if (usable < bytes.length) {
+        pcmCarry = bytes.slice(usable);
+    }
+    if (usable === 0) {
+        return;
+    }
+
+    const buffer = pcmToAudioBuffer(bytes, usable, sampleRate);
+    const source = playbackContext.createBufferSource();
+    source.buffer = buffer;
+    source.connect(playbackContext.destination);
+    playbackTime = Math.max(playbackTime, playbackContext.currentTime + 0.05);
+    source.start(playbackTime);
+    playbackTime += buffer.duration;
+    pcmSources.add(source);
+    source.onended = () => pcmSources.delete(source);
+}
+
+function pcmToAudioBuffer(bytes, usable, sampleRate) {
+    const samples = new Int16Array(bytes.buffer, bytes.byteOffset, usable / 2);
+    const buffer = playbackContext.createBuffer(1, samples.length, sampleRate);
+    const channel = buffer.getChannelData(0);
+    for (let i = 0; i < samples.length; i++) {
+        channel[i] = samples[i] / 32768;
+    }
+    return buffer;
+}
+
+// 立即播放一段完整PCM（确认音），不占用回答音频的排程
+function playPCMClip(bytes, sampleRate) {
+    if (!playbackContext) {
+        playbackContext = new (window.AudioContext || window.webkitAudioContext)();
+    }
+    const source = playbackContext.createBufferSource();
+    source.buffer = pcmToAudioBuffer(bytes, bytes.length - (bytes.length % 2), sampleRate);
+    source.connect(playbackContext.destination);
+    source.start();
+    return { stop: () => source.stop() };
+}
+
+function stopAck() {
+    if (ackPlayback) {
+        ackPlayback.stop();
+        ackPlayback = null;
+    }
+}
+
 function stopAllAudio() {
     const audios = document.querySelectorAll('audio');
     audios.forEach(audio => {
@@ -838,6 +1003,12 @@ function stopAllAudio() {
         audio.currentTime = 0;
     });
     audioQueue.length = 0; // 清空队列
+    stopAck();
+    ttsStream = null;
+    pcmSources.forEach(source => source.stop());
+    pcmSources.clear();
+    pcmCarry = null;
+    playbackTime = 0;
     isPlaying = false;
 }
 
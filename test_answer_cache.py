@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+测试语义答案缓存：相似问题命中、知识库版本变化后失效、容量有界，仅BM25检索时不计算问题向量
+运行本文件可输出不同缓存规模下的查找耗时
+"""
+
+import time
+
+import numpy as np
+
+from backend.answer_cache import SemanticAnswerCache
+from backend.rag_system import RAGSystem
+from config import Config
+
+class SmallConfig(Config):
+    ANSWER_CACHE_SIZE = 2
+    ANSWER_CACHE_THRESHOLD = 0.95
+    ANSWER_CACHE_TTL = 3600
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+def test_similar_question_hits_and_distinct_question_misses():
+    cache = SemanticAnswerCache(SmallConfig)
+    cache.store(unit(1, 0, 0), ['doc_0', 'doc_1'], '营业时间为9点到18点。', kb_version=0)
+
+    hit = cache.lookup(unit(1, 0.1, 0), kb_version=0)
+    assert hit['answer'] == '营业时间为9点到18点。'
+    assert hit['chunk_ids'] == ['doc_0', 'doc_1']
+    assert hit['similarity'] >= SmallConfig.ANSWER_CACHE_THRESHOLD
+
+    assert cache.lookup(unit(0, 1, 0), kb_version=0) is None
+    stats = cache.get_stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1
+
+def test_kb_version_change_invalidates_entries():
+    cache = SemanticAnswerCache(SmallConfig)
+    cache.store(unit(1, 0, 0), ['doc_0'], '旧答案', kb_version=0)
+    assert cache.lookup(unit(1, 0, 0), kb_version=1) is None
+    assert cache.get_stats()['entries'] == 0
+    assert cache.get_stats()['invalidations'] == 1
+
+def test_least_recently_used_entry_is_replaced():
+    cache = SemanticAnswerCache(SmallConfig)
+    cache.store(unit(1, 0, 0), [], '答案一', kb_version=0)
+    cache.store(unit(0, 1, 0), [], '答案二', kb_version=0)
+    cache.lookup(unit(1, 0, 0), kb_version=0)
+    cache.store(unit(0, 0, 1), [], '答案三', kb_version=0)
+    assert cache.lookup(unit(1, 0, 0), kb_version=0)['answer'] == '答案一'
+    assert cache.lookup(unit(0, 1, 0), kb_version=0) is None
+    assert cache.lookup(unit(0, 0, 1), kb_version=0)['answer'] == '答案三'
+
+class FakeKnowledgeBase:
+    """记录问题向量计算次数的假知识库"""
+
+    version = 0
+    documents_metadata = {'doc': {}}
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_query(self, query):
+        self.embedded.append(query)
+        return unit(1, 0, 0)
+
+def test_bm25_mode_skips_query_embedding():
+    for mode, embedded in (('bm25', []), ('hybrid', ['营业时间是几点？'])):
+        kb = FakeKnowledgeBase()
+        rag = RAGSystem(type('ModeConfig', (Config,), {'RETRIEVAL_MODE': mode}), kb_manager=kb)
+        assert rag._lookup_cached_answer('营业时间是几点？', 'session', 'chat')[0] is None
+        assert kb.embedded == embedded
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    for size in (100, 1000, 10000):
+        class BenchConfig(Config):
+            ANSWER_CACHE_SIZE = size
+        cache = SemanticAnswerCache(BenchConfig)
+        vectors = rng.standard_normal((size, 1536)).astype(np.float32)
+        for vector in vectors:
+            cache.store(vector, [], '答案', kb_version=0)
+        start = time.perf_counter()
+        for vector in vectors[:200]:
+            cache.lookup(vector, kb_version=0)
+        elapsed = (time.perf_counter() - start) / 200
+        print(f"{size:6d} 条缓存: 单次查找 {elapsed * 1000:.3f} ms, 命中率 {cache.get_stats()['hit_rate']:.0%}")
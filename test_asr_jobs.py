@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+测试批量识别任务：任务从排队、识别中到完成或失败的状态变化，版本号轮询，以及SSE推送的等待路径
+运行本文件可输出不同并发数下的批量识别耗时
+"""
+
+import json
+import threading
+import time
+from http import HTTPStatus
+from types import SimpleNamespace
+
+import pytest
+
+import backend.asr_service as asr_module
+from backend.asr_jobs import TranscriptionJobManager
+from backend.asr_service import ASRService
+from config import Config
+from test_asr_upload import make_wav
+
+class FakeASRService:
+    """模拟识别服务：放行前阻塞在gate上，文件名含fail的识别失败"""
+
+    def __init__(self, delay=0.0):
+        self.gate = threading.Event()
+        self.delay = delay
+
+    def transcribe(self, path, raise_on_error=False):
+        self.gate.wait(timeout=5)
+        time.sleep(self.delay)
+        if 'fail' in path:
+            raise RuntimeError('无法识别')
+        return f'识别结果: {path}'
+
+    def transcribe_from_url(self, url):
+        return self.transcribe(url)
+
+class OneWorkerConfig(Config):
+    ASR_JOB_CONCURRENCY = 1
+    ASR_JOB_RETENTION = 2
+
+def wait_until_finished(manager, job_id, timeout=2.0):
+    job = manager.get_job(job_id)
+    deadline = time.monotonic() + timeout
+    while job['status'] not in TranscriptionJobManager.FINISHED_STATES and time.monotonic() < deadline:
+        job = manager.wait_for_update(job_id, job['version'], timeout=0.1)
+    return job
+
+@pytest.fixture
+def asr():
+    service = FakeASRService()
+    yield service
+    service.gate.set()
+
+def test_job_moves_from_queued_to_completed(asr):
+    manager = TranscriptionJobManager(OneWorkerConfig, asr)
+    job_id = manager.submit([{'name': 'a.wav', 'path': 'a.wav'},
+                             {'name': 'b', 'url': 'https://example.com/b.mp3'}])
+    job = manager.wait_for_update(job_id, 0, timeout=1.0)
+    assert job['status'] == 'running'
+    assert [f['status'] for f in job['files']] == ['running', 'queued']
+    assert job['files'][1]['source'] == 'url'
+
+    asr.gate.set()
+    job = wait_until_finished(manager, job_id)
+    assert job['status'] == 'completed' and job['completed'] == 2 and job['failed'] == 0
+    assert job['files'][1]['text'] == '识别结果: https://example.com/b.mp3'
+    assert job['finished_at'] is not None
+    manager.shutdown()
+
+def test_failed_files_are_reported(asr):
+    asr.gate.set()
+    manager = TranscriptionJobManager(OneWorkerConfig, asr)
+    job = wait_until_finished(manager, manager.submit([{'name': 'ok', 'path': 'ok.wav'},
+                                                       {'name': 'bad', 'path': 'fail.wav'}]))
+    assert job['status'] == 'completed' and job['completed'] == 1 and job['failed'] == 1
+    assert job['files'][1]['error'] == '无法识别'
+
+    job = wait_until_finished(manager, manager.submit([{'name': 'bad', 'path': 'fail.wav'}]))
+    assert job['status'] == 'failed'
+    manager.shutdown()
+
+class FailingRecognition:
+    """模拟识别接口返回错误状态"""
+
+    def __init__(self, model, format, sample_rate, language_hints=None, callback=None):
+        pass
+
+    def call(self, path):
+        return SimpleNamespace(status_code=HTTPStatus.INTERNAL_SERVER_ERROR, message='quota exceeded')
+
+def test_recognizer_failure_marks_file_failed(monkeypatch, tmp_path):
+    monkeypatch.setattr(asr_module, 'Recognition', FailingRecognition)
+    path = tmp_path / 'question.wav'
+    path.write_bytes(make_wav())
+    manager = TranscriptionJobManager(OneWorkerConfig, ASRService(Config))
+    job = wait_until_finished(manager, manager.submit([{'name': 'question.wav', 'path': str(path)}]))
+    assert job['status'] == 'failed' and job['completed'] == 0 and job['failed'] == 1
+    assert job['files'][0]['text'] is None
+    assert 'quota exceeded' in job['files'][0]['error']
+    manager.shutdown()
+
+def test_versioned_polling(asr):
+    manager = TranscriptionJobManager(OneWorkerConfig, asr)
+    job_id = manager.submit([{'name': 'a.wav', 'path': 'a.wav'}])
+    job = manager.wait_for_update(job_id, 0, timeout=1.0)
+    version = job['version']
+
+    # 没有新变化时等待到超时，返回同一版本
+    start = time.perf_counter()
+    assert manager.wait_for_update(job_id, version, timeout=0.1)['version'] == version
+    assert time.perf_counter() - start >= 0.1
+
+    asr.gate.set()
+    job = wait_until_finished(manager, job_id)
+    assert job['version'] > version
+    assert manager.get_job(job_id) == job
+    assert manager.get_job('missing') is None
+    assert manager.wait_for_update('missing', 0, timeout=0.1) is None
+    manager.shutdown()
+
+def test_finished_jobs_beyond_retention_are_evicted(asr):
+    asr.gate.set()
+    manager = TranscriptionJobManager(OneWorkerConfig, asr)
+    job_ids = [manager.submit([{'name': 'a.wav', 'path': f'{i}.wav'}]) for i in range(2)]
+    for job_id in job_ids:
+        wait_until_finished(manager, job_id)
+    manager.submit([{'name': 'a.wav', 'path': 'new.wav'}])
+    assert manager.get_job(job_ids[0]) is None
+    assert manager.get_job(job_ids[1]) is not None
+    manager.shutdown()
+
+def test_events_endpoint_streams_until_finished(asr, monkeypatch):
+    pytest.importorskip('chromadb')
+    pytest.importorskip('PyPDF2')
+    import app as app_module
+    manager = TranscriptionJobManager(OneWorkerConfig, asr)
+    monkeypatch.setattr(app_module, 'asr_job_manager', manager)
+    client = app_module.app.test_client()
+
+    assert client.get('/asr/jobs/missing/events').status_code == 404
+    job_id = manager.submit([{'name': 'a.wav', 'path': 'a.wav'}])
+    threading.Timer(0.2, asr.gate.set).start()
+    response = client.get(f'/asr/jobs/{job_id}/events')
+    events = [json.loads(line[len('data: '):]) for line in response.get_data(as_text=True).splitlines()
+              if line.startswith('data: ')]
+    versions = [event['version'] for event in events]
+    assert versions == sorted(set(versions))
+    assert events[-1]['status'] == 'completed'
+    manager.shutdown()
+
+if __name__ == '__main__':
+    files = [{'name': f'{i}.wav', 'path': f'{i}.wav'} for i in range(20)]
+    for concurrency in (1, 4, 8):
+        service = FakeASRService(delay=0.1)
+        service.gate.set()
+        manager = TranscriptionJobManager(type('BenchConfig', (Config,), {'ASR_JOB_CONCURRENCY': concurrency}), service)
+        start = time.perf_counter()
+        wait_until_finished(manager, manager.submit(files), timeout=30)
+        print(f"并发 {concurrency}: {len(files)} 个文件耗时 {time.perf_counter() - start:.2f}s")
+        manager.shutdown()
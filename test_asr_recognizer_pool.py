@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+测试语音会话的持久识别连接：同一会话复用连接，出错或空闲超时后重连，会话结束时关闭连接
+运行本文件可对比复用连接与每句新建连接的识别耗时
+"""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import backend.asr_service as asr_module
+from backend.asr_service import ASRService, RecognizerPool
+from config import Config
+
+class FakeStreamingRecognition:
+    """模拟流式识别连接：收到语音帧时回调中间结果，语音后的首个静音帧回调整句结果"""
+
+    instances = []
+    reply = '我想查询退票规则'
+    fail = False
+    connect_delay = 0.0
+
+    def __init__(self, model, format, sample_rate, language_hints=None, callback=None):
+        self.callback = callback
+        self.frames = 0
+        self.heard = False
+        self.stopped = False
+        FakeStreamingRecognition.instances.append(self)
+
+    def start(self):
+        time.sleep(FakeStreamingRecognition.connect_delay)
+
+    def send_audio_frame(self, frame):
+        self.frames += 1
+        if FakeStreamingRecognition.fail:
+            if self.frames == 1:
+                self.callback.on_error(SimpleNamespace(message='connection reset'))
+            return
+        if any(frame):
+            self.heard = True
+            self.callback.on_event(self._result({'text': self.reply[:2], 'end_time': None}))
+        elif self.heard:
+            self.heard = False
+            self.callback.on_event(self._result({'text': self.reply, 'end_time': 1000}))
+
+    def stop(self):
+        self.stopped = True
+
+    @staticmethod
+    def _result(sentence):
+        return SimpleNamespace(get_sentence=lambda: sentence)
+
+class ShortIdleConfig(Config):
+    ASR_PERSISTENT_RECOGNIZER = True
+    ASR_RECOGNIZER_IDLE_TIMEOUT = 0.05
+
+SPEECH = b'\x10\x00' * 16000  # 1秒非静音PCM
+
+@pytest.fixture
+def fake_recognition(monkeypatch):
+    monkeypatch.setattr(asr_module, 'Recognition', FakeStreamingRecognition)
+    monkeypatch.setattr(FakeStreamingRecognition, 'instances', [])
+    monkeypatch.setattr(FakeStreamingRecognition, 'fail', False)
+    return FakeStreamingRecognition
+
+def test_session_reuses_one_connection(fake_recognition):
+    pool = RecognizerPool(Config)
+    recognizer = pool.get('voice-1')
+    partials = []
+    assert recognizer.transcribe_pcm(SPEECH, partials.append) == fake_recognition.reply
+    assert pool.get('voice-1') is recognizer
+    assert recognizer.transcribe_pcm(SPEECH) == fake_recognition.reply
+    assert len(fake_recognition.instances) == 1
+    assert partials and partials[-1] == fake_recognition.reply
+
+def test_reconnects_after_error_and_idle_timeout(fake_recognition):
+    recognizer = RecognizerPool(ShortIdleConfig).get('voice-1')
+    fake_recognition.fail = True
+    with pytest.raises(Exception):
+        recognizer.transcribe_pcm(SPEECH)
+
+    fake_recognition.fail = False
+    assert recognizer.transcribe_pcm(SPEECH) == fake_recognition.reply
+    assert len(fake_recognition.instances) == 2 and fake_recognition.instances[0].stopped
+
+    time.sleep(0.1)
+    assert recognizer.is_idle()
+    assert recognizer.transcribe_pcm(SPEECH) == fake_recognition.reply
+    assert len(fake_recognition.instances) == 3 and fake_recognition.instances[1].stopped
+
+def test_release_session_closes_connection(fake_recognition):
+    service = ASRService(ShortIdleConfig)
+    recognizer = service.recognizer_pool.get('voice-1')
+    recognizer.transcribe_pcm(SPEECH)
+    service.release_session('voice-1')
+    assert fake_recognition.instances[0].stopped
+    assert service.recognizer_pool.get('voice-1') is not recognizer
+
+    # 其他会话取用连接时，空闲超时的会话连接被关闭
+    service.recognizer_pool.get('voice-1').transcribe_pcm(SPEECH)
+    time.sleep(0.1)
+    service.recognizer_pool.get('voice-2')
+    assert fake_recognition.instances[1].stopped
+
+if __name__ == '__main__':
+    asr_module.Recognition = FakeStreamingRecognition
+    FakeStreamingRecognition.connect_delay = 0.3
+    turns = 5
+
+    pool = RecognizerPool(Config)
+    start = time.perf_counter()
+    for _ in range(turns):
+        pool.get('voice-1').transcribe_pcm(SPEECH)
+    reused = (time.perf_counter() - start) / turns
+
+    start = time.perf_counter()
+    for turn in range(turns):
+        pool.get(f'voice-{turn}').transcribe_pcm(SPEECH)
+        pool.release(f'voice-{turn}')
+    fresh = (time.perf_counter() - start) / turns
+    print(f"复用连接: {reused * 1000:.0f} ms/句, 每句新建连接: {fresh * 1000:.0f} ms/句 (建连 {FakeStreamingRecognition.connect_delay * 1000:.0f} ms)")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+测试/asr上传识别：multipart上传边接收边解码，识别结果与静音裁剪统计随响应返回
+运行本文件可输出流式上传识别的耗时
+"""
+
+import io
+import time
+import wave
+from http import HTTPStatus
+
+import numpy as np
+import pytest
+
+import backend.asr_service as asr_module
+from backend.asr_service import ASRService
+from config import Config
+
+class FakeRecognition:
+    """模拟文件识别：记录收到的音频时长，返回固定文本"""
+
+    durations = []
+
+    def __init__(self, model, format, sample_rate, language_hints=None, callback=None):
+        pass
+
+    def call(self, path):
+        with wave.open(path, 'rb') as wav_file:
+            FakeRecognition.durations.append(wav_file.getnframes() / wav_file.getframerate())
+        return FakeResult()
+
+class FakeResult:
+    status_code = HTTPStatus.OK
+
+    def get_sentence(self):
+        return {'text': '退票手续费是多少'}
+
+def make_wav(silence_seconds=1.0, speech_seconds=1.0, sample_rate=16000):
+    """前后带静音的类语音信号（谐波叠加并做幅度调制）"""
+    t = np.arange(int(sample_rate * speech_seconds)) / sample_rate
+    voiced = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate([150, 300, 450, 600, 900]))
+    voiced *= 0.6 + 0.4 * np.sin(2 * np.pi * 4 * t)
+    silence = np.zeros(int(sample_rate * silence_seconds))
+    samples = np.concatenate([silence, voiced / np.max(np.abs(voiced)) * 3000, silence]).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+@pytest.fixture
+def asr_service(monkeypatch):
+    monkeypatch.setattr(asr_module, 'Recognition', FakeRecognition)
+    FakeRecognition.durations = []
+    return ASRService(Config)
+
+def chunked(data, size=4096):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+def test_transcribe_stream_reads_chunks(asr_service):
+    text = asr_service.transcribe_stream(chunked(make_wav()), 'question.wav')
+    assert text == '退票手续费是多少'
+    assert len(FakeRecognition.durations) == 1
+
+def test_asr_endpoint_accepts_multipart_upload(asr_service, monkeypatch):
+    pytest.importorskip('chromadb')
+    pytest.importorskip('PyPDF2')
+    import app as app_module
+    monkeypatch.setattr(app_module, 'asr_service', asr_service)
+    client = app_module.app.test_client()
+
+    response = client.post('/asr', data={'audio': (io.BytesIO(make_wav()), 'question.wav')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['success'] and body['text'] == '退票手续费是多少'
+
+    response = client.post('/asr', data={'audio': (io.BytesIO(b'abc'), 'notes.txt')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
+
+if __name__ == '__main__':
+    asr_module.Recognition = FakeRecognition
+    service = ASRService(Config)
+    audio = make_wav(silence_seconds=2.0, speech_seconds=10.0)
+    for chunk_size in (4096, 65536):
+        start = time.perf_counter()
+        service.transcribe_stream(chunked(audio, chunk_size), 'long.wav')
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"上传 {len(audio) // 1024} KB（分块 {chunk_size} 字节）: 识别耗时 {elapsed:.1f} ms, FFmpeg: {service.ffmpeg_available}")
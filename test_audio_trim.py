@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+测试识别前的静音裁剪与响度归一化：逐帧VAD判定、首尾静音裁剪、增益上限与防削波
+运行本文件可输出不同静音时长下节省的上传字节
+"""
+
+import time
+
+import numpy as np
+
+from backend.audio_utils import trim_and_normalize
+from backend.vad_processor import VADProcessor
+from config import Config
+from test_asr_upload import asr_service, chunked, make_wav
+
+SAMPLE_RATE = 16000
+FRAME_BYTES = 640  # 20ms
+
+def tone(seconds, amplitude):
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    return (np.sin(2 * np.pi * 220 * t) * amplitude).astype(np.int16)
+
+def pcm_with_flags(lead_frames, speech_frames, tail_frames, amplitude=1000):
+    """首尾静音+中间纯音，返回PCM与对应的逐帧判定"""
+    frame_samples = FRAME_BYTES // 2
+    samples = np.concatenate([
+        np.zeros(lead_frames * frame_samples, dtype=np.int16),
+        tone(speech_frames * frame_samples / SAMPLE_RATE, amplitude),
+        np.zeros(tail_frames * frame_samples, dtype=np.int16)
+    ])
+    flags = [False] * lead_frames + [True] * speech_frames + [False] * tail_frames
+    return samples.tobytes(), flags
+
+def test_classifier_marks_speech_frames_only():
+    vad = VADProcessor(sample_rate=SAMPLE_RATE, vad_mode=3, frame_duration_ms=20)
+    pcm = make_wav(silence_seconds=0.5, speech_seconds=1.0)[44:]
+    flags = vad.classify_frames(pcm + b'\x00' * 100)
+    assert len(flags) == len(pcm) // vad.frame_bytes
+    assert not flags[:25].any()
+    assert flags[25:75].mean() > 0.9
+
+def test_trim_keeps_padding_around_speech():
+    pcm, flags = pcm_with_flags(50, 50, 50)
+    trimmed, stats = trim_and_normalize(pcm, flags, FRAME_BYTES, padding_ms=200)
+    # 200ms padding = 10 frames on each side
+    assert len(trimmed) == 70 * FRAME_BYTES
+    assert stats['bytes_saved'] == len(pcm) - len(trimmed)
+    assert stats['seconds_saved'] == 1.6
+
+def test_gain_reaches_target_within_limits():
+    pcm, flags = pcm_with_flags(0, 50, 0, amplitude=300)
+    trimmed, stats = trim_and_normalize(pcm, flags, FRAME_BYTES, target_dbfs=-20.0, max_gain_db=40.0)
+    rms = np.sqrt(np.mean(np.square(np.frombuffer(trimmed, dtype=np.int16).astype(np.float64))))
+    assert abs(20 * np.log10(rms / 32768.0) + 20.0) < 0.1
+
+    _, capped = trim_and_normalize(pcm, flags, FRAME_BYTES, target_dbfs=-20.0, max_gain_db=6.0)
+    assert capped['gain_db'] == 6.0
+
+    loud, loud_flags = pcm_with_flags(0, 50, 0, amplitude=32000)
+    output, _ = trim_and_normalize(loud, loud_flags, FRAME_BYTES, target_dbfs=0.0)
+    assert np.max(np.abs(np.frombuffer(output, dtype=np.int16))) < 32767
+
+def test_no_speech_leaves_audio_untouched():
+    pcm, flags = pcm_with_flags(50, 0, 0)
+    trimmed, stats = trim_and_normalize(pcm, flags, FRAME_BYTES)
+    assert trimmed is pcm and stats['bytes_saved'] == 0
+
+def test_upload_trim_statistics_are_reported(asr_service):
+    stats = {}
+    asr_service.transcribe_stream(chunked(make_wav(silence_seconds=1.0)), 'question.wav', stats=stats)
+    assert stats['seconds_saved'] > 1.0
+    assert stats['trimmed_bytes'] < stats['original_bytes']
+
+if __name__ == '__main__':
+    vad = VADProcessor(sample_rate=SAMPLE_RATE, vad_mode=3, frame_duration_ms=20)
+    for silence in (0.5, 1.0, 2.0):
+        pcm = make_wav(silence_seconds=silence, speech_seconds=3.0)[44:]
+        start = time.perf_counter()
+        flags = vad.classify_frames(pcm)
+        trimmed, stats = trim_and_normalize(pcm, flags, vad.frame_bytes, padding_ms=Config.ASR_TRIM_PADDING_MS)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"首尾静音各 {silence}s: 上传 {len(pcm)} -> {len(trimmed)} 字节 "
+              f"(节省 {stats['seconds_saved']}s), 增益 {stats['gain_db']}dB, 处理耗时 {elapsed:.1f} ms")
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+测试本地BM25索引：增量增删、持久化与并发保存、倒数排名融合
+运行本文件可在合成语料上输出检索耗时与recall@k
+"""
+
+import os
+import random
+import tempfile
+import threading
+import time
+
+from backend.bm25_index import BM25Index, reciprocal_rank_fusion
+
+PRODUCTS = ['路由器', '交换机', '打印机', '投影仪', '扫描仪', '显示器', '笔记本', '平板', '耳机', '音箱',
+            '摄像头', '充电器', '移动电源', '键盘', '鼠标', '硬盘', '内存条', '服务器', '空调', '冰箱']
+ATTRIBUTES = ['保修期', '退货政策', '售价', '重量', '功耗', '尺寸', '颜色', '发货时间', '安装方式', '售后电话',
+              '材质', '产地', '认证标准', '续航时间', '兼容系统']
+FILLER = ['本产品通过了严格的质量检测。', '如有疑问请联系在线客服。', '具体以实际收到的商品为准。',
+          '我们提供全国联保服务。', '购买前请仔细阅读说明书。']
+
+def make_corpus(size, seed=0):
+    """生成合成语料：每个片段描述一个(型号, 属性)，返回片段列表与对应查询"""
+    rng = random.Random(seed)
+    chunks, queries = [], []
+    for i in range(size):
+        product = f"{rng.choice(PRODUCTS)}{chr(65 + i % 26)}{i}"
+        attribute = rng.choice(ATTRIBUTES)
+        filler = ''.join(rng.sample(FILLER, 2))
+        chunks.append(f"{product}的{attribute}说明：该型号的{attribute}为标准配置{rng.randint(1, 99)}。{filler}")
+        queries.append((f"{product}的{attribute}是多少？", f"chunk_{i}"))
+    return chunks, queries
+
+def make_index(path, chunks, per_document=10):
+    index = BM25Index(path)
+    for start in range(0, len(chunks), per_document):
+        ids = [f"chunk_{i}" for i in range(start, min(start + per_document, len(chunks)))]
+        index.add_chunks(f"doc_{start // per_document}", ids, chunks[start:start + per_document], save=False)
+    index.save()
+    return index
+
+def test_relevant_chunk_ranks_first():
+    chunks, queries = make_corpus(200)
+    with tempfile.TemporaryDirectory() as folder:
+        index = make_index(os.path.join(folder, 'bm25.json'), chunks)
+        for query, relevant in queries[:20]:
+            assert index.search(query, k=1)[0]['id'] == relevant
+
+def test_remove_document_and_persistence():
+    chunks, queries = make_corpus(30)
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'bm25.json')
+        index = make_index(path, chunks)
+        assert index.remove_document('doc_0') == 10
+        query, relevant = queries[0]
+        assert all(result['id'] != relevant for result in index.search(query, k=30))
+
+        reloaded = BM25Index(path)
+        assert reloaded.get_stats() == index.get_stats()
+        assert reloaded.search(queries[15][0], k=1)[0]['id'] == queries[15][1]
+
+def test_reload_picks_up_changes_saved_by_another_index():
+    chunks, queries = make_corpus(30)
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'bm25.json')
+        writer = make_index(path, chunks[:20])
+        reader = BM25Index(path)
+        writer.add_chunks('doc_2', [f"chunk_{i}" for i in range(20, 30)], chunks[20:])
+        writer.remove_document('doc_0')
+        assert all(result['id'] != 'chunk_25' for result in reader.search(queries[25][0], k=30))
+
+        reader.reload()
+        assert reader.get_stats() == writer.get_stats()
+        assert reader.search(queries[25][0], k=1)[0]['id'] == 'chunk_25'
+        assert all(result['id'] != queries[0][1] for result in reader.search(queries[0][0], k=30))
+
+def test_concurrent_saves_publish_a_complete_index():
+    chunks, _ = make_corpus(200)
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'bm25.json')
+        # 每个索引实例代表一个worker进程，各自持有自己的锁
+        writers = [make_index(path, chunks[:100 + 25 * i]) for i in range(4)]
+        loaded = []
+
+        def save_and_load(index):
+            for _ in range(10):
+                index.save()
+                loaded.append(len(BM25Index(path)))
+        threads = [threading.Thread(target=save_and_load, args=(index,)) for index in writers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert set(loaded) <= {100, 125, 150, 175}
+        assert os.listdir(folder) == ['bm25.json']
+
+def test_reciprocal_rank_fusion_prefers_agreement():
+    vector = [{'id': 'a', 'similarity_score': 0.9}, {'id': 'b', 'similarity_score': 0.8}, {'id': 'c'}]
+    lexical = [{'id': 'b', 'bm25_score': 7.0}, {'id': 'd', 'bm25_score': 5.0}, {'id': 'a', 'bm25_score': 1.0}]
+    fused = reciprocal_rank_fusion([vector, lexical], k=3)
+    assert [entry['id'] for entry in fused] == ['b', 'a', 'd']
+    assert fused[0]['similarity_score'] == 0.8 and fused[0]['bm25_score'] == 7.0
+    assert [entry['rank'] for entry in fused] == [1, 2, 3]
+
+if __name__ == '__main__':
+    for size in (1000, 10000, 50000):
+        chunks, queries = make_corpus(size)
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'bm25.json')
+            start = time.perf_counter()
+            index = make_index(path, chunks)
+            build = time.perf_counter() - start
+            start = time.perf_counter()
+            BM25Index(path)
+            load = time.perf_counter() - start
+
+            sample = random.Random(1).sample(queries, 300)
+            latencies, hits = [], {1: 0, 3: 0, 10: 0}
+            for query, relevant in sample:
+                start = time.perf_counter()
+                ids = [result['id'] for result in index.search(query, k=10)]
+                latencies.append(time.perf_counter() - start)
+                for k in hits:
+                    hits[k] += relevant in ids[:k]
+            latencies.sort()
+            recall = ', '.join(f"recall@{k} {hits[k] / len(sample):.3f}" for k in hits)
+            print(f"{size:6d} 片段: 建索引 {build:.1f}s, 加载 {load:.2f}s, "
+                  f"检索 p50 {latencies[len(latencies) // 2] * 1000:.2f}ms p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f}ms, {recall}")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+测试对话事件流：事件编号递增、按Last-Event-ID续传不重复调用LLM、重放缓冲区有界
+运行本文件可模拟断线重连，输出续传延迟
+"""
+
+import json
+import time
+
+from backend.chat_streams import ChatStreamManager
+from config import Config
+
+class SmallConfig(Config):
+    CHAT_STREAM_REPLAY_EVENTS = 8
+    CHAT_STREAM_RETENTION = 60
+    CHAT_STREAM_MAX_STREAMS = 10
+    CHAT_STREAM_WORKERS = 4
+
+class FakeChat:
+    """逐段产出回答的假LLM，记录调用次数"""
+
+    def __init__(self, chunks, interval=0.0, fail=False):
+        self.chunks = chunks
+        self.interval = interval
+        self.fail = fail
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        for chunk in self.chunks:
+            time.sleep(self.interval)
+            yield {'content': chunk}
+        if self.fail:
+            raise RuntimeError('connection reset')
+
+def follow(manager, stream_id, last_event_id=0, timeout=2.0):
+    """读取事件直到流结束，返回 (事件列表, 是否丢失)"""
+    received = []
+    while True:
+        events, finished, missed = manager.wait_for_events(stream_id, last_event_id, timeout)
+        if missed:
+            return received, True
+        received.extend(events)
+        if events:
+            last_event_id = events[-1][0]
+        if finished:
+            return received, False
+
+def test_events_are_numbered_and_end_with_finished():
+    manager = ChatStreamManager(SmallConfig)
+    chat = FakeChat(['你', '好'])
+    stream_id = manager.start(chat)
+    events, missed = follow(manager, stream_id)
+    assert not missed
+    assert [event_id for event_id, _, _ in events] == [1, 2, 3, 4]
+    assert events[0][1] == 'stream' and json.loads(events[0][2]) == {'stream_id': stream_id}
+    assert [json.loads(data) for _, _, data in events[1:]] == [{'content': '你'}, {'content': '好'}, {'finished': True}]
+
+def test_resume_continues_without_new_llm_call():
+    manager = ChatStreamManager(SmallConfig)
+    chat = FakeChat(['一', '二', '三'], interval=0.01)
+    stream_id = manager.start(chat)
+    first, _ = manager.wait_for_events(stream_id, 0, timeout=1.0)[:2]
+    last_seen = first[-1][0]
+
+    events, missed = follow(manager, stream_id, last_event_id=last_seen)
+    assert not missed and chat.calls == 1
+    assert [event_id for event_id, _, _ in events] == list(range(last_seen + 1, 6))
+
+def test_gap_beyond_replay_buffer_is_reported():
+    manager = ChatStreamManager(SmallConfig)
+    stream_id = manager.start(FakeChat([str(i) for i in range(20)]))
+    follow(manager, stream_id)
+    assert follow(manager, stream_id, last_event_id=1) == ([], True)
+    events, missed = follow(manager, stream_id, last_event_id=20)
+    assert not missed and json.loads(events[-1][2]) == {'finished': True}
+
+def test_heartbeat_timeout_and_producer_error():
+    manager = ChatStreamManager(SmallConfig)
+    stream_id = manager.start(FakeChat(['慢'], interval=0.3, fail=True))
+    assert manager.wait_for_events(stream_id, 1, timeout=0.05) == ([], False, False)
+    events, _ = follow(manager, stream_id, last_event_id=1)
+    assert 'connection reset' in json.loads(events[-1][2])['error']
+    assert manager.wait_for_events('unknown', 0, timeout=0) is None
+
+if __name__ == '__main__':
+    # 模拟：每20ms一个片段共100段，客户端在第30段后断线，300ms后携带Last-Event-ID重连
+    manager = ChatStreamManager(Config)
+    chat = FakeChat([f"片段{i}" for i in range(100)], interval=0.02)
+    stream_id = manager.start(chat)
+    received, last = [], 0
+    while len(received) < 30:
+        events, _, _ = manager.wait_for_events(stream_id, last, timeout=1.0)
+        received.extend(events)
+        last = events[-1][0]
+    time.sleep(0.3)
+    start = time.perf_counter()
+    events, _, missed = manager.wait_for_events(stream_id, last, timeout=1.0)
+    replay_ms = (time.perf_counter() - start) * 1000
+    rest, _ = follow(manager, stream_id, events[-1][0])
+    ids = [event_id for event_id, _, _ in received + events + rest]
+    print(f"重连后立即补发 {len(events)} 个事件（{replay_ms:.2f} ms），"
+          f"事件编号连续: {ids == list(range(1, len(ids) + 1))}，LLM调用次数: {chat.calls}")
+    print(f"统计: {manager.get_stats()}")
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+测试按token预算组装提示词：整条保留或丢弃参考片段与历史，不截断中间文本
+"""
+
+from backend.context_assembler import ContextAssembler, TokenCounter
+from config import Config
+
+class BudgetConfig(Config):
+    MAX_CONTEXT_TOKENS = 300
+    CONTEXT_DOCUMENT_SHARE = 0.7
+
+def make_assembler():
+    assembler = ContextAssembler(BudgetConfig)
+    # 固定使用估算，结果不依赖是否安装了分词器
+    assembler.counter.tokenizer = None
+    assembler.counter.count.cache_clear()
+    return assembler
+
+def test_estimate_handles_chinese_and_latin():
+    assert TokenCounter.estimate('') == 0
+    assert TokenCounter.estimate('你好') == 2
+    assert TokenCounter.estimate('hello world') == 4
+
+def test_items_are_kept_or_dropped_whole():
+    assembler = make_assembler()
+    docs = [{'content': '甲' * 100}, {'content': '乙' * 200}, {'content': '丙' * 30}]
+    history = [{'user': f'问题{i}', 'assistant': '答' * 40} for i in range(4)]
+    result = assembler.assemble('系统提示', '今天天气怎么样？', docs, history)
+
+    assert result['tokens']['total'] <= BudgetConfig.MAX_CONTEXT_TOKENS
+    assert [doc['content'][0] for doc in result['documents']] == ['甲', '丙']
+    for doc in result['documents']:
+        assert doc['content'] in result['prompt']
+    # Newest turns survive
+    assert result['history'] == history[-len(result['history']):]
+    assert result['prompt'].endswith('当前问题: 今天天气怎么样？')
+
+def test_unused_history_budget_goes_to_documents():
+    assembler = make_assembler()
+    docs = [{'content': '甲' * 150}, {'content': '乙' * 100}]
+    result = assembler.assemble('系统提示', '问题', docs, [])
+    assert len(result['documents']) == 2
+    assert '对话历史' not in result['prompt']
+
+def test_question_is_kept_over_budget():
+    assembler = make_assembler()
+    question = '长' * 500
+    result = assembler.assemble('系统提示', question, [{'content': '参考'}], [{'user': '问', 'assistant': '答'}])
+    assert result['prompt'] == f'当前问题: {question}'
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+测试按会话隔离的对话历史：会话互不影响、容量与过期有界、Redis层共享并按会话过期时间过期
+运行本文件可用tracemalloc测量10k会话的内存占用
+"""
+
+import time
+import tracemalloc
+
+from backend.conversation_manager import ConversationStore
+from config import Config
+
+class FakeDatabaseManager:
+    """模拟Redis最近消息列表：新消息在前，与DatabaseManager行为一致"""
+
+    def __init__(self):
+        self.redis_available = True
+        self.lists = {}
+        self.expiry = {}
+
+    def add_to_recent_messages(self, session_id, message, max_messages=20, expiry_seconds=3600):
+        self.expiry[session_id] = expiry_seconds
+        messages = self.lists.setdefault(session_id, [])
+        messages.insert(0, message)
+        del messages[max_messages:]
+        return True
+
+    def get_recent_messages(self, session_id, count=10):
+        return self.lists.get(session_id, [])[:count]
+
+    def clear_recent_messages(self, session_id):
+        self.lists.pop(session_id, None)
+        return True
+
+class SmallConfig(Config):
+    CONVERSATION_MAX_SESSIONS = 3
+    CONVERSATION_TTL = 3600
+    MAX_CHAT_HISTORY = 4
+
+def test_sessions_are_isolated():
+    store = ConversationStore(Config)
+    store.add_turn('alice', '你好', '你好，Alice')
+    store.add_turn('bob', '天气如何', '晴天')
+    assert [t['user'] for t in store.get_history('alice')] == ['你好']
+    store.clear('alice')
+    assert store.get_history('alice') == []
+    assert [t['assistant'] for t in store.get_history('bob')] == ['晴天']
+
+def test_turns_and_sessions_are_bounded():
+    store = ConversationStore(SmallConfig)
+    for i in range(10):
+        store.add_turn('s0', f'问题{i}', f'回答{i}')
+    history = store.get_history('s0')
+    assert [t['user'] for t in history] == ['问题6', '问题7', '问题8', '问题9']
+    assert [t['user'] for t in store.get_history('s0', limit=2)] == ['问题8', '问题9']
+
+    for i in range(1, 5):
+        store.add_turn(f's{i}', '问题', '回答')
+    assert store.get_stats()['sessions'] == 3
+    assert store.get_history('s1') == []
+
+def test_long_messages_are_truncated():
+    store = ConversationStore(Config)
+    store.add_turn('s', '问' * 10000, '答' * 10000)
+    turn = store.get_history('s')[0]
+    assert len(turn['user']) == len(turn['assistant']) == Config.CONVERSATION_MAX_MESSAGE_CHARS
+
+def test_idle_sessions_expire():
+    store = ConversationStore(SmallConfig)
+    store.add_turn('old', '问题', '回答')
+    store._sessions['old'].last_access = time.monotonic() - SmallConfig.CONVERSATION_TTL - 1
+    assert store.get_history('old') == []
+    assert store.get_stats()['sessions'] == 0
+
+def test_redis_tier_is_shared_between_workers():
+    db = FakeDatabaseManager()
+    worker_a, worker_b = ConversationStore(Config, db), ConversationStore(Config, db)
+    worker_a.add_turn('s', '第一问', '第一答')
+    worker_b.add_turn('s', '第二问', '第二答')
+    assert [t['user'] for t in worker_a.get_history('s')] == ['第一问', '第二问']
+    worker_a.clear('s')
+    assert worker_b.get_history('s') == []
+
+def test_redis_history_expires_with_conversation_ttl():
+    db = FakeDatabaseManager()
+    store = ConversationStore(type('LongTTLConfig', (Config,), {'CONVERSATION_TTL': 7200}), db)
+    store.add_turn('s', '问题', '回答')
+    assert db.expiry['s'] == 7200
+
+def measure(sessions, turns, user_chars, answer_chars):
+    """测量sessions个会话各写入turns轮对话后的内存（字节）"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    store = ConversationStore(Config)
+    for s in range(sessions):
+        for t in range(turns):
+            # 每条消息内容不同，避免字符串被共享而低估占用
+            store.add_turn(f'session-{s}', f'{s}-{t}' + '问' * user_chars, f'{s}-{t}' + '答' * answer_chars)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return size, store
+
+if __name__ == '__main__':
+    print(f"每会话最多 {Config.MAX_CHAT_HISTORY} 轮，单条消息最多 {Config.CONVERSATION_MAX_MESSAGE_CHARS} 字")
+    for turns in (5, 20, 100):
+        size, _ = measure(1000, turns, 50, 300)
+        print(f"1000 会话 x {turns:3d} 轮 (常见长度): {size / 1024 / 1024:7.1f} MiB, 每会话 {size / 1000 / 1024:6.1f} KiB")
+    size, store = measure(10000, 20, 50, 300)
+    print(f"10000 会话 x 20 轮 (常见长度): {size / 1024 / 1024:7.1f} MiB, 每会话 {size / 10000 / 1024:6.1f} KiB, "
+          f"内存会话数 {store.get_stats()['sessions']}")
+    size, _ = measure(1000, 30, 5000, 5000)
+    print(f"1000 会话 x 30 轮 (超长消息上限): {size / 1024 / 1024:7.1f} MiB, 每会话 {size / 1000 / 1024:6.1f} KiB")
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+测试查询向量微批处理：并发请求合并为一次调用、结果按调用方分发、错误传递
+运行本文件可对比逐条调用与微批处理在并发负载下的每秒API调用数和延迟
+"""
+
+import sys
+import time
+import random
+import threading
+
+from backend.embedding_batcher import EmbeddingBatcher
+
+class FakeEmbeddingAPI:
+    """按批次计数的假向量化接口，耗时 = 固定往返 + 每条文本的处理时间"""
+
+    def __init__(self, round_trip=0.0, per_text=0.0, fail=False):
+        self.round_trip = round_trip
+        self.per_text = per_text
+        self.fail = fail
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self.lock:
+            self.calls.append(list(texts))
+        time.sleep(self.round_trip + self.per_text * len(texts))
+        if self.fail:
+            raise Exception("Embedding API error: throttled")
+        return [[float(len(text)), float(sum(map(ord, text)))] for text in texts]
+
+def run_concurrently(fn, args):
+    results, errors = [None] * len(args), [None] * len(args)
+    barrier = threading.Barrier(len(args))
+
+    def worker(index):
+        barrier.wait()
+        try:
+            results[index] = fn(args[index])
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(args))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+def test_concurrent_requests_share_calls_and_get_their_own_vectors():
+    api = FakeEmbeddingAPI(round_trip=0.02)
+    batcher = EmbeddingBatcher(api, max_batch=25, max_wait=0.02)
+    texts = [f"问题{i}" for i in range(20)]
+    results, errors = run_concurrently(batcher.embed, texts)
+    batcher.shutdown()
+
+    assert errors == [None] * 20
+    assert results == [[float(len(text)), float(sum(map(ord, text)))] for text in texts]
+    assert len(api.calls) < 20
+    assert batcher.get_stats()['requests'] == 20
+
+def test_batch_size_is_capped():
+    api = FakeEmbeddingAPI(round_trip=0.02)
+    batcher = EmbeddingBatcher(api, max_batch=4, max_wait=0.05)
+    run_concurrently(batcher.embed, [f"问题{i}" for i in range(12)])
+    batcher.shutdown()
+    assert max(len(call) for call in api.calls) <= 4
+    assert sum(len(call) for call in api.calls) == 12
+
+def test_duplicate_texts_are_embedded_once():
+    api = FakeEmbeddingAPI(round_trip=0.02)
+    batcher = EmbeddingBatcher(api, max_batch=25, max_wait=0.05)
+    results, _ = run_concurrently(batcher.embed, ['营业时间'] * 8)
+    batcher.shutdown()
+    assert sum(len(call) for call in api.calls) < 8
+    assert all(result == results[0] for result in results)
+
+def test_api_error_reaches_every_caller():
+    batcher = EmbeddingBatcher(FakeEmbeddingAPI(fail=True), max_batch=25, max_wait=0.02)
+    _, errors = run_concurrently(batcher.embed, [f"问题{i}" for i in range(5)])
+    batcher.shutdown()
+    assert all(error is not None and 'throttled' in str(error) for error in errors)
+    assert batcher.get_stats()['errors'] >= 1
+
+def load_test(embed, api, users, duration, think_time):
+    """users 个并发用户各自循环：发起查询 -> 等待向量 -> 思考 think_time 秒"""
+    latencies, lock = [], threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def user(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            embed(f"用户{seed}的问题{rng.random()}")
+            with lock:
+                latencies.append(time.perf_counter() - start)
+            time.sleep(rng.uniform(0, 2 * think_time))
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'queries_per_s': len(latencies) / elapsed,
+        'calls_per_s': len(api.calls) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000
+    }
+
+if __name__ == '__main__':
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    print("假接口：往返 80ms + 每条 0.5ms；每个用户两次查询间隔平均 100ms")
+    for users in (10, 50, 200):
+        direct_api = FakeEmbeddingAPI(round_trip=0.08, per_text=0.0005)
+        direct = load_test(lambda text: direct_api([text])[0], direct_api, users, duration, 0.1)
+        for max_wait_ms in (2, 5):
+            batch_api = FakeEmbeddingAPI(round_trip=0.08, per_text=0.0005)
+            batcher = EmbeddingBatcher(batch_api, max_batch=25, max_wait=max_wait_ms / 1000.0, concurrency=8)
+            batched = load_test(batcher.embed, batch_api, users, duration, 0.1)
+            batcher.shutdown()
+            print(f"{users:4d} 用户 等待{max_wait_ms}ms: 逐条 {direct['calls_per_s']:6.1f} 次调用/s "
+                  f"(p50 {direct['p50_ms']:.1f}ms p95 {direct['p95_ms']:.1f}ms) -> 微批 {batched['calls_per_s']:6.1f} 次调用/s "
+                  f"(p50 {batched['p50_ms']:.1f}ms p95 {batched['p95_ms']:.1f}ms), "
+                  f"平均批大小 {batcher.get_stats()['average_batch_size']}")
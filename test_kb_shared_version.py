@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+测试多进程共享的知识库版本：一个worker增删文档后，其他worker在下次读取版本或检索时看到变化并重新加载元数据与BM25索引
+运行本文件可输出读取共享版本的耗时
+"""
+
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip('chromadb')
+pytest.importorskip('PyPDF2')
+
+from backend.answer_cache import SemanticAnswerCache
+from backend.knowledge_base import KnowledgeBaseManager
+from config import Config
+
+def kb_config(root):
+    return type('KBConfig', (Config,), {
+        'KNOWLEDGE_BASE_FOLDER': str(root / 'knowledge_base'),
+        'VECTOR_DB_PATH': str(root / 'vector_db'),
+        'BM25_INDEX_PATH': str(root / 'knowledge_base' / 'bm25_index.json'),
+        'EMBEDDING_BATCH_ENABLED': False
+    })
+
+def publish_document(manager, document_id):
+    """模拟 add_document 的元数据写入（不调用嵌入API）"""
+    manager.documents_metadata[document_id] = {
+        'filename': f'{document_id}.txt', 'file_path': '', 'total_chunks': 1,
+        'added_at': '2024-01-01T00:00:00', 'file_size': 1, 'content_preview': ''
+    }
+    manager._save_metadata()
+
+def test_other_workers_see_version_change(tmp_path):
+    writer, reader = KnowledgeBaseManager(kb_config(tmp_path)), KnowledgeBaseManager(kb_config(tmp_path))
+    assert writer.version == reader.version == 0
+
+    publish_document(writer, 'doc_a')
+    assert reader.version == writer.version > 0
+    assert 'doc_a' in reader.documents_metadata
+
+    before = reader.version
+    publish_document(writer, 'doc_b')
+    assert reader.version != before
+
+def test_answer_cache_in_other_worker_is_invalidated(tmp_path):
+    writer, reader = KnowledgeBaseManager(kb_config(tmp_path)), KnowledgeBaseManager(kb_config(tmp_path))
+    cache = SemanticAnswerCache(Config)
+    embedding = (np.ones(8) / np.sqrt(8)).tolist()
+    cache.store(embedding, ['doc_a_chunk_0'], '旧答案', kb_version=reader.version)
+    assert cache.lookup(embedding, reader.version) is not None
+
+    publish_document(writer, 'doc_a')
+    assert cache.lookup(embedding, reader.version) is None
+
+def test_bm25_index_follows_other_workers(tmp_path):
+    writer, reader = KnowledgeBaseManager(kb_config(tmp_path)), KnowledgeBaseManager(kb_config(tmp_path))
+    writer.bm25.add_chunks('doc_a', ['doc_a_chunk_0'], ['打印机A3的保修期为两年，支持全国联保。'])
+    publish_document(writer, 'doc_a')
+    results = reader.search_similar_documents('打印机保修期', k=1, mode='bm25')
+    assert results and results[0]['id'] == 'doc_a_chunk_0'
+
+    writer.bm25.remove_document('doc_a')
+    del writer.documents_metadata['doc_a']
+    writer._save_metadata()
+    assert reader.search_similar_documents('打印机保修期', k=1, mode='bm25') == []
+
+if __name__ == '__main__':
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as root:
+        manager = KnowledgeBaseManager(kb_config(Path(root)))
+        publish_document(manager, 'doc_a')
+        start = time.perf_counter()
+        for _ in range(10000):
+            manager.version
+        print(f"读取共享版本: {(time.perf_counter() - start) / 10000 * 1e6:.2f} us/次")
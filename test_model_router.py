@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+测试LLM模型路由：按请求类型选择模型与回答长度，主模型近期p95超出预算或持续出错时切换到更快的模型
+运行本文件可模拟主模型变慢再恢复的过程，对比固定主模型与延迟感知路由下的语音回答延迟
+"""
+
+import time
+import random
+
+import backend.model_router as router_module
+import backend.rag_system as rag_module
+from backend.model_router import ModelRouter
+from backend.rag_system import RAGSystem
+from config import Config
+
+class FastWindowConfig(Config):
+    LLM_LATENCY_WINDOW = 0.2
+
+def test_profiles_select_model_and_answer_length():
+    router = ModelRouter(Config)
+    voice = router.route('voice')
+    assert voice['model'] == Config.LLM_PROFILES['voice']['model'] and voice['max_tokens'] == 300
+    assert voice['fallback'] is False and voice['reason'] == 'primary'
+    assert router.route('unknown')['request_class'] == 'chat'
+    assert '朗读' in router.system_prompt('voice', Config.SYSTEM_PROMPT)
+    assert router.system_prompt('chat', Config.SYSTEM_PROMPT) == Config.SYSTEM_PROMPT
+
+def test_slow_primary_falls_back_and_recovers():
+    router = ModelRouter(FastWindowConfig)
+    primary = Config.LLM_PROFILES['voice']['model']
+    for _ in range(Config.LLM_LATENCY_MIN_SAMPLES):
+        router.record(primary, 'complete', 5.0)
+    decision = router.route('voice')
+    assert decision['fallback'] is True and decision['model'] == Config.LLM_FAST_MODEL
+    assert decision['primary_p95_ms'] == 5000.0 and decision['reason'] == 'over_budget'
+    # Streamed calls are judged by their first-token latency, which has no samples yet
+    assert router.route('voice', stream=True)['fallback'] is False
+
+    time.sleep(0.25)
+    assert router.route('voice')['model'] == primary
+
+def test_chat_profile_has_a_completion_budget():
+    router = ModelRouter(Config)
+    primary = Config.LLM_PROFILES['chat']['model']
+    for _ in range(Config.LLM_LATENCY_MIN_SAMPLES):
+        router.record(primary, 'complete', 30.0)
+    assert router.route('chat')['model'] == Config.LLM_FAST_MODEL
+
+def test_failed_calls_count_as_budget_misses():
+    router = ModelRouter(Config)
+    primary = Config.LLM_PROFILES['voice']['model']
+    for _ in range(Config.LLM_LATENCY_MIN_SAMPLES):
+        router.record(primary, 'complete', 0.5)
+    router.record_failure(primary, 'complete')
+    decision = router.route('voice')
+    assert decision['model'] == Config.LLM_FAST_MODEL and decision['reason'] == 'failing'
+    assert decision['primary_p95_ms'] is None
+    assert router.get_stats()['latency'][primary]['complete_p95_ms'] is None
+
+class FakeKnowledgeBase:
+    version = 0
+    documents_metadata = {}
+
+    def search_similar_documents(self, query, k=3):
+        return []
+
+def test_erroring_model_is_demoted(monkeypatch):
+    def failing_call(**kwargs):
+        raise ConnectionError('connection reset')
+    monkeypatch.setattr(rag_module.Generation, 'call', failing_call)
+    config = type('NoCacheConfig', (Config,), {'ANSWER_CACHE_ENABLED': False})
+    rag = RAGSystem(config, kb_manager=FakeKnowledgeBase())
+    primary = Config.LLM_PROFILES['chat']['model']
+    for i in range(Config.LLM_LATENCY_MIN_SAMPLES):
+        assert rag.chat(f'问题{i}', f'session{i}').startswith('抱歉')
+    assert rag.router.route('chat')['model'] == Config.LLM_FAST_MODEL
+
+    events = list(rag.chat_stream('问题', 'stream'))
+    assert events[0]['route']['model'] == primary and 'error' in events[-1]
+    assert rag.router.p95(primary, 'first_token') is None
+    for i in range(Config.LLM_LATENCY_MIN_SAMPLES - 1):
+        list(rag.chat_stream(f'问题{i}', f'stream{i}'))
+    assert rag.router.route('chat', stream=True)['reason'] == 'failing'
+
+class SimulatedClock:
+    """按模拟时间推进的时钟，替换路由器使用的 time 模块"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+def simulate(use_router, turns=600, interval=2.0):
+    """每 interval 秒一轮语音；主模型完整回答约1.5s，第150~400轮变慢到约4.5s；快速模型约0.8s"""
+    rng = random.Random(0)
+    clock = SimulatedClock()
+    router_module.time = clock
+    router = ModelRouter(Config)
+    primary = Config.LLM_PROFILES['voice']['model']
+    latencies, fallbacks = [], 0
+    for turn in range(turns):
+        clock.now = turn * interval
+        model = router.route('voice')['model'] if use_router else primary
+        if model == primary:
+            latency = max(0.1, rng.gauss(4.5 if 150 <= turn < 400 else 1.5, 0.2))
+        else:
+            latency = max(0.1, rng.gauss(0.8, 0.1))
+            fallbacks += 1
+        router.record(model, 'complete', latency)
+        latencies.append(latency)
+    router_module.time = time
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)], fallbacks
+
+if __name__ == '__main__':
+    budget = Config.LLM_PROFILES['voice']['complete_budget_ms']
+    print(f"600轮语音（每2秒一轮，主模型在第150~400轮变慢），预算 {budget}ms，统计窗口 {Config.LLM_LATENCY_WINDOW}s")
+    for label, use_router in (('固定主模型', False), ('延迟感知路由', True)):
+        p50, p95, fallbacks = simulate(use_router)
+        print(f"{label}: 回答延迟 p50 {p50 * 1000:.0f}ms p95 {p95 * 1000:.0f}ms，切换到快速模型 {fallbacks} 轮")
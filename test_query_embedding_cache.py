@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+测试查询向量缓存：归一化命中、容量与过期有界、Redis层跨进程复用
+"""
+
+import time
+
+from backend.embedding_cache import QueryEmbeddingCache
+from config import Config
+
+class FakeDatabaseManager:
+    """模拟DatabaseManager的Redis向量缓存接口"""
+
+    def __init__(self):
+        self.redis_available = True
+        self.values = {}
+
+    def cache_query_embedding(self, key, embedding, expiry_seconds=86400):
+        self.values[key] = list(embedding)
+        return True
+
+    def get_cached_query_embedding(self, key):
+        return self.values.get(key)
+
+class SmallConfig(Config):
+    QUERY_EMBEDDING_CACHE_SIZE = 2
+    QUERY_EMBEDDING_CACHE_TTL = 60
+
+def test_equivalent_queries_share_an_entry():
+    cache = QueryEmbeddingCache(Config)
+    cache.put('你好', [0.5, 0.25])
+    assert cache.get(' 你好！') == [0.5, 0.25]
+    assert cache.get('ＨＥＬＬＯ  World?') is None
+    cache.put('hello world', [1.0])
+    assert cache.get('ＨＥＬＬＯ  World?') == [1.0]
+
+def test_entries_are_bounded_and_expire():
+    cache = QueryEmbeddingCache(SmallConfig)
+    for query in ('一', '二', '三'):
+        cache.put(query, [1.0])
+    assert cache.get('一') is None
+    assert cache.get('三') == [1.0]
+
+    key = cache._key(cache.normalize('三'))
+    vector, _ = cache._entries[key]
+    cache._entries[key] = (vector, time.monotonic() - 1)
+    assert cache.get('三') is None
+    assert cache.get_stats()['entries'] == 1
+
+def test_redis_tier_is_shared_between_workers():
+    db = FakeDatabaseManager()
+    worker_a, worker_b = QueryEmbeddingCache(Config, db), QueryEmbeddingCache(Config, db)
+    worker_a.put('如何退票', [0.5])
+    assert worker_b.get('如何退票？') == [0.5]
+    assert worker_b.get('如何退票') == [0.5]
+    stats = worker_b.get_stats()
+    assert stats['redis_hits'] == 1 and stats['memory_hits'] == 1
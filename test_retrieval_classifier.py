@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+测试检索跳过分类器：寒暄类消息不检索，带业务关键词的问题照常检索
+运行本文件可输出分类耗时与样本上的跳过比例
+"""
+
+import time
+
+from backend.retrieval_classifier import RetrievalClassifier, RetrievalGate
+from config import Config
+
+CHITCHAT = ['你好', '您好！', '谢谢', '谢谢啦~', '好的，谢谢', '嗯嗯', '再见', 'Hello!', 'thank you',
+            '早上好呀', '你是谁？', '哈哈哈', '收到', '为什么', '嗯，那个']
+QUESTIONS = ['退票手续费是多少？', '怎么修改订单', '会员积分可以兑换什么', '营业时间', 'WiFi密码是多少',
+             '你好，请问退款多久到账？', '谢谢，另外发票怎么开', '那第二个方案呢', 'API的调用限额是多少']
+
+class FakeKnowledgeBase:
+    def __init__(self, documents):
+        self.documents_metadata = documents
+
+def test_chitchat_skips_retrieval():
+    classifier = RetrievalClassifier(Config)
+    for message in CHITCHAT:
+        assert classifier.classify(message)[0] is False, message
+
+def test_questions_keep_retrieval():
+    classifier = RetrievalClassifier(Config)
+    for message in QUESTIONS:
+        assert classifier.classify(message) == (True, 'keywords'), message
+
+def test_empty_knowledge_base_skips_retrieval():
+    assert RetrievalGate(Config, FakeKnowledgeBase({})).should_retrieve('退票手续费是多少？') is False
+    assert RetrievalGate(Config, FakeKnowledgeBase({'doc': {}})).should_retrieve('退票手续费是多少？') is True
+
+if __name__ == '__main__':
+    classifier = RetrievalClassifier(Config)
+    messages = CHITCHAT + QUESTIONS
+    rounds = 200
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in messages:
+            classifier.classify(message)
+    elapsed = (time.perf_counter() - start) / (rounds * len(messages))
+    skipped = sum(not classifier.classify(message)[0] for message in messages)
+    print(f"单条分类耗时 {elapsed * 1000:.3f} ms")
+    print(f"样本 {len(messages)} 条，跳过检索 {skipped} 条 ({skipped / len(messages):.0%})，"
+          f"每条跳过节省一次向量化调用和一次向量检索")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+测试基于ASR中间结果的提前检索：一段时间未被修正的中间结果触发检索，最终文本相近时复用、不同时丢弃
+运行本文件可模拟语音轮次，输出命中率与每轮节省的检索时间
+"""
+
+import time
+import random
+import threading
+
+from backend.speculative_retrieval import SpeculativeRetriever
+from backend.retrieval_classifier import RetrievalClassifier
+from config import Config
+
+class FakeSearch:
+    """记录查询的假检索，耗时固定"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def __call__(self, query):
+        with self.lock:
+            self.queries.append(query)
+        time.sleep(self.latency)
+        return [{'id': f"doc_{len(query)}", 'content': query}]
+
+def partials_of(text, step=2):
+    """按识别逐步追加文字的方式生成中间结果"""
+    return [text[:end] for end in range(step, len(text), step)] + [text]
+
+def feed(retriever, session_id, text, kb_version=0, settle=True):
+    for partial in partials_of(text):
+        retriever.observe(session_id, partial, kb_version)
+    if settle:
+        time.sleep(Config.SPECULATIVE_STABLE_MS / 1000.0 + 0.1)
+
+def test_matching_final_transcript_reuses_speculation():
+    search = FakeSearch()
+    retriever = SpeculativeRetriever(Config, search)
+    feed(retriever, 's1', '退票手续费是多少')
+    documents = retriever.take('s1', '退票手续费是多少？', kb_version=0, timeout=1.0)
+    assert documents is not None
+    stats = retriever.get_stats()
+    assert stats['hits'] == 1 and stats['started'] >= 1
+    assert 'pending' in stats and stats['pending'] == 0
+
+def test_different_final_transcript_discards_speculation():
+    retriever = SpeculativeRetriever(Config, FakeSearch())
+    feed(retriever, 's1', '退票手续费是多少')
+    assert retriever.take('s1', '会员积分可以兑换什么礼品', kb_version=0, timeout=1.0) is None
+    assert retriever.get_stats()['misses'] == 1
+
+def test_knowledge_base_change_discards_speculation():
+    retriever = SpeculativeRetriever(Config, FakeSearch())
+    feed(retriever, 's1', '退票手续费是多少', kb_version=0)
+    assert retriever.take('s1', '退票手续费是多少', kb_version=1, timeout=1.0) is None
+
+def test_unstable_or_chitchat_hypotheses_do_not_speculate():
+    search = FakeSearch()
+    retriever = SpeculativeRetriever(Config, search, RetrievalClassifier(Config))
+    retriever.observe('s1', '退票', 0)
+    feed(retriever, 's2', '好的，谢谢啦')
+    feed(retriever, 's3', '退票手续费是多少', settle=False)
+    assert search.queries == []
+    assert retriever.take('s1', '退票', kb_version=0) is None
+
+def test_speculations_per_turn_are_bounded():
+    search = FakeSearch()
+    retriever = SpeculativeRetriever(Config, search)
+    for clause in ['打印机无法连接无线网络怎么办', '另外墨盒在哪里购买', '保修期是多久', '发票怎么开具', '快递几天到']:
+        feed(retriever, 's1', clause)
+    retriever.discard('s1')
+    assert retriever.get_stats()['started'] <= Config.SPECULATIVE_MAX_PER_TURN
+
+if __name__ == '__main__':
+    # 模拟：中间结果每80ms更新一次，最后一次更新后识别还需200~500ms（尾部静音断句+等待后续句子），检索耗时150ms
+    random.seed(0)
+    questions = ['退票手续费是多少', '会员积分可以兑换哪些礼品', '打印机无法连接无线网络怎么办', '发票开具需要提供什么信息',
+                 '营业时间是几点到几点', '快递一般几天能到', '订单地址还能修改吗', '耳机左边没有声音怎么处理']
+    # 部分轮次最终识别结果修正了尾部内容
+    revisions = {'发票开具需要提供什么信息': '发票开具需要提供什么材料和信息', '订单地址还能修改吗': '订单取消以后还能恢复吗'}
+    search = FakeSearch(latency=0.15)
+    retriever = SpeculativeRetriever(Config, search, RetrievalClassifier(Config))
+    baseline_ms = 150.0
+    turns = 40
+    for turn in range(turns):
+        question = random.choice(questions)
+        session_id = f"voice_{turn}"
+        for partial in partials_of(question):
+            retriever.observe(session_id, partial, 0)
+            time.sleep(0.08)
+        time.sleep(random.uniform(0.2, 0.5))
+        final = revisions.get(question, question)
+        if retriever.take(session_id, final, kb_version=0, timeout=5.0) is None:
+            search(final)
+    stats = retriever.get_stats()
+    print(f"{turns} 轮语音：提前检索 {stats['started']} 次，命中 {stats['hits']}，丢弃 {stats['misses']}，"
+          f"命中率 {stats['hit_rate']:.0%}")
+    print(f"每轮平均节省检索时间 {stats['saved_ms_per_turn']} ms（检索耗时 {baseline_ms:.0f} ms），"
+          f"检索调用 {len(search.queries)} 次（无提前检索时 {turns} 次）")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+测试TTS音频缓存：内存层按字节LRU淘汰，磁盘层在重启后仍可命中，相同请求不再远程合成
+运行本文件可输出内存命中、磁盘命中与未命中的查找耗时
+"""
+
+import os
+import tempfile
+import time
+
+from backend.tts_cache import TTSAudioCache
+
+def make_cache(root, memory=100, disk=1000):
+    return TTSAudioCache(str(root), max_memory_bytes=memory, max_disk_bytes=disk)
+
+def test_key_covers_text_voice_model_and_format():
+    key = TTSAudioCache.make_key('你好', 'longwan_v2', 'cosyvoice-v2', 'mp3')
+    assert key == TTSAudioCache.make_key('你好', 'longwan_v2', 'cosyvoice-v2', 'mp3')
+    assert len({key,
+                TTSAudioCache.make_key('您好', 'longwan_v2', 'cosyvoice-v2', 'mp3'),
+                TTSAudioCache.make_key('你好', 'longhua_v2', 'cosyvoice-v2', 'mp3'),
+                TTSAudioCache.make_key('你好', 'longwan_v2', 'cosyvoice-v1', 'mp3'),
+                TTSAudioCache.make_key('你好', 'longwan_v2', 'cosyvoice-v2', 'pcm_16000')}) == 5
+
+def test_memory_tier_evicts_least_recently_used(tmp_path):
+    cache = make_cache(tmp_path, memory=100, disk=0)
+    cache.put('a', b'a' * 40)
+    cache.put('b', b'b' * 40)
+    assert cache.get('a') == b'a' * 40
+    cache.put('c', b'c' * 40)
+
+    assert cache.get('b') is None
+    assert cache.get('a') and cache.get('c')
+    stats = cache.get_stats()
+    assert stats['memory_bytes'] == 80 and stats['memory_evictions'] == 1
+    assert stats['disk_entries'] == 0
+
+    cache.put('big', b'x' * 101)
+    assert cache.get('big') is None
+
+def test_disk_tier_survives_restart(tmp_path):
+    make_cache(tmp_path).put('a', b'audio-a')
+    cache = make_cache(tmp_path)
+    assert cache.get_stats()['disk_entries'] == 1
+    assert cache.get('a') == b'audio-a'
+    assert cache.get('a') == b'audio-a'
+    stats = cache.get_stats()
+    assert stats['disk_hits'] == 1 and stats['memory_hits'] == 1 and stats['misses'] == 0
+
+def test_disk_tier_evicts_oldest_files(tmp_path):
+    cache = make_cache(tmp_path, memory=0, disk=100)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, key.encode() * 40)
+    assert cache.get('a') is None
+    assert cache.get('b') == b'b' * 40
+    assert not os.path.exists(cache._path('a'))
+    assert cache.get_stats()['disk_evictions'] == 1
+
+def test_missing_file_counts_as_miss(tmp_path):
+    cache = make_cache(tmp_path, memory=0)
+    cache.put('a', b'audio-a')
+    os.remove(cache._path('a'))
+    assert cache.get('a') is None
+    stats = cache.get_stats()
+    assert stats['misses'] == 1 and stats['disk_entries'] == 0 and stats['disk_bytes'] == 0
+
+def test_repeated_request_is_served_from_cache(make_tts_service, fake_synthesizer, tmp_path):
+    service = make_tts_service(TTS_CACHE_ENABLED=True, TTS_CACHE_FOLDER=str(tmp_path))
+    first = service.synthesize('列车即将进站，请站在安全线以内。', 'longwan_v2')
+    assert service.synthesize('列车即将进站，请站在安全线以内。', 'longwan_v2') == first
+    assert len(fake_synthesizer.texts) == 1
+
+    restarted = make_tts_service(TTS_CACHE_ENABLED=True, TTS_CACHE_FOLDER=str(tmp_path))
+    assert restarted.synthesize('列车即将进站，请站在安全线以内。', 'longwan_v2') == first
+    assert len(fake_synthesizer.texts) == 1
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as root:
+        audio = os.urandom(32 * 1024)
+        keys = [TTSAudioCache.make_key(f'第{i}句', 'longwan_v2', 'cosyvoice-v2', 'mp3') for i in range(200)]
+        writer = TTSAudioCache(root, max_memory_bytes=64 * 1024 * 1024, max_disk_bytes=64 * 1024 * 1024)
+        for key in keys:
+            writer.put(key, audio)
+        reader = TTSAudioCache(root, max_memory_bytes=64 * 1024 * 1024, max_disk_bytes=64 * 1024 * 1024)
+        for label, lookup_keys in (('磁盘命中', keys), ('内存命中', keys), ('未命中', [k[::-1] for k in keys])):
+            start = time.perf_counter()
+            for key in lookup_keys:
+                reader.get(key)
+            print(f"{label}: {(time.perf_counter() - start) / len(lookup_keys) * 1e6:.1f} us/次")
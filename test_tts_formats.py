@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+测试TTS输出格式协商：按请求的格式选最接近的采样率，不支持的格式回退到默认格式，并向客户端描述格式与MIME类型
+运行本文件可输出已安装SDK提供的全部格式
+"""
+
+import pytest
+from dashscope.audio.tts_v2 import AudioFormat
+
+from backend.tts_service import TTSService
+from conftest import tts_config
+
+@pytest.fixture
+def service(make_tts_service):
+    return make_tts_service(TTS_DEFAULT_FORMAT='mp3', TTS_DEFAULT_SAMPLE_RATE=22050)
+
+def test_default_format_without_request(service):
+    assert service.negotiate_format() is AudioFormat.MP3_22050HZ_MONO_256KBPS
+    assert service.negotiate_format(None, 16000) is AudioFormat.MP3_16000HZ_MONO_128KBPS
+
+def test_requested_family_at_nearest_sample_rate(service):
+    assert service.negotiate_format('pcm', 16000) is AudioFormat.PCM_16000HZ_MONO_16BIT
+    assert service.negotiate_format('PCM', 15000) is AudioFormat.PCM_16000HZ_MONO_16BIT
+    assert service.negotiate_format('wav', 96000) is AudioFormat.WAV_48000HZ_MONO_16BIT
+    # 与两档采样率距离相同时取较低的一档
+    assert service.negotiate_format('wav', 12000) is AudioFormat.WAV_8000HZ_MONO_16BIT
+    assert service.negotiate_format('wav') is AudioFormat.WAV_22050HZ_MONO_16BIT
+
+def test_unsupported_family_falls_back_to_default(service):
+    assert service.negotiate_format('flac', 16000) is service.default_format
+    if not any(family == 'opus' for family, _ in service.formats):
+        assert service.negotiate_format('opus') is service.default_format
+
+def test_describe_format(service):
+    assert service.describe_format() == {'format': 'mp3', 'sample_rate': 22050, 'mime_type': 'audio/mpeg'}
+    assert service.describe_format(AudioFormat.PCM_16000HZ_MONO_16BIT) == {
+        'format': 'pcm', 'sample_rate': 16000, 'mime_type': 'audio/L16;rate=16000;channels=1'
+    }
+    assert service.describe_format(AudioFormat.WAV_24000HZ_MONO_16BIT)['mime_type'] == 'audio/wav'
+
+def test_unsupported_default_format_is_rejected(fake_synthesizer):
+    with pytest.raises(Exception):
+        TTSService(tts_config(TTS_DEFAULT_FORMAT='flac'))
+
+if __name__ == '__main__':
+    service = TTSService(tts_config())
+    print(f"默认格式: {service.default_format.name}")
+    for family, rate in sorted(service.formats):
+        print(f"{family:5s} {rate:6d} Hz -> {service.formats[(family, rate)].name}")
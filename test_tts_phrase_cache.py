@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+测试句子级TTS音频缓存：频繁出现的句子经TinyLFU准入后在整段合成与流式合成中复用，偶发句子直接透传
+运行本文件可模拟问答负载并输出各音色的命中率
+"""
+
+import random
+
+import backend.tts_pool as pool_module
+from backend.tts_cache import TTSAudioCache
+from backend.tts_phrase_cache import CountMinSketch, PhraseAudioCache
+from backend.tts_service import TTSService
+from conftest import FakeSynthesizer, tts_config
+
+def make_service(factory):
+    service = factory(TTS_PHRASE_CACHE_ENABLED=True)
+    return service, service.negotiate_format('pcm', 16000)
+
+def key_of(text):
+    return TTSAudioCache.make_key(text, 'longwan_v2', 'cosyvoice-v2', 'PCM_16000HZ_MONO_16BIT')
+
+def test_sketch_counts_and_ages():
+    sketch = CountMinSketch(64)
+    key = key_of('根据提供的信息')
+    for _ in range(5):
+        sketch.increment(key)
+    assert sketch.estimate(key) >= 5
+    sketch._age()
+    assert sketch.estimate(key) >= 2
+
+def test_one_off_sentences_are_not_admitted():
+    cache = PhraseAudioCache(max_bytes=1024, sketch_width=256, min_count=2)
+    key = key_of('只出现一次的句子。')
+    assert cache.get(key, 'longwan_v2') is None
+    assert not cache.put(key, 'longwan_v2', b'audio')
+    cache.get(key, 'longwan_v2')
+    assert cache.put(key, 'longwan_v2', b'audio')
+    assert cache.get(key, 'longwan_v2') == b'audio'
+
+def test_full_cache_keeps_hotter_entries():
+    cache = PhraseAudioCache(max_bytes=10, sketch_width=256, min_count=2)
+    hot, warm = key_of('常用句。'), key_of('次常用句。')
+    for _ in range(6):
+        cache.get(hot, 'v')
+    assert cache.put(hot, 'v', b'x' * 8)
+    for _ in range(3):
+        cache.get(warm, 'v')
+    assert not cache.put(warm, 'v', b'y' * 8)
+    assert cache.get(hot, 'v') == b'x' * 8
+
+def test_repeated_sentence_is_reused_across_answers(make_tts_service, fake_synthesizer):
+    service, pcm = make_service(make_tts_service)
+    stock = '以上信息仅供参考。'
+    answers = [f'第{i}个问题的回答。{stock}' for i in range(4)]
+
+    results = [service.synthesize(answer, 'longwan_v2', pcm) for answer in answers]
+
+    # The first sighting passes through, the second is synthesized on its own and stored
+    assert fake_synthesizer.texts[0] == answers[0]
+    assert fake_synthesizer.texts.count(stock) == 1
+    assert fake_synthesizer.texts[-1] == '第3个问题的回答。'
+    assert results == [answer.encode('utf-8') for answer in answers]
+    stats = service.get_phrase_cache_stats()['voices']['longwan_v2']
+    assert stats['hits'] == 2 and stats['admitted'] == 1
+
+def test_streamed_answers_reuse_repeated_sentences(make_tts_service, fake_synthesizer):
+    service, pcm = make_service(make_tts_service)
+    ack = '好的，我来查一下。'
+    answers = [f'{ack}第{i}趟列车正点运行。' for i in range(3)]
+
+    streamed = [b''.join(service.synthesize_stream(answer, 'longwan_v2', pcm)) for answer in answers]
+
+    assert streamed == [answer.encode('utf-8') for answer in answers]
+    assert fake_synthesizer.texts == [answers[0], ack, '第1趟列车正点运行。', '第2趟列车正点运行。']
+    stats = service.get_phrase_cache_stats()['voices']['longwan_v2']
+    assert stats['admitted'] == 1 and stats['hits'] == 1
+
+def test_fully_cached_stream_needs_no_slot(make_tts_service, fake_synthesizer):
+    service, pcm = make_service(make_tts_service)
+    for _ in range(2):
+        b''.join(service.synthesize_stream('请稍等。', 'longwan_v2', pcm))
+    calls = len(fake_synthesizer.texts)
+    assert b''.join(service.synthesize_stream('请稍等。', 'longwan_v2', pcm)) == '请稍等。'.encode('utf-8')
+    assert len(fake_synthesizer.texts) == calls
+    assert service.scheduler.get_stats()['interactive']['active'] == 0
+
+def test_sentence_repeated_within_one_request_counts_once():
+    cache = PhraseAudioCache(max_bytes=1024, sketch_width=256, min_count=2)
+    key = key_of('对。')
+    assert cache.lookup(key, 'v') == (None, False)
+    assert cache.lookup(key, 'v', count=False) == (None, False)
+    assert cache.lookup(key, 'v') == (None, True)
+
+def test_unseen_sentences_keep_the_normal_path(make_tts_service):
+    service, _ = make_service(make_tts_service)
+    assert service._synthesize_phrases('一句话。', 'longwan_v2', service.config.TTS_MODEL, service.default_format,
+                                       'interactive', None) is None
+
+if __name__ == '__main__':
+    stock_phrases = ['根据提供的信息，', '以上信息仅供参考。', '如有其他问题，欢迎继续提问。',
+                     '请以官方公告为准。', '希望对您有所帮助。']
+    rng = random.Random(7)
+    pool_module.SpeechSynthesizer = FakeSynthesizer
+    for voice in ('longwan_v2', 'longhua_v2'):
+        FakeSynthesizer.texts = []
+        service, pcm = make_service(lambda **settings: TTSService(tts_config(**settings)))
+        sent = 0
+        for i in range(500):
+            answer = f'{rng.choice(stock_phrases[:1])}这是第{i}条回答的正文。{rng.choice(stock_phrases[1:])}'
+            sent += len(answer)
+            service.synthesize(answer, voice, pcm)
+        remote = sum(len(text) for text in FakeSynthesizer.texts)
+        stats = service.get_phrase_cache_stats()['voices'][voice]
+        print(f"{voice}: 句子命中率 {stats['hit_rate']:.1%}, 远程合成字符 {remote}/{sent} ({remote / sent:.1%})")
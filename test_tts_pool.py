@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+测试TTS预建会话池：只为显式预热的音色保留会话，未用的预热音色过期，预建失败按退避重试，断开的会话被替换
+运行本文件可对比有无预建会话时得到首个音频的耗时
+"""
+
+import time
+
+from dashscope.audio.tts_v2 import AudioFormat
+
+import backend.tts_pool as pool_module
+from backend.tts_pool import SynthesizerPool
+from backend.tts_service import StreamingSynthesisCallback
+from config import Config
+from conftest import FakeSynthesizer
+
+class PoolConfig(Config):
+    TTS_POOL_SIZE = 2
+    TTS_POOL_MAX_IDLE = 20.0
+    TTS_POOL_WARMERS = 2
+    TTS_POOL_KEY_TTL = 300.0
+    TTS_POOL_MAX_BACKOFF = 60.0
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_acquire_does_not_register_unwarmed_keys(fake_synthesizer):
+    pool = SynthesizerPool(PoolConfig)
+    fmt = AudioFormat.MP3_22050HZ_MONO_256KBPS
+    sessions = [pool.acquire('cosyvoice-v2', f'client_voice_{i}', fmt) for i in range(5)]
+    assert pool.get_stats() == {}
+    # 未预热的会话在发送文本时才建立连接
+    assert all(session.started_at is None for session in sessions)
+    assert fake_synthesizer.starts == 0
+    pool.shutdown()
+
+def test_warmed_key_is_served_and_refilled(fake_synthesizer):
+    pool = SynthesizerPool(PoolConfig)
+    fmt = AudioFormat.MP3_22050HZ_MONO_256KBPS
+    pool.warm('cosyvoice-v2', 'longwan_v2', fmt, pinned=True)
+    assert wait_until(lambda: pool.get_stats()['longwan_v2/' + fmt.name]['idle'] == 2)
+    session = pool.acquire('cosyvoice-v2', 'longwan_v2', fmt)
+    assert session.started_at is not None
+    assert wait_until(lambda: fake_synthesizer.starts == 3)
+
+    target = StreamingSynthesisCallback()
+    session.run('请稍等。', target)
+    assert fake_synthesizer.texts == ['请稍等。'] and fake_synthesizer.starts == 3
+    assert target.queue.get(timeout=1) == '请稍等。'.encode('utf-8')
+    pool.shutdown()
+
+def test_unused_unpinned_key_expires(fake_synthesizer, monkeypatch):
+    pool = SynthesizerPool(PoolConfig)
+    fmt = AudioFormat.PCM_16000HZ_MONO_16BIT
+    pool.warm('cosyvoice-v2', 'longwan_v2', fmt)
+    pool.warm('cosyvoice-v2', 'longhua_v2', fmt, pinned=True)
+    assert wait_until(lambda: all(v['idle'] == 2 for v in pool.get_stats().values()))
+
+    now = time.monotonic()
+    monkeypatch.setattr(pool_module.time, 'monotonic', lambda: now + PoolConfig.TTS_POOL_KEY_TTL + 1)
+    assert pool._expire(('cosyvoice-v2', 'longwan_v2', fmt.name))
+    assert not pool._expire(('cosyvoice-v2', 'longhua_v2', fmt.name))
+    assert list(pool.get_stats()) == ['longhua_v2/' + fmt.name]
+    pool.shutdown()
+
+def test_failed_warm_backs_off(fake_synthesizer):
+    fake_synthesizer.fail_connect = True
+    pool = SynthesizerPool(PoolConfig)
+    fmt = AudioFormat.MP3_22050HZ_MONO_256KBPS
+    key = ('cosyvoice-v2', 'longwan_v2', fmt.name)
+    pool.warm(*key[:2], fmt)
+    assert wait_until(lambda: pool.get_stats()['longwan_v2/' + fmt.name]['starting'] == 0)
+    assert pool.get_stats()['longwan_v2/' + fmt.name]['failures'] == 2
+    pool._refill(key)
+    assert pool.get_stats()['longwan_v2/' + fmt.name]['starting'] == 0
+    assert pool._retry_at[key] > time.monotonic()
+    pool.shutdown()
+
+def test_closed_idle_session_is_replaced(fake_synthesizer):
+    pool = SynthesizerPool(PoolConfig)
+    fmt = AudioFormat.MP3_22050HZ_MONO_256KBPS
+    pool.warm('cosyvoice-v2', 'longwan_v2', fmt, pinned=True)
+    assert wait_until(lambda: pool.get_stats()['longwan_v2/' + fmt.name]['idle'] == 2)
+    broken, healthy = pool._idle[('cosyvoice-v2', 'longwan_v2', fmt.name)]
+    broken.relay.on_close()
+
+    assert pool.acquire('cosyvoice-v2', 'longwan_v2', fmt) is healthy
+    assert broken.synthesizer.closed
+    assert wait_until(lambda: pool.get_stats()['longwan_v2/' + fmt.name]['idle'] == 2)
+    pool.shutdown()
+
+if __name__ == '__main__':
+    pool_module.SpeechSynthesizer = FakeSynthesizer
+    FakeSynthesizer.connect_delay = 0.15
+    fmt = AudioFormat.MP3_22050HZ_MONO_256KBPS
+    for warmed in (False, True):
+        pool = SynthesizerPool(PoolConfig)
+        if warmed:
+            pool.warm('cosyvoice-v2', 'longwan_v2', fmt, pinned=True)
+            time.sleep(0.5)
+        waits = []
+        for _ in range(10):
+            start = time.perf_counter()
+            target = StreamingSynthesisCallback()
+            pool.acquire('cosyvoice-v2', 'longwan_v2', fmt).run('请稍等。', target)
+            target.queue.get(timeout=5)
+            waits.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.3)
+        pool.shutdown()
+        print(f"{'预热' if warmed else '未预热'}: 首个音频平均耗时 {sum(waits) / len(waits):.1f} ms")
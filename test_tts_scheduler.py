@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+测试TTS优先级调度：同类请求按截止时间先后放行，交互请求可借用空闲的批量槽位，超时开始的请求计入截止未达
+运行本文件可模拟批量任务占满时的交互请求排队耗时
+"""
+
+import threading
+import time
+
+from backend.tts_scheduler import TTSScheduler
+from config import Config
+
+class SmallConfig(Config):
+    TTS_INTERACTIVE_CONCURRENCY = 1
+    TTS_BATCH_CONCURRENCY = 1
+    TTS_INTERACTIVE_DEADLINE = 1.0
+    TTS_BATCH_DEADLINE = 60.0
+
+def wait_for_waiting(scheduler, priority, count, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while scheduler.get_stats()[priority]['waiting'] < count and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return scheduler.get_stats()[priority]['waiting']
+
+def start_waiter(scheduler, priority, deadline, granted, label):
+    """在线程中申请槽位，获得后记录来源并立即归还"""
+    def run():
+        pool = scheduler.acquire(priority, deadline)
+        granted.append((label, pool))
+        scheduler.release(pool)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+def test_waiters_are_granted_earliest_deadline_first():
+    scheduler = TTSScheduler(SmallConfig)
+    held = scheduler.acquire('batch')
+    granted, threads = [], []
+    for count, (label, deadline) in enumerate((('late', 30.0), ('early', 10.0), ('middle', 20.0)), 1):
+        threads.append(start_waiter(scheduler, 'batch', deadline, granted, label))
+        assert wait_for_waiting(scheduler, 'batch', count) == count
+    scheduler.release(held)
+    for thread in threads:
+        thread.join()
+    assert [label for label, _ in granted] == ['early', 'middle', 'late']
+
+def test_interactive_borrows_idle_batch_slot_but_not_the_reverse():
+    scheduler = TTSScheduler(SmallConfig)
+    interactive = scheduler.acquire('interactive')
+    assert scheduler.acquire('interactive') == 'batch'
+    assert scheduler.get_stats()['batch']['active'] == 1
+
+    scheduler.release('batch')
+    held = scheduler.acquire('batch')
+    scheduler.release(interactive)
+    granted = []
+    thread = start_waiter(scheduler, 'batch', None, granted, 'bulk')
+    assert wait_for_waiting(scheduler, 'batch', 1) == 1
+    time.sleep(0.05)
+    assert granted == [] and scheduler.get_stats()['interactive']['active'] == 0
+    scheduler.release(held)
+    thread.join()
+    assert granted == [('bulk', 'batch')]
+
+def test_late_grants_count_as_deadline_misses():
+    scheduler = TTSScheduler(SmallConfig)
+    scheduler.release(scheduler.acquire('interactive', deadline=0.5))
+    held = [scheduler.acquire('interactive'), scheduler.acquire('interactive')]
+    granted = []
+    thread = start_waiter(scheduler, 'interactive', 0.02, granted, 'voice')
+    assert wait_for_waiting(scheduler, 'interactive', 1) == 1
+    time.sleep(0.05)
+    for pool in held:
+        scheduler.release(pool)
+    thread.join()
+    stats = scheduler.get_stats()
+    assert stats['interactive']['deadline_missed'] == 1
+    assert stats['batch']['deadline_missed'] == 0
+
+if __name__ == '__main__':
+    # 批量请求持续占满批量槽位（每次合成0.5s），交互请求每0.2s到达一次（每次合成0.2s）
+    scheduler = TTSScheduler(Config)
+    stop = threading.Event()
+
+    def batch_worker():
+        while not stop.is_set():
+            with scheduler.slot('batch'):
+                time.sleep(0.5)
+
+    workers = [threading.Thread(target=batch_worker) for _ in range(Config.TTS_BATCH_CONCURRENCY * 4)]
+    for worker in workers:
+        worker.start()
+    waits = []
+
+    def voice_turn():
+        start = time.perf_counter()
+        with scheduler.slot('interactive'):
+            waits.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.2)
+
+    turns = []
+    for _ in range(20):
+        turn = threading.Thread(target=voice_turn)
+        turn.start()
+        turns.append(turn)
+        time.sleep(0.2)
+    for turn in turns:
+        turn.join()
+    stop.set()
+    for worker in workers:
+        worker.join()
+    waits.sort()
+    print(f"批量任务占满时交互请求排队: p50 {waits[len(waits) // 2]:.1f} ms, 最大 {waits[-1]:.1f} ms")
+    print(f"调度统计: {scheduler.get_stats()}")
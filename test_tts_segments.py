@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+测试长文本分段合成：按句切分且每段不超过上限，MP3按帧拼接并去掉标签与VBR头帧，WAV拼接后重写头部长度
+运行本文件可输出分段并发合成与整段合成的耗时对比
+"""
+
+import io
+import time
+import wave
+
+import pytest
+
+from backend.audio_utils import concat_mp3, concat_wav, split_mp3_frames
+from backend.tts_service import TTSService
+
+# MPEG-1 Layer III, 128kbps, 44.1kHz, 立体声：每帧 144 * 128000 // 44100 = 417 字节
+FRAME_HEADER = b'\xff\xfb\x90\x00'
+FRAME_LENGTH = 417
+
+def mp3_frame(fill):
+    return FRAME_HEADER + bytes([fill]) * (FRAME_LENGTH - 4)
+
+def xing_frame():
+    frame = bytearray(mp3_frame(0))
+    frame[36:40] = b'Xing'  # 帧头4字节 + 立体声边信息32字节之后
+    return bytes(frame)
+
+def id3v2_tag(body=b'TIT2 title'):
+    size = len(body)
+    syncsafe = bytes([(size >> 21) & 0x7f, (size >> 14) & 0x7f, (size >> 7) & 0x7f, size & 0x7f])
+    return b'ID3\x04\x00\x00' + syncsafe + body
+
+def make_wav(pcm, sample_rate=22050):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm)
+    return buffer.getvalue()
+
+def test_short_text_stays_one_segment():
+    assert TTSService._split_segments('你好。', 200) == ['你好。']
+
+def test_segments_end_at_sentence_boundaries():
+    text = '第一句话比较短。' + '第二句话稍微长一些，需要单独成段！' + '第三句？' + '最后一句没有标点'
+    segments = TTSService._split_segments(text, 20)
+    assert ''.join(segments) == text
+    assert all(len(segment) <= 20 for segment in segments)
+    assert segments == ['第一句话比较短。', '第二句话稍微长一些，需要单独成段！', '第三句？最后一句没有标点']
+
+def test_overlong_sentence_falls_back_to_clauses_and_hard_cut():
+    text = '前半句，' + '长' * 25 + '。'
+    segments = TTSService._split_segments(text, 10)
+    assert ''.join(segments) == text
+    assert all(len(segment) <= 10 for segment in segments)
+    assert segments[0] == '前半句，'
+
+def test_concat_mp3_drops_tags_and_vbr_headers():
+    first = id3v2_tag() + xing_frame() + mp3_frame(1) + mp3_frame(2)
+    second = xing_frame() + mp3_frame(3) + b'TAG' + bytes(125)
+    joined = concat_mp3([first, second])
+    assert joined == mp3_frame(1) + mp3_frame(2) + mp3_frame(3)
+    assert [is_vbr for _, _, is_vbr in split_mp3_frames(joined)] == [False] * 3
+
+    with pytest.raises(ValueError):
+        concat_mp3([first, b'not audio'])
+
+def test_concat_wav_rewrites_sizes():
+    joined = concat_wav([make_wav(b'\x01\x00' * 100), make_wav(b'\x02\x00' * 50)])
+    with wave.open(io.BytesIO(joined), 'rb') as wav_file:
+        assert wav_file.getframerate() == 22050
+        assert wav_file.getnframes() == 150
+        assert wav_file.readframes(150) == b'\x01\x00' * 100 + b'\x02\x00' * 50
+
+def test_concat_wav_accepts_streamed_placeholder_size():
+    streamed = bytearray(make_wav(b'\x03\x00' * 10))
+    streamed[-24:-20] = b'\xff\xff\xff\xff'  # 流式WAV的data长度占位
+    joined = concat_wav([make_wav(b'\x01\x00' * 10), bytes(streamed)])
+    with wave.open(io.BytesIO(joined), 'rb') as wav_file:
+        assert wav_file.getnframes() == 20
+
+    with pytest.raises(ValueError):
+        concat_wav([b'RIFF\x00\x00\x00\x00WAVEfmt '])
+
+def test_long_text_is_synthesized_per_segment_in_order(make_tts_service, fake_synthesizer):
+    service = make_tts_service(TTS_SEGMENT_MAX_CHARS=10, TTS_PHRASE_CACHE_ENABLED=False)
+    text = '各位旅客请注意。列车即将进站。请站在安全线以内。'
+    audio = service.synthesize(text, 'longwan_v2', service.negotiate_format('pcm', 16000))
+    assert audio == text.encode('utf-8')
+    assert sorted(fake_synthesizer.texts) == sorted(['各位旅客请注意。', '列车即将进站。', '请站在安全线以内。'])
+
+if __name__ == '__main__':
+    from conftest import FakeSynthesizer, tts_config
+    import backend.tts_pool as pool_module
+
+    pool_module.SpeechSynthesizer = FakeSynthesizer
+    text = '各位旅客请注意，开往上海虹桥的列车即将进站，请站在安全线以内。' * 12
+    for max_chars in (len(text), 200, 100):
+        FakeSynthesizer.delay = 0.0003 * min(len(text), max_chars)  # 合成耗时近似与文本长度成正比
+        service = TTSService(tts_config(TTS_SEGMENT_MAX_CHARS=max_chars, TTS_PHRASE_CACHE_ENABLED=False))
+        start = time.perf_counter()
+        service.synthesize(text, 'longwan_v2', service.negotiate_format('pcm', 16000))
+        segments = len(TTSService._split_segments(text, max_chars))
+        print(f"每段上限 {max_chars:4d} 字: {segments} 段, 耗时 {(time.perf_counter() - start) * 1000:.0f} ms")
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+测试TTS并发请求合并：相同(文本, 音色, 格式)的并发请求只触发一次远程合成
+运行本文件可输出并发压测结果
+"""
+
+import threading
+import time
+
+import backend.tts_pool as pool_module
+from backend.tts_service import TTSService
+from conftest import FakeSynthesizer, tts_config
+from utils.singleflight import SingleFlight
+
+def run_concurrently(count, target):
+    """同时启动count个线程调用target，返回各线程结果"""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(index):
+        barrier.wait()
+        try:
+            results[index] = target(index)
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_identical_requests_share_one_call(make_tts_service, fake_synthesizer):
+    fake_synthesizer.delay = 0.2
+    service = make_tts_service()
+    results = run_concurrently(50, lambda i: service.synthesize('各位旅客请注意，列车即将进站。', 'longwan_v2'))
+    assert len(fake_synthesizer.texts) == 1
+    assert all(result == results[0] for result in results)
+
+def test_different_keys_are_not_merged(make_tts_service, fake_synthesizer):
+    fake_synthesizer.delay = 0.2
+    service = make_tts_service()
+    mp3 = service.negotiate_format('mp3')
+    pcm = service.negotiate_format('pcm', 16000)
+    requests = [('同一句话', 'longwan_v2', mp3), ('同一句话', 'longhua_v2', mp3),
+                ('同一句话', 'longwan_v2', pcm), ('另一句话', 'longwan_v2', mp3)]
+    run_concurrently(40, lambda i: service.synthesize(*requests[i % 4]))
+    assert len(fake_synthesizer.texts) == 4
+
+def test_error_reaches_every_waiter(make_tts_service, fake_synthesizer):
+    fake_synthesizer.delay = 0.2
+    fake_synthesizer.fail = True
+    service = make_tts_service()
+    results = run_concurrently(10, lambda i: service.synthesize('失败的请求', 'longwan_v2'))
+    assert len(fake_synthesizer.texts) == 1
+    assert all(isinstance(result, Exception) for result in results)
+
+def test_key_released_after_completion():
+    flight = SingleFlight()
+    assert flight.do('k', lambda: 1) == (1, False)
+    assert flight.do('k', lambda: 2) == (2, False)
+    assert flight.in_flight() == 0
+
+if __name__ == '__main__':
+    pool_module.SpeechSynthesizer = FakeSynthesizer
+    FakeSynthesizer.delay = 0.2
+    for concurrency in (1, 10, 50, 200):
+        FakeSynthesizer.texts = []
+        service = TTSService(tts_config())
+        start = time.perf_counter()
+        run_concurrently(concurrency, lambda i: service.synthesize('各位旅客请注意，列车即将进站。', 'longwan_v2'))
+        elapsed = time.perf_counter() - start
+        print(f"并发 {concurrency:4d}: 远程合成 {len(FakeSynthesizer.texts)} 次, 耗时 {elapsed:.2f}s")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+测试TTS文本清洗：预编译清洗与原多次正则结果一致，增量清洗与整段清洗一致
+运行本文件可输出清洗速度（字符/秒）
+"""
+
+import re
+import random
+import time
+
+from backend.text_cleaner import TTSTextCleaner, clean_text_for_tts
+
+def reference_clean(text):
+    """原 TTSService._clean_text_for_tts 的逐条正则实现"""
+    text = re.sub(r'[#*`_\[\](){}]', '', text)
+    text = re.sub(r'\$.*?\$', '', text)
+    text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'[!]{2,}', '!', text)
+    text = re.sub(r'[?]{2,}', '?', text)
+    text = re.sub(r'[.]{3,}', '...', text)
+    return text.strip()
+
+def incremental_clean(text, rng):
+    """把文本随机切块后逐块送入增量清洗器"""
+    cleaner = TTSTextCleaner()
+    output = []
+    pos = 0
+    while pos < len(text):
+        size = rng.randint(1, 6)
+        output.append(cleaner.feed(text[pos:pos + size]))
+        pos += size
+    output.append(cleaner.flush())
+    return ''.join(output)
+
+CASES = [
+    '',
+    '   ',
+    '**粗体** 和 `代码` 以及 [链接](http://example.com/a?b=1)',
+    '公式 $E=mc^2$ 结束',
+    '未闭合 $ 美元 符号',
+    '跨行 $不配对\n$ 的公式',
+    '访问 https://www.aliyun.com/product 了解更多!!!',
+    '太好了!!! 真的吗??? 然后......',
+    '两个点.. 三个点... 四个点....',
+    'ht$x$tp://hidden.example 拼接出的链接',
+    'http://$x$ 后面是空格',
+    'http://a$x$b 链接中的公式',
+    'http://example.com!!',
+    '!!$x$!! 公式两侧的感叹号',
+    '  前后空白\t\n  ',
+    '中文，标点。还有 English words.',
+    '# 标题\n\n- 列表 *项*\n- _另一项_',
+    'hhttp://x http http:// https://',
+    '$a$$b$ 连续公式 $$ 空公式',
+    'URL结尾 http://example.com/path',
+]
+
+def test_matches_reference_on_cases():
+    for text in CASES:
+        assert clean_text_for_tts(text) == reference_clean(text), text
+
+def test_matches_reference_on_random_text():
+    rng = random.Random(20240601)
+    alphabet = 'htps:/$ \n!?.a#(X中,%'
+    for _ in range(5000):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        assert clean_text_for_tts(text) == reference_clean(text), repr(text)
+
+def test_incremental_matches_batch():
+    rng = random.Random(7)
+    alphabet = 'htps:/$ \n!?.a#(X中,%'
+    texts = CASES + [
+        ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+        for _ in range(3000)
+    ]
+    for text in texts:
+        assert incremental_clean(text, rng) == reference_clean(text), repr(text)
+
+def test_incremental_emits_before_flush():
+    cleaner = TTSTextCleaner()
+    emitted = cleaner.feed('你好，世界。这是第一句话。 ')
+    assert emitted == '你好，世界。这是第一句话。'
+    assert cleaner.feed('第二句 $x') == ' 第二句'
+    assert cleaner.feed('$ 完') + cleaner.flush() == ' 完'
+
+def benchmark(repeat=200):
+    """输出原实现与新实现的清洗速度"""
+    sample = '\n'.join(CASES) * 20
+    answer = ('根据知识库，**退票规则**如下：\n\n1. 开车前8天以上退票，不收取退票费。\n'
+              '2. 开车前48小时至8天，收取票价5%的退票费。\n3. 详情请访问 https://www.12306.cn 查询。\n') * 5
+    for label, text in (('cases', sample), ('answer', answer)):
+        for name, func in (('reference', reference_clean), ('batch', clean_text_for_tts)):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                func(text)
+            elapsed = time.perf_counter() - start
+            print(f"{label:7s}{name:12s} {len(text) * repeat / elapsed:,.0f} chars/s")
+
+    rng = random.Random(1)
+    tokens = []
+    pos = 0
+    while pos < len(sample):
+        size = rng.randint(1, 6)
+        tokens.append(sample[pos:pos + size])
+        pos += size
+    start = time.perf_counter()
+    for _ in range(repeat // 10):
+        cleaner = TTSTextCleaner()
+        for token in tokens:
+            cleaner.feed(token)
+        cleaner.flush()
+    elapsed = time.perf_counter() - start
+    print(f"{'stream':7s}{'incremental':12s} {len(sample) * (repeat // 10) / elapsed:,.0f} chars/s")
+
+if __name__ == '__main__':
+    test_matches_reference_on_cases()
+    test_matches_reference_on_random_text()
+    test_incremental_matches_batch()
+    test_incremental_emits_before_flush()
+    print("✓ 清洗结果一致")
+    benchmark()
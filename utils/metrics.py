@@ -0,0 +1,119 @@
+"""
+In-process latency and counter metrics shared by the backend services
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any
+
+class MetricsRegistry:
+    """Thread-safe registry of rolling latency samples and counters"""
+
+    def __init__(self, window: int = 500):
+        """
+        Initialize metrics registry
+
+        Args:
+            window: Number of recent samples kept per latency stage
+        """
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+        self._totals: Dict[str, int] = {}
+        self._counters: Dict[str, float] = {}
+
+    def observe(self, name: str, seconds: float) -> None:
+        """
+        Record a latency sample for a stage
+
+        Args:
+            name: Stage name, e.g. 'asr.connect'
+            seconds: Observed duration in seconds
+        """
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+                self._totals[name] = 0
+            samples.append(seconds)
+            self._totals[name] += 1
+
+    def incr(self, name: str, amount: float = 1) -> None:
+        """
+        Increment a counter
+
+        Args:
+            name: Counter name
+            amount: Increment value
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    @contextmanager
+    def timer(self, name: str):
+        """Context manager recording the duration of the wrapped block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def percentile(self, name: str, pct: float) -> float:
+        """
+        Get a percentile of the recent samples of a stage
+
+        Args:
+            name: Stage name
+            pct: Percentile in [0, 100]
+
+        Returns:
+            Percentile value in seconds, 0.0 if there are no samples
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get a JSON-serializable view of all metrics
+
+        Returns:
+            Dictionary with latency summaries (milliseconds) and counters
+        """
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+            totals = dict(self._totals)
+            counters = dict(self._counters)
+
+        latency = {}
+        for name, values in samples.items():
+            if not values:
+                continue
+            last = len(values) - 1
+            latency[name] = {
+                'count': totals[name],
+                'avg_ms': round(sum(values) / len(values) * 1000, 2),
+                'p50_ms': round(values[int(round(0.50 * last))] * 1000, 2),
+                'p95_ms': round(values[int(round(0.95 * last))] * 1000, 2),
+                'max_ms': round(values[-1] * 1000, 2)
+            }
+
+        return {
+            'latency': latency,
+            'counters': counters
+        }
+
+    def reset(self) -> None:
+        """Drop all recorded samples and counters"""
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+            self._counters.clear()
+
+# Process-wide registry used by all services
+metrics = MetricsRegistry()
@@ -16,8 +16,24 @@ def validate_file(file, allowed_extensions: Set[str]) -> bool:
     if not file or not file.filename:
         return False
     
+    return validate_filename(file.filename, allowed_extensions)
+
+def validate_filename(filename: str, allowed_extensions: Set[str]) -> bool:
+    """
+    Validate the extension of an uploaded filename
+    
+    Args:
+        filename: Original filename
+        allowed_extensions: Set of allowed file extensions
+    
+    Returns:
+        True if the extension is allowed
+    """
+    if not filename:
+        return False
+    
     # Check file extension
-    filename = secure_filename(file.filename)
+    filename = secure_filename(filename)
     if '.' not in filename:
         return False
     
@@ -0,0 +1,77 @@
+"""
+Coalescing of concurrent calls that share a key
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+class _Call:
+    """State of one in-flight call"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time; callers arriving while a call
+    is in flight wait for its outcome instead of starting their own
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Tuple[Any, bool]:
+        """
+        Run fn once for all concurrent callers of the same key
+
+        Args:
+            key: Deduplication key
+            fn: Function to run
+            *args: Positional arguments of fn
+            **kwargs: Keyword arguments of fn
+
+        Returns:
+            Tuple of (result, shared) where shared is True for callers that
+            received another caller's result
+
+        Raises:
+            Exception: Whatever fn raised, re-raised in every waiting caller
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        """
+        Get the number of keys currently being computed
+
+        Returns:
+            Number of in-flight calls
+        """
+        with self._lock:
+            return len(self._calls)
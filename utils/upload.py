@@ -0,0 +1,161 @@
+"""
+Incremental multipart upload reading with a running size limit
+"""
+
+from typing import Dict, Iterator, List, Optional
+
+from werkzeug.sansio.multipart import MultipartDecoder, NeedData, Field, File, Data, Epilogue
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the configured size limit"""
+
+class UploadPart:
+    """A file part of a multipart body whose data is read on demand"""
+
+    def __init__(self, upload: 'StreamingUpload', name: str, filename: str):
+        self.upload = upload
+        self.name = name
+        self.filename = filename
+        self.bytes_read = 0
+        self.done = False
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        """
+        Yield the part's data as it arrives from the client
+
+        Yields:
+            Chunks of file data
+        """
+        while not self.done:
+            event = self.upload._next_event()
+            if not isinstance(event, Data):
+                raise ValueError("Malformed multipart body")
+            if not event.more_data:
+                self.done = True
+            if event.data:
+                self.bytes_read += len(event.data)
+                yield event.data
+
+    def drain(self):
+        """Discard any unread data of the part"""
+        for _ in self.iter_chunks():
+            pass
+
+class StreamingUpload:
+    """
+    Read a multipart/form-data request body part by part without buffering
+    whole files, enforcing the size limit on every chunk read
+    """
+
+    MAX_FIELD_SIZE = 64 * 1024
+
+    def __init__(self, stream, boundary, max_bytes: int, chunk_size: int = 64 * 1024):
+        """
+        Initialize streaming upload reader
+
+        Args:
+            stream: Raw request body stream
+            boundary: Multipart boundary from the Content-Type header
+            max_bytes: Maximum number of body bytes accepted
+            chunk_size: Number of bytes read from the stream at a time
+        """
+        if isinstance(boundary, str):
+            boundary = boundary.encode('latin-1')
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+        self.fields: Dict[str, List[str]] = {}
+
+        self._decoder = MultipartDecoder(boundary)
+        self._eof = False
+
+    @classmethod
+    def from_request(cls, request, max_bytes: int) -> Optional['StreamingUpload']:
+        """
+        Create a reader for a Flask request
+
+        Args:
+            request: Flask request whose form has not been parsed yet
+            max_bytes: Maximum number of body bytes accepted
+
+        Returns:
+            StreamingUpload, or None if the request is not multipart/form-data
+        """
+        boundary = request.mimetype_params.get('boundary')
+        if request.mimetype != 'multipart/form-data' or not boundary:
+            return None
+        if request.content_length and request.content_length > max_bytes:
+            raise UploadTooLarge(f"Upload of {request.content_length} bytes exceeds {max_bytes} bytes")
+        return cls(request.stream, boundary, max_bytes)
+
+    def _next_event(self):
+        """Get the next multipart event, reading from the stream as needed"""
+        while True:
+            event = self._decoder.next_event()
+            if not isinstance(event, NeedData):
+                return event
+            if self._eof:
+                raise ValueError("Unexpected end of multipart body")
+
+            data = self.stream.read(self.chunk_size)
+            if data:
+                self.bytes_read += len(data)
+                if self.bytes_read > self.max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+                self._decoder.receive_data(data)
+            else:
+                self._eof = True
+                self._decoder.receive_data(None)
+
+    def _read_field(self, name: str):
+        """Collect a small form field into self.fields"""
+        parts = []
+        size = 0
+        while True:
+            event = self._next_event()
+            if not isinstance(event, Data):
+                raise ValueError("Malformed multipart body")
+            size += len(event.data)
+            if size > self.MAX_FIELD_SIZE:
+                raise UploadTooLarge(f"Form field {name} exceeds {self.MAX_FIELD_SIZE} bytes")
+            parts.append(event.data)
+            if not event.more_data:
+                break
+        self.fields.setdefault(name, []).append(b''.join(parts).decode('utf-8', 'replace'))
+
+    def files(self) -> Iterator[UploadPart]:
+        """
+        Iterate over file parts in body order; form fields seen along the
+        way are collected into self.fields
+
+        Yields:
+            UploadPart objects, each to be consumed before the next one
+        """
+        while True:
+            event = self._next_event()
+            if isinstance(event, Epilogue):
+                return
+            if isinstance(event, Field):
+                self._read_field(event.name)
+            elif isinstance(event, File):
+                part = UploadPart(self, event.name, event.filename)
+                yield part
+                part.drain()
+
+def write_chunks(chunks, file_obj) -> int:
+    """
+    Write chunks to a file object
+
+    Args:
+        chunks: Iterable of bytes
+        file_obj: Writable binary file
+
+    Returns:
+        Number of bytes written
+    """
+    total = 0
+    for chunk in chunks:
+        file_obj.write(chunk)
+        total += len(chunk)
+    return total